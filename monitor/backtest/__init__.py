@@ -0,0 +1,19 @@
+"""
+回测模块
+
+离线回放历史区块数据（头寸事件、价格更新、实际发生的清算），
+评估不同任务间隔和阈值下的捕获率:
+    python -m monitor.backtest.generate --out data/backtest.jsonl.gz
+    python -m monitor.backtest.run --fixture data/backtest.jsonl.gz --sweep update_age=1800,3600,10800
+"""
+
+from .fixture import Fixture, load_fixture, write_fixture
+from .simulator import Backtest, DEFAULT_PARAMS
+
+__all__ = [
+    'Fixture',
+    'load_fixture',
+    'write_fixture',
+    'Backtest',
+    'DEFAULT_PARAMS'
+]
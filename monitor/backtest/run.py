@@ -0,0 +1,88 @@
+"""
+回测：在历史区块数据上评估不同任务间隔和阈值下的清算捕获率
+
+    python -m monitor.backtest.run --fixture data/backtest.jsonl.gz
+    python -m monitor.backtest.run --fixture data/backtest.jsonl.gz \\
+        --sweep update_age=1800,3600,10800 --sweep watcher=true,false
+"""
+
+# 标准库
+import time
+import argparse
+import itertools
+from typing import Dict, List, Tuple
+
+# 本地导入
+from .fixture import load_fixture
+from .simulator import Backtest, DEFAULT_PARAMS
+
+def _parse_value(name: str, raw: str):
+    default = DEFAULT_PARAMS[name]
+    if isinstance(default, bool):
+        return raw.lower() in ('1', 'true', 'yes', 'on')
+    return type(default)(raw)
+
+def parse_sweep(specs: List[str]) -> List[Tuple[str, List]]:
+    """解析 --sweep name=v1,v2,... 参数"""
+    sweeps = []
+    for spec in specs:
+        name, _, values = spec.partition('=')
+        if name not in DEFAULT_PARAMS or not values:
+            raise ValueError(f"无效的扫描参数: {spec}，可选: {', '.join(DEFAULT_PARAMS)}")
+        sweeps.append((name, [_parse_value(name, v) for v in values.split(',')]))
+    return sweeps
+
+def _format_row(params: Dict, report: Dict, names: List[str]) -> str:
+    delays = report['blocks_to_detect']
+    fmt = lambda v: '-' if v is None else f"{v:g}"
+    columns = [f"{params[name]!s:>10}" for name in names]
+    columns += [
+        f"{report['capture_rate']:>8.1%}",
+        f"{report['captured']:>6}/{report['liquidations']:<6}",
+        f"{fmt(delays['p50']):>6} {fmt(delays['p90']):>6} {fmt(delays['p99']):>6}",
+        f"{report['missed_profit']:>14,.2f}"
+    ]
+    return '  '.join(columns)
+
+def main():
+    parser = argparse.ArgumentParser(description="清算捕获率回测")
+    parser.add_argument('--fixture', required=True, help="JSONL 回测数据文件")
+    parser.add_argument('--sweep', action='append', default=[], help="扫描参数，如 update_age=1800,3600")
+    for name, default in DEFAULT_PARAMS.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", dest=name, default=None, help=f"默认 {default}")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    fixture = load_fixture(args.fixture)
+    print(f"加载 {len(fixture.events)} 个事件，区块 {fixture.start_block} - {fixture.end_block}，"
+          f"{len(fixture.liquidations())} 次清算，耗时 {time.perf_counter() - start:.2f}s")
+
+    base = {
+        name: _parse_value(name, getattr(args, name))
+        for name in DEFAULT_PARAMS if getattr(args, name) is not None
+    }
+    sweeps = parse_sweep(args.sweep)
+
+    # 数据范围短于 update_age 时定时更新一次都不会执行，捕获率只反映价格监听
+    swept = dict(sweeps)
+    update_age = min(swept.get('update_age', [base.get('update_age', DEFAULT_PARAMS['update_age'])]))
+    block_time = max(swept.get('block_time', [base.get('block_time', DEFAULT_PARAMS['block_time'])]))
+    span = fixture.end_block - fixture.start_block
+    if span <= update_age / block_time:
+        print(f"警告: 数据只覆盖 {span} 个区块，不超过 update_age 对应的 "
+              f"{int(update_age / block_time)} 个区块，定时更新不会生效")
+    names = [name for name, _ in sweeps]
+
+    header = [f"{name[:10]:>10}" for name in names]
+    header += [f"{'捕获率':>5}", f"{'捕获/总数':>9}", f"{'延迟 p50   p90    p99':>20}", f"{'错过利润(USD)':>11}"]
+    print('  '.join(header))
+
+    for values in itertools.product(*[values for _, values in sweeps]):
+        params = {**base, **dict(zip(names, values))}
+        start = time.perf_counter()
+        report = Backtest(fixture, **params).run()
+        print(_format_row({**DEFAULT_PARAMS, **params}, report, names)
+              + f"  ({time.perf_counter() - start:.2f}s)")
+
+if __name__ == "__main__":
+    main()
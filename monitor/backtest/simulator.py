@@ -0,0 +1,276 @@
+# 标准库
+import math
+import heapq
+from collections import defaultdict
+from typing import Dict, List, Optional, Set
+
+# 本地导入
+from .fixture import Fixture, POSITION_EVENTS, PRICE, LIQUIDATION
+from ..utils.asset_index import AssetUserIndex
+
+# 与 TaskManager 中的任务间隔一致（秒）
+DEFAULT_PARAMS = {
+    'discovery_interval': 60*60,  # 用户发现
+    'update_interval': 30*60,  # 用户更新任务执行间隔
+    'update_age': 3*60*60,  # 用户数据超过该时间才会被定时更新
+    'finder_interval': 5*60,  # 清算机会发现的定时扫描，只影响定时更新标记的用户；价格监听发现的用户立即检查
+    'watcher': True,  # 是否启用价格监听
+    'watcher_interval': 1,  # 价格监听
+    'min_health_factor': 1.0,  # 可清算阈值
+    'high_risk_health_factor': 1.02,  # 低于该值的用户才会保存头寸、进入资产索引
+    'block_time': 0.25,  # 出块时间（秒），Arbitrum 约 0.25 秒
+    'execution_delay': 1  # 发现机会到交易上链的区块数
+}
+
+# 同一区块内任务的执行顺序
+DISCOVERY, UPDATE, WATCHER, FINDER = range(4)
+
+def _percentile(values: List[int], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(int(math.ceil(pct / 100 * len(ordered))) - 1, len(ordered) - 1)
+    return ordered[max(index, 0)]
+
+class Backtest:
+    """在历史区块上模拟发现 / 更新 / 价格监听 / 机会发现的时序
+
+    链上真实状态按事件逐个更新；机器人只能看到各任务在其执行时刻读到的状态：
+    - 用户发现：每次执行时发现此前所有 supply 过的用户，新用户在 update_age 之后才会被定时更新
+    - 用户更新：每次执行时刷新数据超过 update_age 的已知用户的健康因子，
+      健康因子低于 high_risk_health_factor 的用户头寸写入资产索引
+    - 价格监听：每次执行时把上次以来价格变化资产的索引用户重新评估，可清算的立即交给机会发现
+    - 机会发现：每次执行时检查保存的健康因子低于 min_health_factor 的用户
+
+    对每个实际发生的 LiquidationCall，若机器人在清算区块前 execution_delay 个区块之内
+    已经发现该用户可清算，则视为捕获。
+    """
+
+    def __init__(self, fixture: Fixture, **params):
+        unknown = set(params) - set(DEFAULT_PARAMS)
+        if unknown:
+            raise ValueError(f"未知的回测参数: {', '.join(sorted(unknown))}")
+        self.fixture = fixture
+        self.params = {**DEFAULT_PARAMS, **params}
+        self.thresholds = fixture.thresholds()
+
+    def _blocks(self, seconds: float) -> int:
+        return max(int(math.ceil(seconds / self.params['block_time'])), 1)
+
+    def run(self) -> Dict:
+        """执行回测
+
+        Returns:
+            捕获率、发现延迟分布、错过的利润等统计
+        """
+        p = self.params
+        min_hf = p['min_health_factor']
+
+        # 链上真实状态
+        positions: Dict[str, Dict[str, List[float]]] = defaultdict(dict)
+        prices: Dict[str, float] = {}
+        # 资产 -> {用户: (抵押数量 * 清算阈值, 债务数量)}，价格变化时增量更新持有人的汇总
+        holders: Dict[str, Dict[str, tuple]] = defaultdict(dict)
+        # 用户 -> [加权抵押价值, 债务价值]
+        totals: Dict[str, List[float]] = {}
+        suppliers: List[str] = []
+        seen_suppliers: Set[str] = set()
+        onset: Dict[str, int] = {}
+
+        # 机器人视角
+        known: Set[str] = set()
+        discovered = 0
+        last_refresh: Dict[str, int] = {}
+        flagged: Set[str] = set()
+        asset_index = AssetUserIndex()
+        changed_assets: Set[str] = set()
+        detected: Dict[str, int] = {}
+
+        def health_factor(user: str) -> float:
+            collateral, debt = totals.get(user, (0.0, 0.0))
+            return collateral / debt if debt > 0 else float('inf')
+
+        def reassess(user: str, block: int):
+            """链上状态变化后维护用户的可清算区间"""
+            collateral, debt = totals.get(user, (0.0, 0.0))
+            if debt > 0 and collateral < min_hf * debt:
+                onset.setdefault(user, block)
+            elif user in onset:
+                del onset[user]
+                detected.pop(user, None)
+
+        def apply(user: str, asset: str, collateral: float, debt: float):
+            """修改头寸并重新计算用户的汇总"""
+            entry = positions[user].setdefault(asset, [0.0, 0.0])
+            entry[0] = max(entry[0] + collateral, 0.0)
+            entry[1] = max(entry[1] + debt, 0.0)
+            if entry[0] > 0 or entry[1] > 0:
+                holders[asset][user] = (entry[0] * self.thresholds.get(asset, 0.0), entry[1])
+            else:
+                holders[asset].pop(user, None)
+            weighted = owed = 0.0
+            for held, (coll, amount) in positions[user].items():
+                price = prices.get(held, 0.0)
+                weighted += coll * price * self.thresholds.get(held, 0.0)
+                owed += amount * price
+            totals[user] = [weighted, owed]
+
+        def refresh(user: str, block: int) -> float:
+            """机器人从链上读取用户数据"""
+            hf = health_factor(user)
+            last_refresh[user] = block
+            if hf < min_hf:
+                flagged.add(user)
+            else:
+                flagged.discard(user)
+            if hf < p['high_risk_health_factor']:
+                asset_index.update_user(user, [
+                    asset for asset, (coll, owed) in positions[user].items() if coll > 0 or owed > 0
+                ])
+            return hf
+
+        def detect(user: str, block: int):
+            if user in onset:
+                detected.setdefault(user, block)
+
+        # 任务调度：(区块, 顺序, 任务, 间隔)
+        start = self.fixture.start_block
+        schedule = [
+            (start, DISCOVERY, self._blocks(p['discovery_interval'])),
+            (start, UPDATE, self._blocks(p['update_interval'])),
+            (start, FINDER, self._blocks(p['finder_interval']))
+        ]
+        heapq.heapify(schedule)
+        watcher_every = self._blocks(p['watcher_interval'])
+        update_age = self._blocks(p['update_age'])
+
+        results = []
+        events = self.fixture.events
+        i = 0
+        while i < len(events) or changed_assets:
+            next_event = events[i]['block'] if i < len(events) else None
+            next_task = schedule[0][0]
+            if next_event is None and not changed_assets:
+                break
+
+            # 先应用区块内的全部链上事件，再执行该区块的任务
+            if next_event is not None and next_event <= next_task:
+                block = next_event
+                while i < len(events) and events[i]['block'] == block:
+                    event = events[i]
+                    i += 1
+                    kind = event['type']
+                    if kind == PRICE:
+                        asset = event['asset']
+                        delta = event['price'] - prices.get(asset, 0.0)
+                        prices[asset] = event['price']
+                        changed_assets.add(asset)
+                        for user, (weight, owed) in holders[asset].items():
+                            total = totals[user]
+                            total[0] += weight * delta
+                            total[1] += owed * delta
+                            if total[1] > 0 and total[0] < min_hf * total[1]:
+                                if user not in onset:
+                                    onset[user] = block
+                            elif user in onset:
+                                del onset[user]
+                                detected.pop(user, None)
+                    elif kind == LIQUIDATION:
+                        results.append(self._score(event, block, known, onset, detected, prices))
+                        apply(event['user'], event['debt'], 0, -event['debt_covered'])
+                        apply(event['user'], event['collateral'], -event['liquidated_collateral'], 0)
+                        reassess(event['user'], block)
+                    else:
+                        coll_sign, debt_sign = POSITION_EVENTS[kind]
+                        user = event['user']
+                        apply(user, event['asset'], coll_sign * event['amount'], debt_sign * event['amount'])
+                        if kind == 'supply' and user not in seen_suppliers:
+                            seen_suppliers.add(user)
+                            suppliers.append(user)
+                        reassess(user, block)
+
+                # 价格变化后的下一次价格监听
+                if p['watcher'] and changed_assets:
+                    tick = start + -(-(block - start) // watcher_every) * watcher_every
+                    if not any(task == WATCHER for _, task, _ in schedule):
+                        heapq.heappush(schedule, (tick, WATCHER, watcher_every))
+                elif not p['watcher']:
+                    changed_assets.clear()
+                continue
+
+            block, task, every = heapq.heappop(schedule)
+            if task == DISCOVERY:
+                for user in suppliers[discovered:]:
+                    known.add(user)
+                    last_refresh[user] = block  # 新用户的 last_updated 为插入时间
+                discovered = len(suppliers)
+            elif task == UPDATE:
+                for user in known:
+                    if block - last_refresh[user] >= update_age:
+                        refresh(user, block)
+            elif task == WATCHER:
+                affected = set()
+                for asset in changed_assets:
+                    affected |= asset_index.users_for(asset)
+                changed_assets.clear()
+                for user in affected:
+                    if refresh(user, block) < min_hf:
+                        detect(user, block)
+                # 价格监听只在有价格变化时才需要调度
+                continue
+            elif task == FINDER:
+                for user in flagged:
+                    detect(user, block)
+            heapq.heappush(schedule, (block + every, task, every))
+
+        return self._report(results)
+
+    def _score(self, event: Dict, block: int, known, onset, detected, prices) -> Dict:
+        """评估机器人对一次实际清算的表现"""
+        user = event['user']
+        profit = (
+            event['liquidated_collateral'] * prices.get(event['collateral'], 0.0)
+            - event['debt_covered'] * prices.get(event['debt'], 0.0)
+        )
+        start = onset.get(user, block)
+        detected_at = detected.get(user)
+        if detected_at is not None and detected_at + self.params['execution_delay'] <= block:
+            outcome = 'captured'
+        elif detected_at is not None:
+            outcome = 'late'
+        elif user not in known:
+            outcome = 'undiscovered'
+        else:
+            outcome = 'undetected'
+        return {
+            'user': user,
+            'block': block,
+            'onset': start,
+            'detected_at': detected_at,
+            'blocks_to_detect': detected_at - start if detected_at is not None else None,
+            'profit': profit,
+            'outcome': outcome
+        }
+
+    @staticmethod
+    def _report(results: List[Dict]) -> Dict:
+        captured = [r for r in results if r['outcome'] == 'captured']
+        delays = [r['blocks_to_detect'] for r in results if r['blocks_to_detect'] is not None]
+        outcomes = defaultdict(int)
+        for r in results:
+            outcomes[r['outcome']] += 1
+        return {
+            'liquidations': len(results),
+            'captured': len(captured),
+            'capture_rate': len(captured) / len(results) if results else 0.0,
+            'outcomes': dict(outcomes),
+            'blocks_to_detect': {
+                'p50': _percentile(delays, 50),
+                'p90': _percentile(delays, 90),
+                'p99': _percentile(delays, 99),
+                'max': max(delays) if delays else None
+            },
+            'captured_profit': sum(r['profit'] for r in captured),
+            'missed_profit': sum(r['profit'] for r in results if r['outcome'] != 'captured'),
+            'results': results
+        }
@@ -0,0 +1,5 @@
+"""
+性能基准模块
+
+运行方式: python -m monitor.bench.<模块名>
+"""
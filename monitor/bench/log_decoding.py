@@ -0,0 +1,127 @@
+"""
+日志解码基准：对比 web3 事件解码路径与原始日志路径的吞吐量（日志/秒）
+
+两条路径解析同一份合成的 eth_getLogs 响应，不访问网络:
+    python -m monitor.bench.log_decoding --logs 20000
+"""
+
+# 标准库
+import os
+import json
+import time
+import random
+import argparse
+from typing import Set
+
+# 第三方库
+from web3 import Web3
+from web3.providers.base import BaseProvider
+
+# 本地导入
+from ..utils.log_decoder import EventDecoder, RawLogClient, event_topic, find_event_abi
+from ..config import CONTRACTS
+
+def _load_pool_abi():
+    abi_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'abi', 'AavePool.json')
+    with open(abi_path) as f:
+        contract_json = json.load(f)
+    return contract_json['abi'] if isinstance(contract_json, dict) else contract_json
+
+def build_response(supply_abi, count: int, distinct_users: int) -> bytes:
+    """构造包含 count 条 Supply 日志的 eth_getLogs 响应"""
+    rng = random.Random(42)
+    topic0 = event_topic(supply_abi)
+    users = ['%040x' % rng.getrandbits(160) for _ in range(distinct_users)]
+    reserves = ['%040x' % rng.getrandbits(160) for _ in range(16)]
+
+    logs = []
+    for i in range(count):
+        user = rng.choice(users)
+        logs.append({
+            'address': CONTRACTS['AAVE_POOL'].lower(),
+            'topics': [
+                topic0,
+                '0x' + '0' * 24 + rng.choice(reserves),  # reserve
+                '0x' + '0' * 24 + user,  # onBehalfOf
+                '0x' + '%064x' % 0  # referralCode
+            ],
+            'data': '0x' + '0' * 24 + user + '%064x' % rng.getrandbits(96),
+            'blockNumber': hex(28542429 + i // 10),
+            'transactionHash': '0x' + '%064x' % rng.getrandbits(256),
+            'transactionIndex': hex(i % 10),
+            'blockHash': '0x' + '%064x' % (i // 10),
+            'logIndex': hex(i % 10),
+            'removed': False
+        })
+    return json.dumps({'jsonrpc': '2.0', 'id': 1, 'result': logs}).encode()
+
+class CannedProvider(BaseProvider):
+    """对任意请求返回固定 JSON 响应的 provider，保留 web3 的完整解析流程"""
+
+    def __init__(self, content: bytes):
+        super().__init__()
+        self.content = content
+
+    def make_request(self, method, params):
+        return json.loads(self.content)
+
+    def is_connected(self, show_traceback: bool = False) -> bool:
+        return True
+
+class CannedLogClient(RawLogClient):
+    def __init__(self, content: bytes):
+        super().__init__('http://localhost')
+        self.content = content
+
+    def _post(self, payload: bytes) -> bytes:
+        return self.content
+
+def bench_web3(content: bytes, abi) -> Set[str]:
+    """当前路径: contract.events.Supply().get_logs + event.args.user"""
+    web3 = Web3(CannedProvider(content))
+    pool = web3.eth.contract(address=CONTRACTS['AAVE_POOL'], abi=abi)
+    users = set()
+    for event in pool.events.Supply().get_logs(fromBlock=0, toBlock=1):
+        users.add(event.args.user)
+    return users
+
+def bench_raw(content: bytes, abi) -> Set[str]:
+    """原始路径: eth_getLogs + 预编译解码器"""
+    client = CannedLogClient(content)
+    decoder = EventDecoder(find_event_abi(abi, 'Supply'), fields=('user',))
+    decode = decoder.decode
+    users = set()
+    for log in client.get_logs(CONTRACTS['AAVE_POOL'], [decoder.topic0], 0, 1):
+        users.add(decode(log)['user'])
+    return users
+
+def run(name: str, fn, content: bytes, abi, count: int, repeat: int) -> Set[str]:
+    best = float('inf')
+    result = set()
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn(content, abi)
+        best = min(best, time.perf_counter() - started)
+    print(f"{name:<8} {count / best:>14,.0f} 日志/秒  ({best * 1000:.1f} ms)")
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="日志解码吞吐量基准")
+    parser.add_argument('--logs', type=int, default=20000, help="日志条数")
+    parser.add_argument('--users', type=int, default=20000, help="不同用户数")
+    parser.add_argument('--repeat', type=int, default=1, help="重复次数，取最快一次")
+    args = parser.parse_args()
+
+    abi = _load_pool_abi()
+    content = build_response(find_event_abi(abi, 'Supply'), args.logs, args.users)
+    print(f"响应大小 {len(content) / 1e6:.1f} MB，{args.logs} 条日志")
+
+    web3_users = run('web3', bench_web3, content, abi, args.logs, args.repeat)
+    raw_users = run('raw', bench_raw, content, abi, args.logs, args.repeat)
+
+    if web3_users != raw_users:
+        raise SystemExit("两条路径解码出的用户集合不一致")
+    print(f"两条路径结果一致，共 {len(raw_users)} 个用户")
+
+if __name__ == "__main__":
+    main()
@@ -4,18 +4,42 @@
 
 from .config import (
     WEB3,
+    AAVE_V3_DEPLOY_BLOCK,
+    BLOCK_CHUNK,
     CONTRACTS,
+    MARKETS,
+    ENABLED_MARKETS,
     TOKENS,
     DECIMALS,
     DB_CONFIG,
-    MONITOR_CONFIG
+    MONITOR_CONFIG,
+    SNAPSHOT_CONFIG,
+    OPPORTUNITY_QUEUE_CONFIG,
+    WALLET_CONFIG,
+    PROFILE_CONFIG,
+    RETENTION_CONFIG,
+    RPC_CACHE_CONFIG,
+    INTEREST_CONFIG,
+    TX_TEMPLATE_CONFIG
 )
 
 __all__ = [
     'WEB3',
+    'AAVE_V3_DEPLOY_BLOCK',
+    'BLOCK_CHUNK',
     'CONTRACTS',
+    'MARKETS',
+    'ENABLED_MARKETS',
     'TOKENS',
     'DECIMALS',
     'DB_CONFIG',
-    'MONITOR_CONFIG'
+    'MONITOR_CONFIG',
+    'SNAPSHOT_CONFIG',
+    'OPPORTUNITY_QUEUE_CONFIG',
+    'WALLET_CONFIG',
+    'PROFILE_CONFIG',
+    'RETENTION_CONFIG',
+    'RPC_CACHE_CONFIG',
+    'INTEREST_CONFIG',
+    'TX_TEMPLATE_CONFIG'
 ] 
\ No newline at end of file
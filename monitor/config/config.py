@@ -2,6 +2,7 @@ from web3 import Web3
 from typing import List, Dict
 from datetime import datetime, timezone
 import os
+import json
 from dotenv import load_dotenv
 
 # 加载环境变量
@@ -18,11 +19,29 @@ BLOCK_CHUNK = 20000
 CONTRACTS = {
     'AAVE_POOL': '0x794a61358D6845594F94dc1DB02A252b5b4814aD',
     'AAVE_POOL_DATA_PROVIDER': '0x69FA688f1Dc47d4B5d8029D5a35FB7a548310654',
+    'AAVE_ORACLE': '0xb56c2F0B653B2e0b10C9b928C8580Ac5Df02C7C7',
     'LIQUIDATOR': '0x332c9dFa5B630c967BC3B36eA7087aBb53AE0170', # 部署后填入
     'WETH': '0x82aF49447D8a07e3bd95BD0d56f35241523fBab1',
+    'MULTICALL3': '0xcA11bde05977b3631167028862bE2a173976CA11',
     'UNISWAP_V3_FACTORY': '0x1F98431c8aD98523631AE4a59f267346ea31F984'  # Arbitrum上的Uniswap V3工厂合约
 }
 
+# 市场配置：每个市场独立的 RPC、合约地址和扫描起点，同一进程内共享事件循环、数据库和签名账户
+# MARKETS_FILE 指向的 JSON 文件按同样的结构追加或覆盖市场
+MARKETS = {
+    'arbitrum': {
+        'rpc_url': ARBITRUM_RPC,
+        'deploy_block': AAVE_V3_DEPLOY_BLOCK,
+        'contracts': CONTRACTS
+    }
+}
+if os.getenv('MARKETS_FILE'):
+    with open(os.getenv('MARKETS_FILE')) as f:
+        MARKETS.update(json.load(f))
+
+# 启用的市场（逗号分隔）
+ENABLED_MARKETS = [name for name in os.getenv('ENABLED_MARKETS', 'arbitrum').split(',') if name]
+
 
 # 代币配置
 TOKENS = {
@@ -44,10 +63,12 @@ DECIMALS = {
 
 # 数据库配置
 DB_CONFIG = {
+    'backend': os.getenv('DB_BACKEND', 'mysql'),  # mysql: 网络数据库, sqlite: 进程内嵌入式数据库（单机部署）
     'host': os.getenv('DB_HOST', 'localhost'),
     'user': os.getenv('DB_USER', 'root'),
     'password': os.getenv('DB_PASSWORD', ''),
-    'database': os.getenv('DB_NAME', 'aave_liquidation')
+    'database': os.getenv('DB_NAME', 'aave_liquidation'),
+    'path': os.getenv('DB_PATH', 'data/monitor.db')  # sqlite 数据库文件路径
 }
 
 # 监控配置
@@ -57,4 +78,67 @@ MONITOR_CONFIG = {
     'min_liquidation_value': 10,  # 最小清算价值(USD)
     'max_gas_price': 150,  # 最大 gas 价格(Gwei)
     'min_profit': 0.00001  # 最小利润(USD)
+}
+
+# 状态快照配置
+SNAPSHOT_CONFIG = {
+    'path': os.getenv('SNAPSHOT_PATH', 'data/state.snap'),  # 快照文件路径
+    'interval': int(os.getenv('SNAPSHOT_INTERVAL', 10*60))  # 快照间隔(秒)
+}
+
+# 内存清算机会队列配置
+OPPORTUNITY_QUEUE_CONFIG = {
+    'ttl': int(os.getenv('OPPORTUNITY_TTL', 60)),  # 机会有效期(秒)
+    'max_age_blocks': int(os.getenv('OPPORTUNITY_MAX_AGE_BLOCKS', 10)),  # 发现后最多保留的区块数
+    'audit_interval': int(os.getenv('OPPORTUNITY_AUDIT_INTERVAL', 30))  # 审计记录写库间隔(秒)
+}
+
+# 签名账户池配置
+WALLET_CONFIG = {
+    'max_in_flight': int(os.getenv('WALLET_MAX_IN_FLIGHT', 1)),  # 每个账户同时等待确认的交易数
+    'min_balance': float(os.getenv('WALLET_MIN_BALANCE', 0.001)),  # 账户最低余额(ETH)，低于该值不再分配交易
+    'balance_refresh_interval': int(os.getenv('WALLET_BALANCE_REFRESH_INTERVAL', 60))  # 余额不足的账户重新读取余额的间隔(秒)
+}
+
+# 性能分析配置
+PROFILE_CONFIG = {
+    'dir': os.getenv('PROFILE_DIR', 'data/profiles'),  # 折叠栈输出目录
+    'sample_interval': float(os.getenv('PROFILE_SAMPLE_INTERVAL', 0.005)),  # 采样间隔(秒)
+    'slow_cycles': int(os.getenv('PROFILE_SLOW_CYCLES', 10)),  # 每个任务保留的最慢周期数
+    'tasks': [name for name in os.getenv('PROFILE_TASKS', '').split(',') if name]  # SIGUSR1 分析的任务，为空时分析全部
+}
+
+# 清算机会保留配置
+RETENTION_CONFIG = {
+    'interval': int(os.getenv('RETENTION_INTERVAL', 5*60)),  # 执行间隔(秒)
+    'max_age': int(os.getenv('RETENTION_MAX_AGE', 60*60)),  # 未执行机会最长保留时间(秒)
+    'min_age': int(os.getenv('RETENTION_MIN_AGE', 5*60)),  # 被取代或已恢复的机会最短保留时间(秒)，需大于回执等待时间
+    'batch_size': int(os.getenv('RETENTION_BATCH_SIZE', 500)),  # 每个事务处理的记录数
+    'archive_dir': os.getenv('RETENTION_ARCHIVE_DIR', '')  # 设置时归档为 gzip JSONL 文件，否则归档到数据库
+}
+
+# RPC 录制/回放配置
+RPC_CACHE_CONFIG = {
+    'mode': os.getenv('RPC_CACHE_MODE', ''),  # record: 录制, replay: 离线回放, 为空时不启用
+    'path': os.getenv('RPC_CACHE_PATH', 'data/rpc_cache.sqlite'),  # 存储文件路径
+    'pin_block': int(os.getenv('RPC_PIN_BLOCK')) if os.getenv('RPC_PIN_BLOCK') else None  # 固定区块，默认为录制开始时的最新区块
+} 
+
+# 利息推算配置
+INTEREST_CONFIG = {
+    'enabled': os.getenv('INTEREST_PROJECTION', 'true').lower() in ('1', 'true', 'yes'),  # 定时更新时用储备指数推算健康因子
+    'block_time': float(os.getenv('BLOCK_TIME', 0.25)),  # 平均出块时间(秒)，用于由区块号估算时间戳
+    'confirm_health_factor': float(os.getenv('INTEREST_CONFIRM_HF', 1.02)),  # 推算健康因子低于该值时从链上确认
+    'drift_sample_size': int(os.getenv('INTEREST_DRIFT_SAMPLE', 20)),  # 每轮抽样与链上对比的用户数
+    'max_projection_age': int(os.getenv('INTEREST_MAX_PROJECTION_AGE', 24*60*60))  # 头寸超过该时间(秒)未从链上读取时不再推算
+} 
+
+# 预签名交易配置
+TX_TEMPLATE_CONFIG = {
+    'enabled': os.getenv('TX_TEMPLATES', 'true').lower() in ('1', 'true', 'yes'),  # 为最接近清算的用户预先构建并签名交易
+    'interval': int(os.getenv('TX_TEMPLATE_INTERVAL', 2)),  # 刷新间隔(秒)
+    'candidates': int(os.getenv('TX_TEMPLATE_CANDIDATES', 20)),  # 维护模板的用户数
+    'max_health_factor': float(os.getenv('TX_TEMPLATE_MAX_HF', 1.05)),  # 健康因子低于该值的用户才会成为候选
+    'gas_price_bump': float(os.getenv('TX_TEMPLATE_GAS_BUMP', 1.1)),  # 签名时 gas 价格的上浮比例
+    'max_age': float(os.getenv('TX_TEMPLATE_MAX_AGE', 30))  # 模板最长使用期限(秒)
 } 
\ No newline at end of file
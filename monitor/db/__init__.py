@@ -4,18 +4,28 @@
 
 from .models import (
     Base,
+    DEFAULT_MARKET,
     User,
     Position,
     LiquidationOpportunity,
-    TokenPrice,
+    LiquidationOpportunityArchive,
+    ScanStatus,
     init_db
 )
+from .storage import MYSQL, SQLITE, SQLITE_PRAGMAS, database_url, create_storage_engine
 
 __all__ = [
     'Base',
+    'DEFAULT_MARKET',
     'User',
     'Position',
     'LiquidationOpportunity',
-    'TokenPrice',
-    'init_db'
+    'LiquidationOpportunityArchive',
+    'ScanStatus',
+    'init_db',
+    'MYSQL',
+    'SQLITE',
+    'SQLITE_PRAGMAS',
+    'database_url',
+    'create_storage_engine'
 ] 
\ No newline at end of file
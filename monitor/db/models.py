@@ -1,33 +1,50 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, ForeignKey, Index, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime, timezone
 
+from .storage import create_storage_engine
+
 Base = declarative_base()
 
+# 单市场部署和迁移前的数据都属于该市场
+DEFAULT_MARKET = 'arbitrum'
+
 class User(Base):
     __tablename__ = 'users'
     
     id = Column(Integer, primary_key=True)
-    address = Column(String(42), unique=True, nullable=False)
+    market = Column(String(32), nullable=False, default=DEFAULT_MARKET)
+    address = Column(String(42), nullable=False)
     health_factor = Column(Float)
     total_collateral_eth = Column(Float)
     total_debt_eth = Column(Float)
     last_updated = Column(DateTime, default=lambda: datetime.now(timezone.utc))
     positions = relationship("Position", back_populates="user")
     liquidation_opportunities = relationship("LiquidationOpportunity", back_populates="user")
+    
+    # 同一地址在不同市场中是不同的用户；发现和预签名任务按市场查找健康因子最低的用户
+    __table_args__ = (
+        UniqueConstraint('market', 'address', name='uq_users_market_address'),
+        Index('ix_users_market_health_factor', 'market', 'health_factor'),
+    )
 
 class Position(Base):
     __tablename__ = 'positions'
     
     id = Column(Integer, primary_key=True)
-    user_id = Column(Integer, ForeignKey('users.id'))
+    user_id = Column(Integer, ForeignKey('users.id'), index=True)  # sqlite 不会为外键自动建索引
     token_address = Column(String(42))
     token_symbol = Column(String(10))
     collateral_amount = Column(Float)
     debt_amount = Column(Float)
     collateral_usd = Column(Float)
     debt_usd = Column(Float)
+    # 缩放余额（除以储备指数后的数量），配合储备指数推算任意时刻的抵押和债务
+    scaled_collateral = Column(Float)
+    scaled_variable_debt = Column(Float)
+    stable_debt = Column(Float)
+    usage_as_collateral = Column(Boolean, default=True)
     last_updated = Column(DateTime, default=lambda: datetime.now(timezone.utc))
     user = relationship("User", back_populates="positions")
 
@@ -35,7 +52,8 @@ class LiquidationOpportunity(Base):
     __tablename__ = 'liquidation_opportunities'
     
     id = Column(Integer, primary_key=True)
-    user_id = Column(Integer, ForeignKey('users.id'))
+    market = Column(String(32), nullable=False, default=DEFAULT_MARKET)
+    user_id = Column(Integer, ForeignKey('users.id'), index=True)
     collateral_token = Column(String(42))
     debt_token = Column(String(42))
     collateral_amount = Column(Float)
@@ -45,17 +63,45 @@ class LiquidationOpportunity(Base):
     is_profitable = Column(Boolean, default=False)
     executed = Column(Boolean, default=False)
     execution_tx = Column(String(66))
+    block_number = Column(Integer)  # 发现时的区块
+    expired = Column(Boolean, default=False)
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
     user = relationship("User", back_populates="liquidation_opportunities")
+    
+    # 保留任务按市场、状态和创建时间查找过期及待归档记录
+    __table_args__ = (
+        Index('ix_liquidation_opportunities_state', 'market', 'executed', 'expired', 'created_at'),
+    )
+
+class LiquidationOpportunityArchive(Base):
+    """已执行或已过期的清算机会，由保留任务从 liquidation_opportunities 批量迁入"""
+    __tablename__ = 'liquidation_opportunities_archive'
+    
+    id = Column(Integer, primary_key=True)  # 沿用原表 id
+    market = Column(String(32))
+    user_id = Column(Integer)
+    collateral_token = Column(String(42))
+    debt_token = Column(String(42))
+    collateral_amount = Column(Float)
+    debt_amount = Column(Float)
+    health_factor = Column(Float)
+    estimated_profit_eth = Column(Float)
+    is_profitable = Column(Boolean)
+    executed = Column(Boolean)
+    execution_tx = Column(String(66))
+    block_number = Column(Integer)
+    expired = Column(Boolean)
+    created_at = Column(DateTime)
 
 class ScanStatus(Base):
     __tablename__ = 'scan_status'
     
     id = Column(Integer, primary_key=True)
+    market = Column(String(32), nullable=False, unique=True, default=DEFAULT_MARKET)
     last_scanned_block = Column(Integer, nullable=False)
 
 def init_db(db_url: str):
     """初始化数据库"""
-    engine = create_engine(db_url)
+    engine = create_storage_engine(db_url)
     Base.metadata.create_all(engine)
     return engine
\ No newline at end of file
@@ -0,0 +1,60 @@
+# 标准库
+import os
+from typing import Dict, Optional
+
+# 第三方库
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+
+MYSQL = 'mysql'
+SQLITE = 'sqlite'
+
+# 单机部署的嵌入式库：WAL 下读写互不阻塞，每次提交只追加写入 WAL 而不是同步整个库文件
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',  # WAL 模式下断电最多丢失最后几个事务，不会损坏数据库
+    'temp_store': 'MEMORY',
+    'cache_size': -64 * 1024,  # 页缓存 64MB（负数单位为 KB）
+    'mmap_size': 256 * 1024 * 1024,
+    'busy_timeout': 5000,  # 快照等其他连接写入时等待而不是立即报错(毫秒)
+    'foreign_keys': 'ON'
+}
+
+def database_url(config: Dict) -> str:
+    """按存储后端生成数据库 URL
+
+    Args:
+        config: DB_CONFIG，backend 为 mysql 时使用 host / user / password / database，
+            为 sqlite 时使用 path
+
+    Raises:
+        ValueError: 未知的存储后端
+    """
+    backend = config.get('backend', MYSQL)
+    if backend == MYSQL:
+        return f"mysql+pymysql://{config['user']}:{config['password']}@{config['host']}/{config['database']}"
+    if backend == SQLITE:
+        os.makedirs(os.path.dirname(config['path']) or '.', exist_ok=True)
+        return f"sqlite:///{config['path']}"
+    raise ValueError(f"未知的存储后端: {backend}")
+
+def create_storage_engine(db_url: str, pragmas: Optional[Dict] = None) -> Engine:
+    """创建数据库引擎
+
+    sqlite 在进程内运行，省去每次查询的网络往返；每个新连接建立时设置 pragma。
+
+    Args:
+        db_url: 数据库 URL
+        pragmas: sqlite 的 pragma，默认使用 SQLITE_PRAGMAS，其他后端忽略
+    """
+    engine = create_engine(db_url)
+    if engine.dialect.name == SQLITE:
+        pragmas = SQLITE_PRAGMAS if pragmas is None else pragmas
+
+        @event.listens_for(engine, 'connect')
+        def _set_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+            cursor.close()
+    return engine
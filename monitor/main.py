@@ -3,14 +3,20 @@ import asyncio
 import signal
 from datetime import timezone
 
-from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
 
 from monitor.tasks.task_manager import TaskManager
-from monitor.utils.aave_data import AaveDataProvider
-from monitor.config import WEB3, CONTRACTS, DB_CONFIG, MONITOR_CONFIG
+from monitor.utils.market import load_markets
+from monitor.utils.snapshot import restore_state
+from monitor.utils.profiler import rpc_timing_middleware, install_db_timing
+from monitor.utils.rpc_cache import rpc_cache_from_config
+from monitor.config import (
+    WEB3, DB_CONFIG, MONITOR_CONFIG, SNAPSHOT_CONFIG, PROFILE_CONFIG, RPC_CACHE_CONFIG,
+    MARKETS, ENABLED_MARKETS
+)
 from monitor.db.models import init_db
+from monitor.db.storage import database_url
 
 async def cleanup():
     # 等待所有任务完成
@@ -24,23 +30,45 @@ async def main():
     # 加载环境变量
     load_dotenv()
     
-    # 初始化数据库
-    db_url = f"mysql+pymysql://{DB_CONFIG['user']}:{DB_CONFIG['password']}@{DB_CONFIG['host']}/{DB_CONFIG['database']}"
-    engine = init_db(db_url)
+    # 初始化数据库，DB_BACKEND=sqlite 时使用进程内的嵌入式数据库
+    engine = init_db(database_url(DB_CONFIG))
+    print(f"存储后端: {engine.dialect.name}")
     Session = sessionmaker(bind=engine)
+    
+    # 初始化各市场，RPC 地址相同的市场共享同一个 Web3 连接
+    web3_instances = {WEB3.provider.endpoint_uri: WEB3}
+    markets = load_markets(MARKETS, ENABLED_MARKETS, web3_instances)
+    print(f"启用市场: {', '.join(market.name for market in markets)}")
+    
+    # 按任务周期统计 RPC 和数据库耗时
+    install_db_timing(engine)
+    for web3 in {id(market.web3): market.web3 for market in markets}.values():
+        web3.middleware_onion.add(rpc_timing_middleware, 'rpc_timing')
+    
+    # 录制或回放 RPC，放在最内层直接读写节点的原始响应；固定区块只对一条链有意义，只覆盖第一个市场所在的链
+    rpc_cache = rpc_cache_from_config(RPC_CACHE_CONFIG)
+    if rpc_cache is not None:
+        markets[0].web3.middleware_onion.inject(rpc_cache.middleware, 'rpc_cache', layer=0)
+        print(f"RPC 缓存模式: {rpc_cache.mode}，存储: {rpc_cache.store.path}")
     db_session = Session()
     
-    # 初始化 Aave 数据提供者
-    aave_data_provider = AaveDataProvider(
-        WEB3,
-        CONTRACTS['AAVE_POOL'],
-        CONTRACTS['AAVE_POOL_DATA_PROVIDER']
-    )
+    # 从快照恢复状态，之后只需补扫快照区块之后的日志
+    for i, market in enumerate(markets):
+        try:
+            restore_state(
+                db_session,
+                market.snapshot_path(SNAPSHOT_CONFIG['path'], default=i == 0),
+                market=market.name
+            )
+        except Exception as e:
+            db_session.rollback()
+            print(f"市场 {market.name} 从快照恢复失败，将从数据库状态启动: {str(e)}")
     
     # 初始化任务管理器
     task_manager = TaskManager(
         db_session,
-        aave_data_provider,
+        markets,
+        rpc_cache=rpc_cache
     )
     
     def signal_handler(signum, frame):
@@ -55,6 +83,13 @@ async def main():
         signal.signal(signal.SIGINT, signal_handler)
         signal.signal(signal.SIGTERM, signal_handler)
     
+    # kill -USR1 <pid>: 对下一轮执行采样分析并输出最慢周期
+    if hasattr(signal, 'SIGUSR1'):
+        def profile_handler():
+            print(task_manager.profile_report())
+            task_manager.request_profile(PROFILE_CONFIG['tasks'])
+        loop.add_signal_handler(signal.SIGUSR1, profile_handler)
+    
     try:
         print("启动监控程序...")
         await task_manager.start()
@@ -63,6 +98,9 @@ async def main():
     finally:
         db_session.close()
         engine.dispose()
+        if rpc_cache is not None:
+            print(f"RPC 缓存命中 {rpc_cache.hits} 次，未命中 {rpc_cache.misses} 次")
+            rpc_cache.store.close()
 
 if __name__ == "__main__":
     try:
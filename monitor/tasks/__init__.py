@@ -6,6 +6,11 @@
 - 用户更新任务
 - 清算机会发现任务
 - 清算执行任务
+- 状态快照任务
+- 价格监听任务
+- 清算机会审计任务
+- 清算机会保留任务
+- 预签名交易任务
 """
 
 from .base_task import BaseTask
@@ -13,6 +18,11 @@ from .user_discovery import UserDiscoveryTask
 from .user_update import UserUpdateTask
 from .opportunity_finder import OpportunityFinderTask
 from .liquidation_executor import LiquidationExecutorTask
+from .state_snapshot import StateSnapshotTask
+from .price_watcher import PriceWatcherTask
+from .opportunity_audit import OpportunityAuditTask
+from .opportunity_retention import OpportunityRetentionTask
+from .tx_template import TxTemplateTask
 from .task_manager import TaskManager
 
 __all__ = [
@@ -21,5 +31,10 @@ __all__ = [
     'UserUpdateTask',
     'OpportunityFinderTask',
     'LiquidationExecutorTask',
+    'StateSnapshotTask',
+    'PriceWatcherTask',
+    'OpportunityAuditTask',
+    'OpportunityRetentionTask',
+    'TxTemplateTask',
     'TaskManager'
 ] 
\ No newline at end of file
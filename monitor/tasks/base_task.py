@@ -1,31 +1,94 @@
 # 标准库
+import os
 import asyncio
 from datetime import datetime, timezone
 from typing import Optional
 
+# 本地导入
+from ..config import PROFILE_CONFIG
+from ..utils.profiler import SamplingProfiler, SlowCycleLog, begin_cycle, end_cycle
+
 class BaseTask:
     def __init__(self, name: str, interval: int):
         self.name = name
         self.interval = interval
         self.last_run: Optional[datetime] = None
         self._running = False
+        self._wakeup = asyncio.Event()
+        
+        # 常开的慢周期记录，以及按需开启的采样分析
+        self.slow_cycles = SlowCycleLog(PROFILE_CONFIG['slow_cycles'])
+        self._profile_requested = False
+        
+        # 累计的周期数和分阶段耗时，用于按市场汇总资源占用
+        self.totals = {'cycles': 0, 'total': 0.0, 'rpc': 0.0, 'db': 0.0, 'rpc_calls': 0, 'db_calls': 0}
         
     async def start(self):
         """启动任务"""
         self._running = True
         while self._running:
+            timer, token = begin_cycle(self.name)
+            profiler = self._start_profiler() if self._profile_requested else None
             try:
                 self.last_run = datetime.now(timezone.utc)
                 await self.execute()
             except Exception as e:
                 print(f"{self.name} 任务执行出错: {str(e)}")
             finally:
-                await asyncio.sleep(self.interval)
+                end_cycle(timer, token)
+                self.slow_cycles.record(timer)
+                self._accumulate(timer.breakdown())
+                if profiler is not None:
+                    self._finish_profiler(profiler)
+                await self._sleep()
+    
+    async def _sleep(self):
+        """等待下一个周期，被 trigger() 唤醒时提前返回"""
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+    
+    def _accumulate(self, cycle: dict):
+        self.totals['cycles'] += 1
+        for key in ('total', 'rpc', 'db', 'rpc_calls', 'db_calls'):
+            self.totals[key] += cycle[key]
+    
+    def request_profile(self):
+        """对下一轮执行进行采样分析，并立即唤醒任务"""
+        self._profile_requested = True
+        self.trigger()
+    
+    def _start_profiler(self) -> SamplingProfiler:
+        self._profile_requested = False
+        profiler = SamplingProfiler(
+            type(self).execute.__code__,
+            interval=PROFILE_CONFIG['sample_interval'],
+            owner=self
+        )
+        profiler.start()
+        return profiler
+    
+    def _finish_profiler(self, profiler: SamplingProfiler):
+        profiler.stop()
+        filename = f"{type(self).__name__}-{datetime.now(timezone.utc):%Y%m%d-%H%M%S}.folded"
+        path = os.path.join(PROFILE_CONFIG['dir'], filename)
+        try:
+            samples = profiler.write_collapsed(path)
+            print(f"{self.name} 采样分析完成: {samples} 个样本，已写入 {path}")
+        except OSError as e:
+            print(f"写入采样分析结果失败: {str(e)}")
+    
+    def trigger(self):
+        """立即唤醒任务执行下一轮，不必等待定时器"""
+        self._wakeup.set()
     
     async def stop(self):
         """停止任务"""
         self._running = False
+        self.trigger()
     
     async def execute(self):
         """执行任务，需要子类实现"""
-        raise NotImplementedError() 
\ No newline at end of file
+        raise NotImplementedError()
@@ -1,135 +1,410 @@
 # 标准库
-import os
-from datetime import datetime
-from typing import List, Dict, Optional
+import time
+import asyncio
+from typing import Dict, List, Optional, Set, Tuple
 
 # 第三方库
-from sqlalchemy.orm import Session
 from web3 import Web3
-from eth_account import Account
-from eth_account.signers.local import LocalAccount
+from web3.exceptions import TimeExhausted
 
 # 本地导入
 from .base_task import BaseTask
-from ..db.models import LiquidationOpportunity
+from .opportunity_audit import OpportunityAuditTask
 from ..config import MONITOR_CONFIG
 from ..utils.aave_data import AaveDataProvider
+from ..utils.opportunity_queue import OpportunityQueue, opportunity_key
+from ..utils.wallet_pool import WalletLane, WalletPool
+from ..utils.tx_templates import LatencyLog, TxTemplate, TxTemplateCache
 
 class LiquidationExecutorTask(BaseTask):
     def __init__(
         self,
         interval: int,
-        db_session: Session,
         web3: Web3,
-        private_key: str,
+        aave_data: AaveDataProvider,
+        wallet_pool: WalletPool,
         liquidator_address: str,
-        min_profit_eth: float
+        min_profit_eth: float,
+        opportunity_queue: OpportunityQueue,
+        audit: Optional[OpportunityAuditTask] = None,
+        receipt_timeout: int = 120,
+        templates: Optional[TxTemplateCache] = None
     ):
         super().__init__("清算执行", interval)
-        self.db = db_session
         self.web3 = web3
-        self.account: LocalAccount = Account.from_key(private_key)
-        self.contract = AaveDataProvider._load_contract(web3, liquidator_address, 'Liquidator.json')
+        self.aave = aave_data
+        self.wallets = wallet_pool
+        self.contract = aave_data._load_contract(liquidator_address, 'Liquidator.json')
         self.min_profit_eth = min_profit_eth
+        self.queue = opportunity_queue
+        self.audit = audit
+        self.receipt_timeout = receipt_timeout
+        self.templates = templates
         
-    def check_gas_price(self, max_gas_price_gwei: int) -> bool:
+        # 机会入队到交易广播的延迟，按预签名 / 现场构建分别统计
+        self.latency = LatencyLog()
+        self._chain_id: Optional[int] = None
+
+        # 正在清算的用户，同一用户同时只发送一笔交易
+        self._active_users: Set[str] = set()
+        self._in_flight: Set[asyncio.Task] = set()
+        self.executed_count = 0
+
+        self.wallets.refresh_balances()
+
+        # 新机会入队时立即唤醒，定时器只作为兜底
+        self.queue.add_listener(self.trigger)
+        
+    async def check_gas_price(self, max_gas_price_gwei: int) -> bool:
         """检查 gas 价格是否在可接受范围内"""
-        current_gas_price = self.web3.eth.gas_price
+        current_gas_price = await self.aave.coalescer.gas_price()
         return current_gas_price <= Web3.to_wei(max_gas_price_gwei, 'gwei')
     
     async def execute_liquidation(
         self,
+        lane: WalletLane,
         user: str,
         debt_token: str,
         coll_token: str,
         debt_amount: int,
         uniswap_pool: str,
-        gas_price: Optional[int] = None
+        gas_price: Optional[int] = None,
+        triggered_at: Optional[float] = None
     ) -> Optional[str]:
-        """执行清算"""
+        """使用指定账户执行清算，结束后归还账户"""
+        broadcast = False
+        nonce = None
         try:
-            # 构建交易
-            tx = self.contract.functions.liquidate(
-                user,
-                debt_token,
-                coll_token,
-                debt_amount,
-                uniswap_pool
-            ).build_transaction({
-                'from': self.account.address,
-                'gas': 2000000,  # 预估 gas
-                'gasPrice': gas_price if gas_price else self.web3.eth.gas_price,
-                'nonce': self.web3.eth.get_transaction_count(self.account.address)
-            })
+            if not gas_price:
+                gas_price = await self.aave.coalescer.gas_price()
+            chain_id = await self.chain_id()
+            await self.wallets.sync_nonce(lane)
+            nonce = self.wallets.next_nonce(lane)
+            
+            # 构建、签名和发送在线程中执行，多个账户的清算互不等待
+            tx_hash = await asyncio.to_thread(
+                self._build_and_send,
+                lane,
+                self.contract.functions.liquidate(
+                    user,
+                    debt_token,
+                    coll_token,
+                    debt_amount,
+                    uniswap_pool
+                ),
+                {
+                    'from': lane.address,
+                    'gas': 2000000,  # 预估 gas
+                    'gasPrice': gas_price,
+                    'nonce': nonce,
+                    'chainId': chain_id
+                }
+            )
+            broadcast = True
+            if triggered_at is not None:
+                self.latency.record('build', time.monotonic() - triggered_at)
+            
+            return await self._wait_receipt(tx_hash)
+            
+        except TimeExhausted:
+            self.wallets.mark_stuck(lane, nonce)
+            print(f"清算交易等待确认超时，暂停使用账户 {lane.address} (nonce {nonce})")
+            return None
             
-            # 签名交易
-            signed_tx = self.account.sign_transaction(tx)
+        except Exception as e:
+            print(f"清算执行失败 ({lane.address}): {str(e)}")
+            return None
+        
+        finally:
+            # 未广播的交易没有消耗 nonce，重新同步
+            self.wallets.release(lane, resync=not broadcast)
+            if broadcast:
+                await self.wallets.refresh_lane(lane)
+    
+    async def send_template(
+        self,
+        lane: WalletLane,
+        template: TxTemplate,
+        user: str,
+        debt_token: str,
+        coll_token: str,
+        triggered_at: Optional[float] = None
+    ) -> Optional[str]:
+        """直接发送预签名交易，结束后归还账户
+
+        账户 nonce 已被其他交易占用时按模板的池子和数量现场构建。
+        """
+        if lane.nonce != template.nonce:
+            return await self.execute_liquidation(
+                lane, user, debt_token, coll_token, template.debt_amount, template.uniswap_pool,
+                triggered_at=triggered_at
+            )
             
-            # 发送交易
-            tx_hash = self.web3.eth.send_raw_transaction(signed_tx.rawTransaction)
+        broadcast = False
+        try:
+            self.wallets.next_nonce(lane)
+            tx_hash = await asyncio.to_thread(self.web3.eth.send_raw_transaction, template.raw_transaction)
+            broadcast = True
+            if triggered_at is not None:
+                self.latency.record('template', time.monotonic() - triggered_at)
             
-            # 等待交易确认
-            receipt = self.web3.eth.wait_for_transaction_receipt(tx_hash)
+            return await self._wait_receipt(tx_hash)
             
-            if receipt['status'] == 1:
-                return self.web3.to_hex(tx_hash)
+        except TimeExhausted:
+            self.wallets.mark_stuck(lane, template.nonce)
+            print(f"预签名交易等待确认超时，暂停使用账户 {lane.address} (nonce {template.nonce})")
             return None
             
         except Exception as e:
-            print(f"清算执行失败: {str(e)}")
+            print(f"发送预签名交易失败 ({lane.address}): {str(e)}")
             return None
         
-    async def execute(self):
-        """执行清算任务"""
-        # 获取未执行的清算机会
-        opportunities = self.db.query(LiquidationOpportunity).filter_by(
-            executed=False,
-            is_profitable=True
-        ).order_by(
-            LiquidationOpportunity.estimated_profit_eth.desc()
-        ).all()
+        finally:
+            self.wallets.release(lane, resync=not broadcast)
+            if broadcast:
+                await self.wallets.refresh_lane(lane)
+    
+    def _build_and_send(self, lane: WalletLane, function, params: Dict):
+        """构建、签名并发送交易，返回交易哈希"""
+        tx = function.build_transaction(params)
+        signed_tx = lane.account.sign_transaction(tx)
+        return self.web3.eth.send_raw_transaction(signed_tx.rawTransaction)
+    
+    async def chain_id(self) -> int:
+        """链 ID 只读取一次，构建交易时不再查询"""
+        if self._chain_id is None:
+            self._chain_id = await asyncio.to_thread(lambda: self.web3.eth.chain_id)
+        return self._chain_id
+    
+    async def _wait_receipt(self, tx_hash) -> Optional[str]:
+        """在线程中等待交易确认，不阻塞其他账户的清算"""
+        receipt = await asyncio.to_thread(
+            self.web3.eth.wait_for_transaction_receipt,
+            tx_hash,
+            self.receipt_timeout
+        )
+        
+        if receipt['status'] == 1:
+            return self.web3.to_hex(tx_hash)
+        return None
+    
+    async def refresh_templates(self, candidates: List[Dict]) -> int:
+        """为候选机会构建预签名交易，账户、nonce、gas 价格、池子和数量都未变的模板保持不动
+
+        每个可用账户只持有一个模板，签名使用该账户的下一个 nonce，超出账户数的候选不构建模板。
+
+        Args:
+            candidates: user / collateral_token / debt_token / debt_amount（按代币精度换算后的数量），按优先级排序
+
+        Returns:
+            重新签名的模板数
+        """
+        lanes = self.wallets.usable_lanes()
+        if not lanes:
+            self.templates.retain(())
+            return 0
+        
+        gas_price = self.templates.signing_gas_price(await self.aave.coalescer.gas_price())
+        chain_id = await self.chain_id()
         
-        executed_count = 0
-        for opp in opportunities:
+        # 已有模板的账户仍可用时沿用，避免候选顺序变化导致全部重签；其余候选依次分配空闲账户
+        candidates = candidates[:len(lanes)]
+        assigned: Dict[Tuple[str, str, str], WalletLane] = {}
+        free = list(lanes)
+        for candidate in candidates:
+            current = self.templates.get(opportunity_key(candidate))
+            lane = next((lane for lane in free if current is not None and lane.address == current.lane_address), None)
+            if lane is not None:
+                assigned[opportunity_key(candidate)] = lane
+                free.remove(lane)
+        for candidate in candidates:
+            if opportunity_key(candidate) not in assigned:
+                assigned[opportunity_key(candidate)] = free.pop(0)
+        
+        keys = []
+        rebuilt = 0
+        for candidate in candidates:
+            key = opportunity_key(candidate)
+            keys.append(key)
+            lane = assigned[key]
             try:
-                # 检查 gas 价格
-                if not self.check_gas_price(MONITOR_CONFIG['max_gas_price']):
-                    print(f"Gas 价格过高，暂停清算")
-                    break
+                uniswap_pool = await self.aave.find_best_pool(
+                    candidate['debt_token'],
+                    candidate['collateral_token']
+                )
+                if not uniswap_pool:
+                    continue
+                debt_config = await self.aave.get_reserve_config(candidate['debt_token'])
+                debt_amount = int(candidate['debt_amount'] * 10 ** debt_config['decimals'])
                 
-                # 获取用户地址
-                user = opp.user
+                current = self.templates.get(key)
+                await self.wallets.sync_nonce(lane)
+                nonce = lane.nonce
+                if current is not None and self.templates.reusable(current, lane.address, nonce, uniswap_pool, debt_amount):
+                    continue
                 
-                # 执行清算
+                tx = self.contract.functions.liquidate(
+                    candidate['user'],
+                    candidate['debt_token'],
+                    candidate['collateral_token'],
+                    debt_amount,
+                    uniswap_pool
+                ).build_transaction({
+                    'from': lane.address,
+                    'gas': 2000000,  # 预估 gas
+                    'gasPrice': gas_price,
+                    'nonce': nonce,
+                    'chainId': chain_id
+                })
+                # 签名是纯计算，放入线程避免阻塞事件循环
+                signed_tx = await asyncio.to_thread(lane.account.sign_transaction, tx)
+                self.templates.put(TxTemplate(
+                    key, lane.address, nonce, gas_price, uniswap_pool, debt_amount, signed_tx.rawTransaction
+                ))
+                rebuilt += 1
+            except Exception as e:
+                print(f"构建预签名交易失败 ({candidate['user']}): {str(e)}")
+        
+        self.templates.retain(keys)
+        return rebuilt
+    
+    async def _take_template(self, opp: Dict, gas_price: int) -> Optional[TxTemplate]:
+        """取出与机会匹配且仍然有效的预签名交易"""
+        if self.templates is None or not len(self.templates):
+            return None
+        try:
+            debt_config = await self.aave.get_reserve_config(opp['debt_token'])
+        except Exception:
+            return None
+        debt_amount = int(opp['debt_amount'] * 10 ** debt_config['decimals'])
+        # 只传入可用账户，模板账户正忙时不移除模板，计为未命中；取出后同步分配账户，中间没有 await
+        lane_nonces = {lane.address: lane.nonce for lane in self.wallets.usable_lanes()}
+        return self.templates.take(opp, debt_amount, lane_nonces, gas_price)
+    
+    async def _liquidate(self, opp: Dict, lane: WalletLane, template: Optional[TxTemplate] = None):
+        """清算单个机会，在独立的协程中运行；有预签名交易时直接发送"""
+        if template is None:
+            try:
                 # 查找最佳 Uniswap 池子
                 uniswap_pool = await self.aave.find_best_pool(
-                    opp.debt_token,
-                    opp.collateral_token
+                    opp['debt_token'],
+                    opp['collateral_token']
                 )
                 
                 if not uniswap_pool:
                     print(f"未找到合适的 Uniswap 池子，跳过清算")
-                    continue
-                
-                tx_hash = await self.execute_liquidation(
-                    user.address,
-                    opp.debt_token,
-                    opp.collateral_token,
-                    int(opp.debt_amount * 1e18),
-                    uniswap_pool
-                )
+                    self.wallets.release(lane)
+                    self._finish(opp)
+                    return
                 
-                if tx_hash:
-                    print(f"清算成功: {tx_hash}")
-                    opp.executed = True
-                    opp.execution_tx = tx_hash
-                    executed_count += 1
-                    
-                    # 每次执行成功后提交
-                    self.db.commit()
+                # 按债务代币精度换算为链上数量
+                debt_config = await self.aave.get_reserve_config(opp['debt_token'])
+                debt_amount = int(opp['debt_amount'] * 10 ** debt_config['decimals'])
                 
             except Exception as e:
                 print(f"执行清算失败: {str(e)}")
+                self.wallets.release(lane)
+                self._finish(opp)
+                return
+            
+        # execute_liquidation / send_template 负责归还账户
+        try:
+            if template is not None:
+                tx_hash = await self.send_template(
+                    lane,
+                    template,
+                    opp['user'],
+                    opp['debt_token'],
+                    opp['collateral_token'],
+                    triggered_at=opp.get('queued_at')
+                )
+            else:
+                tx_hash = await self.execute_liquidation(
+                    lane,
+                    opp['user'],
+                    opp['debt_token'],
+                    opp['collateral_token'],
+                    debt_amount,
+                    uniswap_pool,
+                    triggered_at=opp.get('queued_at')
+                )
+            
+            if tx_hash:
+                self.executed_count += 1
+                print(f"清算成功: {tx_hash} (账户 {lane.address})")
+                
+                # 执行结果异步写入审计记录
+                if self.audit is not None:
+                    self.audit.record_executed(opp, tx_hash)
+        finally:
+            self._finish(opp)
+    
+    def active_users(self) -> Set[str]:
+        """正在清算或仍在队列中等待清算的用户"""
+        return self._active_users | self.queue.users()
+    
+    def _finish(self, opp: Dict):
+        self._active_users.discard(opp['user'])
+        # 账户空出后立即分发队列中剩余的机会
+        self.trigger()
+        
+    async def execute(self):
+        """将清算机会分发给空闲账户并行执行"""
+        # 卡住的账户在交易打包后、余额不足的账户在充值后恢复分配
+        await self.wallets.check_stuck()
+        await self.wallets.check_low_balances()
+        
+        current_block = await self.aave.get_block_number()
+        self.queue.expire(current_block)
+        
+        if not self.queue:
+            return
         
-        if executed_count > 0:
-            print(f"成功执行了 {executed_count} 笔清算") 
\ No newline at end of file
+        # 检查 gas 价格
+        if not await self.check_gas_price(MONITOR_CONFIG['max_gas_price']):
+            print(f"Gas 价格过高，暂停清算")
+            return
+            
+        # 同一区块内命中请求合并层的缓存，不产生新的 RPC
+        gas_price = await self.aave.coalescer.gas_price()
+        
+        deferred = []
+        dispatched = 0
+        while self.wallets.available():
+            # 取出利润最高且未过期的清算机会
+            opp = self.queue.pop(current_block)
+            if opp is None:
+                break
+
+            if opp['estimated_profit_eth'] < self.min_profit_eth:
+                continue
+
+            # 同一用户的清算仍未确认，等其结束后再处理
+            if opp['user'] in self._active_users:
+                deferred.append(opp)
+                continue
+                
+            # 优先使用预签名交易，模板对应的账户不可用时现场构建
+            template = await self._take_template(opp, gas_price)
+            lane = self.wallets.acquire(template.lane_address) if template is not None else None
+            if lane is None:
+                template = None
+                lane = self.wallets.acquire()
+            self._active_users.add(opp['user'])
+            task = asyncio.create_task(self._liquidate(opp, lane, template))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+            dispatched += 1
+                
+        for opp in deferred:
+            self.queue.put(opp, notify=False)
+                
+        if dispatched > 0:
+            print(f"分发了 {dispatched} 笔清算，{len(self._in_flight)} 笔等待确认")
+
+    async def stop(self):
+        """停止前等待在途交易结束"""
+        await super().stop()
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+                
\ No newline at end of file
@@ -0,0 +1,147 @@
+# 标准库
+from typing import Dict, List, Optional, Tuple
+
+# 第三方库
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+# 本地导入
+from .base_task import BaseTask
+from ..db.models import DEFAULT_MARKET, User, LiquidationOpportunity
+
+class OpportunityAuditTask(BaseTask):
+    """异步写入清算机会审计记录
+
+    发现和执行清算机会时只把记录放入内存缓冲区，由本任务定期批量写入数据库，
+    数据库不再处于发现 -> 执行的关键路径上。
+    """
+
+    def __init__(self, interval: int, db_session: Session, max_tracked: int = 10000):
+        super().__init__("清算机会审计", interval)
+        self.db = db_session
+        self.max_tracked = max_tracked
+        self._found: List[Dict] = []
+        self._executed: List[Tuple[Dict, str]] = []
+        # (市场, 用户, 抵押品, 债务) -> 未执行记录的 id，执行结果按 id 更新，不持有 ORM 对象
+        self._record_ids: Dict[Tuple[str, str, str, str], int] = {}
+
+    @staticmethod
+    def _key(opportunity: Dict) -> Tuple[str, str, str, str]:
+        return (
+            opportunity.get('market', DEFAULT_MARKET),
+            opportunity['user'],
+            opportunity['collateral_token'],
+            opportunity['debt_token']
+        )
+
+    def record_found(self, opportunity: Dict):
+        """记录新发现的清算机会"""
+        self._found.append(opportunity)
+
+    def record_executed(self, opportunity: Dict, tx_hash: str):
+        """记录已执行的清算机会"""
+        self._executed.append((opportunity, tx_hash))
+
+    async def execute(self):
+        """批量写入缓冲的审计记录"""
+        if not self._found and not self._executed:
+            return
+
+        found, self._found = self._found, []
+        executed, self._executed = self._executed, []
+
+        try:
+            self._write(found, executed)
+        except Exception as e:
+            self.db.rollback()
+            # 回滚后本批次新插入记录的 id 已失效
+            self._record_ids.clear()
+            print(f"写入 {len(found)} 条发现记录和 {len(executed)} 条执行记录失败: {str(e)}")
+            return
+
+        # 从未执行的机会不会被移除，超过上限时丢弃最早的映射
+        while len(self._record_ids) > self.max_tracked:
+            del self._record_ids[next(iter(self._record_ids))]
+
+    def _pending_record_id(self, key: Tuple[str, str, str, str], user_id: Optional[int]) -> Optional[int]:
+        """查找同一机会最新的未执行、未过期记录"""
+        market, _, collateral_token, debt_token = key
+        return self.db.query(LiquidationOpportunity.id).filter(
+            LiquidationOpportunity.market == market,
+            LiquidationOpportunity.user_id == user_id,
+            LiquidationOpportunity.collateral_token == collateral_token,
+            LiquidationOpportunity.debt_token == debt_token,
+            LiquidationOpportunity.executed == False,
+            LiquidationOpportunity.expired == False
+        ).order_by(LiquidationOpportunity.id.desc()).limit(1).scalar()
+
+    def _write(self, found: List[Dict], executed: List[Tuple[Dict, str]]):
+        """在一个事务中写入发现和执行记录"""
+        # 各市场共用一个审计任务，用户按 (市场, 地址) 定位
+        user_ids = {
+            (market, address): user_id
+            for market, address, user_id in self.db.query(User.market, User.address, User.id).filter(
+                User.address.in_({opp['user'] for opp in found} | {opp['user'] for opp, _ in executed})
+            )
+        }
+
+        for opp in found:
+            key = self._key(opp)
+            market = key[0]
+            user_id = user_ids.get((market, opp['user']))
+            values = {
+                'collateral_amount': opp['collateral_amount'],
+                'debt_amount': opp['debt_amount'],
+                'health_factor': opp['health_factor'],
+                'estimated_profit_eth': opp['estimated_profit_eth'],
+                'block_number': opp.get('block_number')
+            }
+
+            # 同一机会已有未执行、未过期的记录时更新该记录，不重复插入
+            record_id = self._record_ids.get(key)
+            if record_id is None:
+                record_id = self._pending_record_id(key, user_id)
+
+            if record_id is not None and self.db.execute(
+                update(LiquidationOpportunity)
+                .where(LiquidationOpportunity.id == record_id, LiquidationOpportunity.executed == False)
+                .values(**values)
+            ).rowcount:
+                self._record_ids[key] = record_id
+                continue
+
+            record = LiquidationOpportunity(
+                market=market,
+                user_id=user_id,
+                collateral_token=opp['collateral_token'],
+                debt_token=opp['debt_token'],
+                is_profitable=True,
+                **values
+            )
+            self.db.add(record)
+            self.db.flush()
+            self._record_ids[key] = record.id
+
+        # found 先于 executed 处理，同一批次内发现并执行的机会此时也已有记录
+        for opp, tx_hash in executed:
+            key = self._key(opp)
+            record_id = self._record_ids.pop(key, None)
+            if record_id is None:
+                # 映射被丢弃或在回滚后清空时按未执行记录查找
+                record_id = self._pending_record_id(key, user_ids.get((key[0], opp['user'])))
+            if record_id is not None:
+                self.db.execute(
+                    update(LiquidationOpportunity)
+                    .where(LiquidationOpportunity.id == record_id)
+                    .values(executed=True, execution_tx=tx_hash)
+                )
+
+        self.db.commit()
+
+    async def stop(self):
+        """停止前写入剩余记录"""
+        await super().stop()
+        try:
+            await self.execute()
+        except Exception as e:
+            print(f"写入剩余审计记录失败: {str(e)}")
@@ -1,14 +1,18 @@
 # 标准库
+import time
+import asyncio
 from datetime import datetime
-from typing import List, Dict
+from typing import Iterable, List, Dict, Optional, Set
 
 # 第三方库
 from sqlalchemy.orm import Session
 
 # 本地导入
 from .base_task import BaseTask
-from ..db.models import User, Position, LiquidationOpportunity
+from .opportunity_audit import OpportunityAuditTask
+from ..db.models import DEFAULT_MARKET, User, Position
 from ..utils.aave_data import AaveDataProvider
+from ..utils.opportunity_queue import OpportunityQueue
 from ..config import MONITOR_CONFIG, CONTRACTS
 
 class OpportunityFinderTask(BaseTask):
@@ -16,27 +20,68 @@ class OpportunityFinderTask(BaseTask):
         self,
         interval: int,
         db_session: Session,
-        aave_data: AaveDataProvider
+        aave_data: AaveDataProvider,
+        opportunity_queue: OpportunityQueue,
+        audit: Optional[OpportunityAuditTask] = None,
+        market: str = DEFAULT_MARKET,
+        weth_address: str = CONTRACTS['WETH']
     ):
         super().__init__("清算机会发现", interval)
         self.db = db_session
         self.aave = aave_data
+        self.queue = opportunity_queue
+        self.audit = audit
+        self.market = market
+        self.weth_address = weth_address
+        self.found_total = 0
+        
+        # 清算价格索引或重新评估给出的可清算用户，跳过存量健康因子过滤直接检查
+        self.pending_users: Set[str] = set()
+        self._last_full_scan: Optional[float] = None
+        
+    def request_check(self, addresses: Iterable[str]):
+        """将用户加入待检查队列并立即唤醒任务"""
+        self.pending_users.update(addresses)
+        self.trigger()
         
     async def execute(self):
         """查找清算机会"""
-        opportunities = []
-        
         # 获取 ETH 价格
-        eth_price = await self.aave.get_asset_price(CONTRACTS['WETH'])
+        eth_price = await self.aave.get_asset_price(self.weth_address)
         if not eth_price:
             print("无法获取 ETH 价格")
             return
+        
+        # 先检查被事件触发的用户
+        if self.pending_users:
+            addresses = list(self.pending_users)
+            self.pending_users.clear()
+            users = self.db.query(User).filter(
+                User.market == self.market,
+                User.address.in_(addresses)
+            ).all()
+            await self._find_opportunities(users, eth_price)
+        
+        # 被提前唤醒时不重复执行定时全量扫描
+        now = time.monotonic()
+        if self._last_full_scan is not None and now - self._last_full_scan < self.interval:
+            return
+        self._last_full_scan = now
             
         # 查找健康因子低于阈值的用户
         users = self.db.query(User).filter(
+            User.market == self.market,
             User.health_factor < MONITOR_CONFIG['min_health_factor']
         ).all()
         
+        await self._find_opportunities(users, eth_price)
+        
+    async def _find_opportunities(self, users: List[User], eth_price: float):
+        """检查用户的每个抵押品和债务组合，有利可图的清算机会直接放入执行队列"""
+        if not users:
+            return
+        
+        block_number = await self.aave.get_block_number()
         found_count = 0
         for user in users:
             try:
@@ -58,47 +103,37 @@ class OpportunityFinderTask(BaseTask):
                         profit_usd, is_profitable = await self.aave.calculate_liquidation_profit(
                             coll_pos.token_address,  # 抵押品代币
                             debt_pos.token_address,  # 债务代币
-                            int(debt_pos.debt_amount * 1e18)  # 债务金额
+                            debt_pos.debt_amount  # 债务数量（已按代币精度换算）
                         )
                         
                         # 将 USD 利润转换为 ETH
                         profit_eth = profit_usd / eth_price
                         
                         if is_profitable and profit_eth >= MONITOR_CONFIG['min_profit']:
-                            # 检查是否已存在相同的未执行机会
-                            existing = self.db.query(LiquidationOpportunity).filter_by(
-                                user_id=user.id,
-                                collateral_token=coll_pos.token_address,
-                                debt_token=debt_pos.token_address,
-                                executed=False
-                            ).first()
-                            
-                            if not existing:
-                                opportunity = LiquidationOpportunity(
-                                    user_id=user.id,
-                                    collateral_token=coll_pos.token_address,
-                                    debt_token=debt_pos.token_address,
-                                    collateral_amount=coll_pos.collateral_amount,
-                                    debt_amount=debt_pos.debt_amount,
-                                    health_factor=user.health_factor,
-                                    estimated_profit_eth=profit_eth,
-                                    is_profitable=True
-                                )
-                                self.db.add(opportunity)
+                            # 队列按 (用户, 抵押品, 债务) 去重，重复发现时以最新数据替换
+                            opportunity = {
+                                'market': self.market,
+                                'user': user.address,
+                                'collateral_token': coll_pos.token_address,
+                                'debt_token': debt_pos.token_address,
+                                'collateral_amount': coll_pos.collateral_amount,
+                                'debt_amount': debt_pos.debt_amount,
+                                'health_factor': user.health_factor,
+                                'estimated_profit_eth': profit_eth,
+                                'block_number': block_number
+                            }
+                            # 队列中已有的机会被重复发现时不计数，审计记录异步写入数据库
+                            if self.queue.put(opportunity):
                                 found_count += 1
+                                if self.audit is not None:
+                                    self.audit.record_found(opportunity)
                                 
-                                opportunities.append({
-                                    'user': user.address,
-                                    'collateral_token': coll_pos.token_address,
-                                    'debt_token': debt_pos.token_address,
-                                    'debt_amount': debt_pos.debt_amount,
-                                    'estimated_profit': profit_eth
-                                })
+                            # 让出事件循环，执行任务可以立即处理新机会
+                            await asyncio.sleep(0)
                 
             except Exception as e:
                 print(f"处理用户 {user.address} 的清算机会时出错: {str(e)}")
         
-        self.db.commit()
-        
+        self.found_total += found_count
         if found_count > 0:
             print(f"发现 {found_count} 个新的清算机会") 
\ No newline at end of file
@@ -0,0 +1,197 @@
+# 标准库
+import os
+import gzip
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Callable, List, Optional, Set
+
+# 第三方库
+from sqlalchemy import and_, delete, exists, insert, or_, select, update
+from sqlalchemy.orm import Session, aliased
+
+# 本地导入
+from .base_task import BaseTask
+from ..db.models import DEFAULT_MARKET, User, LiquidationOpportunity, LiquidationOpportunityArchive
+from ..utils.log_decoder import dumps
+
+_ARCHIVE_COLUMNS = [
+    'id', 'market', 'user_id', 'collateral_token', 'debt_token', 'collateral_amount', 'debt_amount',
+    'health_factor', 'estimated_profit_eth', 'is_profitable', 'executed', 'execution_tx',
+    'block_number', 'expired', 'created_at'
+]
+
+class OpportunityRetentionTask(BaseTask):
+    """清算机会表的保留策略
+
+    1. 将创建超过 max_age 秒，或创建超过 min_age 秒且已被同一 (用户, 抵押品, 债务) 的新记录取代、
+       用户健康因子已经恢复的未执行记录标记为过期；
+    2. 将已执行和已过期的记录按批次迁入归档表，或写入 gzip 压缩的 JSONL 文件后删除。
+
+    min_age 需大于执行任务等待交易回执的时间，执行结果写回之前记录不会被过期；
+    仍在执行队列中或正在清算的用户的记录无论新旧都不处理。
+
+    每个批次都是独立的短事务，按主键操作，不会长时间锁表，
+    热表大小只取决于最近 max_age 秒内发现的机会数。
+    """
+
+    def __init__(
+        self,
+        interval: int,
+        db_session: Session,
+        max_age: int = 60*60,
+        min_age: int = 5*60,
+        active_users: Optional[Callable[[], Set[str]]] = None,
+        min_health_factor: float = 1.0,
+        batch_size: int = 500,
+        archive_dir: Optional[str] = None,
+        market: str = DEFAULT_MARKET
+    ):
+        """
+        Args:
+            interval: 执行间隔(秒)
+            db_session: 数据库会话
+            max_age: 未执行机会的最长保留时间(秒)
+            min_age: 被取代或已恢复的机会的最短保留时间(秒)，需大于交易回执的等待时间
+            active_users: 返回仍在执行队列中或正在清算的用户地址，这些用户的记录不过期
+            min_health_factor: 用户健康因子不低于该值时视为已恢复
+            batch_size: 每个事务处理的记录数
+            archive_dir: 设置时归档到该目录下的 gzip 文件，否则归档到数据库归档表
+            market: 只处理该市场的记录
+        """
+        super().__init__("清算机会保留", interval)
+        self.db = db_session
+        self.max_age = max_age
+        self.min_age = min_age
+        self.active_users = active_users
+        self.min_health_factor = min_health_factor
+        self.batch_size = batch_size
+        self.archive_dir = archive_dir
+        self.market = market
+
+    async def execute(self):
+        """标记过期记录并归档"""
+        now = datetime.now(timezone.utc)
+        opp = LiquidationOpportunity
+
+        def older_than(seconds: int):
+            # 旧版本写入的记录没有创建时间，视为已超过
+            return or_(opp.created_at < now - timedelta(seconds=seconds), opp.created_at.is_(None))
+
+        # 只处理已超过回执等待时间的记录
+        pending = and_(
+            opp.market == self.market,
+            opp.executed == False,
+            opp.expired == False,
+            older_than(self.min_age)
+        )
+        active = self.active_users() if self.active_users is not None else set()
+        if active:
+            owner = aliased(User)
+            pending = and_(pending, ~exists().where(owner.id == opp.user_id, owner.address.in_(active)))
+
+        # 超过最大保留时间
+        expired = await self._expire(select(opp.id).where(pending, older_than(self.max_age)))
+
+        # 被同一用户、同一币对的新记录取代
+        newer = aliased(LiquidationOpportunity)
+        expired += await self._expire(
+            select(opp.id).where(pending, exists().where(
+                newer.user_id == opp.user_id,
+                newer.collateral_token == opp.collateral_token,
+                newer.debt_token == opp.debt_token,
+                newer.id > opp.id
+            ))
+        )
+
+        # 用户健康因子已恢复
+        expired += await self._expire(
+            select(opp.id).join(User, User.id == opp.user_id).where(
+                pending, User.health_factor >= self.min_health_factor
+            )
+        )
+
+        archived = await self._archive()
+
+        if expired or archived:
+            print(f"过期了 {expired} 条清算机会，归档了 {archived} 条")
+
+    async def _expire(self, query) -> int:
+        """按批次将查询到的记录标记为过期
+
+        Returns:
+            标记的记录数
+        """
+        total = 0
+        while True:
+            ids = self.db.scalars(query.limit(self.batch_size)).all()
+            if not ids:
+                return total
+            self.db.execute(
+                update(LiquidationOpportunity)
+                .where(LiquidationOpportunity.id.in_(ids))
+                .values(expired=True)
+            )
+            self.db.commit()
+            total += len(ids)
+            # 批次之间让出事件循环
+            await asyncio.sleep(0)
+
+    async def _archive(self) -> int:
+        """按批次迁出已执行和已过期的记录
+
+        Returns:
+            迁出的记录数
+        """
+        opp = LiquidationOpportunity
+        total = 0
+        while True:
+            ids = self.db.scalars(
+                select(opp.id)
+                .where(opp.market == self.market, or_(opp.executed == True, opp.expired == True))
+                .order_by(opp.id)
+                .limit(self.batch_size)
+            ).all()
+            if not ids:
+                return total
+
+            try:
+                if self.archive_dir:
+                    self._write_archive_file(ids)
+                else:
+                    columns = [getattr(opp, name) for name in _ARCHIVE_COLUMNS]
+                    self.db.execute(
+                        insert(LiquidationOpportunityArchive).from_select(
+                            _ARCHIVE_COLUMNS,
+                            select(*columns).where(opp.id.in_(ids))
+                        )
+                    )
+                self.db.execute(delete(opp).where(opp.id.in_(ids)))
+                self.db.commit()
+            except Exception as e:
+                self.db.rollback()
+                print(f"归档清算机会失败: {str(e)}")
+                return total
+
+            total += len(ids)
+            await asyncio.sleep(0)
+
+    def _write_archive_file(self, ids: List[int]):
+        """将记录追加到当天的 gzip JSONL 文件"""
+        opp = LiquidationOpportunity
+        rows = self.db.execute(
+            select(*[getattr(opp, name) for name in _ARCHIVE_COLUMNS]).where(opp.id.in_(ids))
+        ).all()
+
+        os.makedirs(self.archive_dir, exist_ok=True)
+        path = os.path.join(
+            self.archive_dir,
+            f"opportunities-{datetime.now(timezone.utc):%Y%m%d}.jsonl.gz"
+        )
+        # 追加写入会产生多成员 gzip 文件，gzip/zcat 均可直接读取
+        with gzip.open(path, 'ab') as f:
+            for row in rows:
+                record = dict(zip(_ARCHIVE_COLUMNS, row))
+                if record['created_at'] is not None:
+                    record['created_at'] = record['created_at'].isoformat()
+                f.write(dumps(record))
+                f.write(b'\n')
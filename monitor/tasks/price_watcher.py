@@ -0,0 +1,312 @@
+# 标准库
+import time
+import asyncio
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+# 第三方库
+from web3 import Web3
+
+# 本地导入
+from .base_task import BaseTask
+from ..utils.aave_data import AaveDataProvider, load_abi
+from ..utils.asset_index import AssetUserIndex
+from ..utils.liquidation_index import LiquidationPriceIndex
+from ..utils.log_decoder import EventDecoder, RawLogClient, find_event_abi
+from ..utils.rpc_cache import RpcCache
+from ..utils.interest import ReserveIndexTracker
+from ..config import BLOCK_CHUNK
+
+# 改变用户头寸的 Pool 事件 -> 用户字段
+POSITION_EVENTS = {
+    'Supply': 'onBehalfOf',
+    'Withdraw': 'user',
+    'Borrow': 'onBehalfOf',
+    'Repay': 'user',
+    'LiquidationCall': 'user',
+    'ReserveUsedAsCollateralEnabled': 'user',
+    'ReserveUsedAsCollateralDisabled': 'user',
+    'UserEModeSet': 'user'
+}
+
+# 改变用户头寸的 aToken 事件 -> 用户字段，aToken 转账不经过 Pool
+A_TOKEN_EVENTS = {
+    'BalanceTransfer': ('from', 'to')
+}
+
+class PriceWatcherTask(BaseTask):
+    def __init__(
+        self,
+        interval: int,
+        web3: Web3,
+        aave_data: AaveDataProvider,
+        asset_index: AssetUserIndex,
+        on_users_affected: Callable[[Set[str]], None],
+        liquidation_index: Optional[LiquidationPriceIndex] = None,
+        on_users_liquidatable: Optional[Callable[[Set[str]], None]] = None,
+        max_block_range: int = BLOCK_CHUNK,
+        rpc_cache: Optional[RpcCache] = None,
+        on_positions_changed: Optional[Callable[[Set[str]], None]] = None,
+        reserve_indexes: Optional[ReserveIndexTracker] = None,
+        source_refresh_interval: int = 60*60,
+        on_positions_unknown: Optional[Callable[[], None]] = None,
+        near_band: float = 0.05
+    ):
+        super().__init__("价格监听", interval)
+        self.web3 = web3
+        self.aave = aave_data
+        self.price_table = aave_data.price_table
+        self.asset_index = asset_index
+        self.on_users_affected = on_users_affected
+        self.liquidation_index = liquidation_index
+        self.on_users_liquidatable = on_users_liquidatable
+        self.max_block_range = max_block_range
+        self.on_positions_changed = on_positions_changed
+        self.reserve_indexes = reserve_indexes
+        self.source_refresh_interval = source_refresh_interval
+        self.on_positions_unknown = on_positions_unknown
+        # 清算价格与新价格相差在该比例内的用户重新计算清算价格并从链上重新评估
+        self.near_band = near_band
+
+        self.log_client = RawLogClient(web3.provider.endpoint_uri, rpc_cache=rpc_cache)
+        self.answer_decoder = EventDecoder(
+            find_event_abi(load_abi('ChainlinkAggregator.json'), 'AnswerUpdated'),
+            fields=('current',)
+        )
+
+        # 头寸事件和储备指数更新与价格日志在同一个 eth_getLogs 请求中读取
+        pool_abi = load_abi('AavePool.json')
+        a_token_abi = load_abi('AToken.json')
+        self.position_decoders: Dict[str, EventDecoder] = {}
+        if on_positions_changed is not None:
+            for name, field in POSITION_EVENTS.items():
+                decoder = EventDecoder(find_event_abi(pool_abi, name), fields=(field,))
+                self.position_decoders[decoder.topic0] = decoder
+            for name, fields in A_TOKEN_EVENTS.items():
+                decoder = EventDecoder(find_event_abi(a_token_abi, name), fields=fields)
+                self.position_decoders[decoder.topic0] = decoder
+        self.reserve_decoder: Optional[EventDecoder] = None
+        if reserve_indexes is not None:
+            self.reserve_decoder = EventDecoder(find_event_abi(pool_abi, 'ReserveDataUpdated'))
+
+        # 聚合器地址(小写) -> 使用该价格源的资产列表
+        self.aggregators: Dict[str, List[str]] = {}
+        # 聚合器地址(小写) -> 10 ** decimals，非 USD 计价的价格源为 18 位精度
+        self.answer_scales: Dict[str, float] = {}
+        # 价格源没有 Chainlink 聚合器（如比率适配器）的资产，每轮通过 Oracle 批量轮询
+        self.polled_assets: List[str] = []
+        # 各储备的 aToken 地址(小写)，监听 BalanceTransfer
+        self.a_tokens: List[str] = []
+        self.last_block: Optional[int] = None
+        self._sources_resolved_at: Optional[float] = None
+
+    def _resolve_sources(self) -> List[str]:
+        """解析每个储备的 Chainlink 聚合器地址
+
+        价格源代理升级（切换 phase）后 AnswerUpdated 由新的聚合器发出，需要定期重新解析。
+        逐个资产调用合约，由调用方放入工作线程执行。
+
+        Returns:
+            聚合器发生变化的资产（包括新上线的储备）
+        """
+        assets = self.aave.pool.functions.getReservesList().call()
+        aggregators: Dict[str, List[str]] = defaultdict(list)
+        polled: List[str] = []
+
+        for asset in assets:
+            try:
+                source = self.aave.oracle.functions.getSourceOfAsset(asset).call()
+                proxy = self.aave._load_contract(source, 'ChainlinkAggregator.json')
+                aggregator = proxy.functions.aggregator().call().lower()
+                if aggregator not in self.answer_scales:
+                    # 代理和聚合器的精度相同，每个聚合器只读取一次
+                    self.answer_scales[aggregator] = 10 ** proxy.functions.decimals().call()
+                aggregators[aggregator].append(asset)
+            except Exception:
+                # 非 Chainlink 代理的价格源无法监听 AnswerUpdated
+                polled.append(asset)
+
+        def by_asset(sources: Dict[str, List[str]]) -> Dict[str, str]:
+            return {asset: aggregator for aggregator, members in sources.items() for asset in members}
+
+        previous, current = by_asset(self.aggregators), by_asset(aggregators)
+        moved = [asset for asset in assets if previous.get(asset) != current.get(asset)]
+
+        self.aggregators = dict(aggregators)
+        self.polled_assets = polled
+        if self.position_decoders:
+            a_tokens = []
+            for asset in assets:
+                try:
+                    a_tokens.append(self.aave.position_reader.reserve_metadata(asset)['a_token'].lower())
+                except Exception as e:
+                    print(f"读取储备 {asset} 的 aToken 地址失败: {str(e)}")
+            self.a_tokens = a_tokens
+        self._sources_resolved_at = time.monotonic()
+        return moved
+
+    async def _init_sources(self):
+        """解析价格源并加载初始价格"""
+        await asyncio.to_thread(self._resolve_sources)
+        assets = self.polled_assets + [asset for members in self.aggregators.values() for asset in members]
+        self.last_block = await self.aave.get_block_number()
+
+        prices = await asyncio.to_thread(
+            self.aave.oracle.functions.getAssetsPrices(assets).call, block_identifier=self.last_block
+        )
+        for asset, price in zip(assets, prices):
+            self.price_table.update(asset, price / 1e8, self.last_block)
+
+        print(f"价格监听: {len(self.aggregators)} 个聚合器，{len(self.polled_assets)} 个轮询资产")
+
+    async def _poll_oracle(self, assets: List[str], block: int) -> Dict[str, Tuple[Optional[float], float]]:
+        """通过 Oracle 批量读取价格，返回价格变化的资产 -> (旧价格, 新价格)"""
+        changed = {}
+        if not assets:
+            return changed
+        prices = await asyncio.to_thread(
+            self.aave.oracle.functions.getAssetsPrices(assets).call, block_identifier=block
+        )
+        for asset, price in zip(assets, prices):
+            price = price / 1e8
+            previous, applied = self.price_table.update(asset, price, block)
+            if applied and previous != price:
+                changed[asset] = (previous, price)
+        return changed
+
+    async def _read_logs(self, from_block: int, to_block: int) -> Tuple[List[Dict], List[Dict]]:
+        """一次请求读取聚合器的 AnswerUpdated 日志、Pool 和 aToken 的头寸/储备事件
+
+        Returns:
+            (价格日志, Pool 和 aToken 日志)
+        """
+        addresses = list(self.aggregators)
+        topics = [self.answer_decoder.topic0] if self.aggregators else []
+        pool_topics = list(self.position_decoders)
+        if self.reserve_decoder is not None:
+            pool_topics.append(self.reserve_decoder.topic0)
+        if pool_topics:
+            addresses.append(self.aave.pool.address)
+            addresses.extend(self.a_tokens)
+            topics.extend(pool_topics)
+        if not addresses:
+            return [], []
+
+        logs = await self.log_client.get_logs_async(addresses, [topics], from_block, to_block)
+        answers = [log for log in logs if log['address'].lower() in self.aggregators]
+        pool_logs = [log for log in logs if log['address'].lower() not in self.aggregators]
+        return answers, pool_logs
+
+    def _apply_pool_events(self, logs: List[Dict]) -> Set[str]:
+        """用 ReserveDataUpdated 更新储备指数，返回头寸发生变化的用户"""
+        users: Set[str] = set()
+        for log in logs:
+            topic0 = log['topics'][0]
+            decoder = self.position_decoders.get(topic0)
+            if decoder is not None:
+                users.update(decoder.decode(log).values())
+            elif self.reserve_decoder is not None and topic0 == self.reserve_decoder.topic0:
+                event = self.reserve_decoder.decode(log)
+                block = int(log['blockNumber'], 16)
+                # 部分节点在日志中返回区块时间戳，否则按出块时间估算
+                timestamp = (
+                    int(log['blockTimestamp'], 16) if log.get('blockTimestamp')
+                    else self.reserve_indexes.timestamp_at(block)
+                )
+                self.reserve_indexes.update(
+                    event['reserve'],
+                    event['liquidityIndex'],
+                    event['liquidityRate'],
+                    event['variableBorrowIndex'],
+                    event['variableBorrowRate'],
+                    timestamp
+                )
+        return users
+
+    def _read_answers(self, logs: List[Dict]) -> Dict[str, Tuple[Optional[float], float]]:
+        """处理 AnswerUpdated 日志，返回价格变化的资产 -> (旧价格, 新价格)"""
+        changed = {}
+
+        # 同一聚合器在范围内多次更新时只保留最后一次
+        latest: Dict[str, Tuple[Tuple[int, int], Dict]] = {}
+        for log in logs:
+            key = (int(log['blockNumber'], 16), int(log['logIndex'], 16))
+            aggregator = log['address'].lower()
+            if aggregator not in latest or key > latest[aggregator][0]:
+                latest[aggregator] = (key, log)
+
+        for aggregator, (key, log) in latest.items():
+            price = self.answer_decoder.decode(log)['current'] / self.answer_scales.get(aggregator, 1e8)
+            for asset in self.aggregators.get(aggregator, ()):
+                previous, applied = self.price_table.update(asset, price, key[0])
+                if applied and previous != price:
+                    changed[asset] = (previous, price)
+        return changed
+
+    async def execute(self):
+        """跟踪价格更新并把受影响的用户加入重新评估队列"""
+        if self.aave.oracle is None:
+            print("未配置 Aave Oracle，价格监听停止")
+            await self.stop()
+            return
+
+        if self.last_block is None:
+            await self._init_sources()
+            return
+
+        current_block = await self.aave.get_block_number()
+        if current_block <= self.last_block:
+            return
+
+        # 聚合器变化的资产从 Oracle 读取一次，补上旧聚合器停止更新后遗漏的价格
+        resolved: List[str] = []
+        if time.monotonic() - self._sources_resolved_at > self.source_refresh_interval:
+            resolved = await asyncio.to_thread(self._resolve_sources)
+            if resolved:
+                print(f"价格监听: {len(resolved)} 个资产的价格源已变更")
+
+        from_block = self.last_block + 1
+        moved: Set[str] = set()
+        if current_block - from_block > self.max_block_range:
+            # 落后太多时不再逐条回放日志，直接读取全部最新价格；
+            # 期间的头寸事件没有读取，所有用户的推算都要先从链上重新读取头寸
+            assets = await asyncio.to_thread(self.aave.pool.functions.getReservesList().call)
+            changed = await self._poll_oracle(assets, current_block)
+            if self.on_positions_unknown:
+                self.on_positions_unknown()
+        else:
+            answers, pool_logs = await self._read_logs(from_block, current_block)
+            changed = self._read_answers(answers)
+            changed.update(await self._poll_oracle(list(dict.fromkeys(self.polled_assets + resolved)), current_block))
+            moved = self._apply_pool_events(pool_logs)
+        self.last_block = current_block
+
+        # 头寸变化的用户从链上重新读取，其余用户的利息增长由储备指数推算
+        if moved and self.on_positions_changed:
+            self.on_positions_changed(moved)
+
+        if not changed:
+            return
+
+        affected: Set[str] = set()
+        if self.liquidation_index is not None:
+            # 清算价格索引直接给出刚刚跨过清算线的用户，无需等待重新评估
+            crossed: Set[str] = set()
+            near: Set[str] = set()
+            for asset, (old_price, new_price) in changed.items():
+                crossed |= self.liquidation_index.crossed(asset, old_price, new_price)
+                near |= self.liquidation_index.near(asset, new_price, self.near_band)
+            # 只重新计算接近清算线的用户，多个资产同时变化共同导致的可清算也在此发现；
+            # 其余用户离清算线较远，清算价格在下次读取或推算头寸时更新
+            crossed |= self.liquidation_index.reprice(near, self.price_table)
+            if crossed and self.on_users_liquidatable:
+                print(f"区块 {current_block}: {len(crossed)} 个用户跨过清算价格")
+                self.on_users_liquidatable(crossed)
+            affected = crossed | near
+        else:
+            for asset in changed:
+                affected |= self.asset_index.users_for(asset)
+
+        print(f"区块 {current_block}: {len(changed)} 个资产价格更新，{len(affected)} 个用户需要重新评估")
+        if affected:
+            self.on_users_affected(affected)
@@ -0,0 +1,35 @@
+# 标准库
+import time
+import asyncio
+
+# 第三方库
+from sqlalchemy.orm import Session
+
+# 本地导入
+from .base_task import BaseTask
+from ..db.models import DEFAULT_MARKET
+from ..utils.snapshot import dump_state
+
+class StateSnapshotTask(BaseTask):
+    def __init__(
+        self,
+        interval: int,
+        db_session: Session,
+        snapshot_path: str,
+        market: str = DEFAULT_MARKET
+    ):
+        super().__init__("状态快照", interval)
+        self.db = db_session
+        self.snapshot_path = snapshot_path
+        self.market = market
+
+    def _dump(self) -> int:
+        # 在工作线程中使用独立的会话，共享会话不能跨线程使用
+        with Session(bind=self.db.get_bind()) as db:
+            return dump_state(db, self.snapshot_path, market=self.market)
+
+    async def execute(self):
+        """将当前状态写入快照文件，读取整张表和写文件不阻塞其他任务"""
+        started = time.monotonic()
+        block = await asyncio.to_thread(self._dump)
+        print(f"已写入区块 {block} 的状态快照，耗时 {time.monotonic() - started:.2f} 秒")
@@ -1,9 +1,9 @@
 # 标准库
-import os
 import asyncio
-from typing import List
+from typing import Dict, Iterable, List, Optional
 
 # 第三方库
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 
 # 本地导入
@@ -12,61 +12,223 @@ from .user_discovery import UserDiscoveryTask
 from .user_update import UserUpdateTask
 from .opportunity_finder import OpportunityFinderTask
 from .liquidation_executor import LiquidationExecutorTask
-from ..utils.aave_data import AaveDataProvider
-from ..config import MONITOR_CONFIG, CONTRACTS, WEB3
+from .state_snapshot import StateSnapshotTask
+from .price_watcher import PriceWatcherTask
+from .opportunity_audit import OpportunityAuditTask
+from .opportunity_retention import OpportunityRetentionTask
+from .tx_template import TxTemplateTask
+from ..db.models import User
+from ..utils.market import Market
+from ..utils.asset_index import AssetUserIndex
+from ..utils.liquidation_index import LiquidationPriceIndex
+from ..utils.opportunity_queue import OpportunityQueue
+from ..utils.wallet_pool import WalletPool, load_private_keys
+from ..utils.rpc_cache import RpcCache
+from ..utils.tx_templates import TxTemplateCache
+from ..config import (
+    MONITOR_CONFIG, SNAPSHOT_CONFIG, OPPORTUNITY_QUEUE_CONFIG, WALLET_CONFIG, RETENTION_CONFIG,
+    INTEREST_CONFIG, TX_TEMPLATE_CONFIG
+)
 
 class TaskManager:
     def __init__(
         self,
         db_session: Session,
-        aave_data: AaveDataProvider,
+        markets: List[Market],
+        rpc_cache: Optional[RpcCache] = None
     ):
         self.tasks: List[BaseTask] = []
         self.db = db_session
-        self.aave = aave_data
+        self.markets = markets
+        # 录制/回放 RPC 时，绕过 web3 的日志客户端也走同一个缓存（只覆盖第一个市场所在的链）
+        self.rpc_cache = rpc_cache
+        
+        # 市场名 -> 该市场的任务，用于按市场汇总资源占用和吞吐量
+        self.market_tasks: Dict[str, List[BaseTask]] = {}
+        self.user_updates: Dict[str, UserUpdateTask] = {}
+        self.finders: Dict[str, OpportunityFinderTask] = {}
+        self.executors: Dict[str, LiquidationExecutorTask] = {}
+        
+        # chain id -> 签名账户池，同一条链上的市场共用账户和 nonce 序列
+        self.wallet_pools: Dict[int, WalletPool] = {}
+        
+        # 清算机会审计任务 - 各市场共用，异步批量写入发现和执行记录
+        self.opportunity_audit = OpportunityAuditTask(
+            interval=OPPORTUNITY_QUEUE_CONFIG['audit_interval'],
+            db_session=self.db
+        )
         
         # 初始化任务
-        self._init_tasks()
+        for i, market in enumerate(markets):
+            self._init_tasks(market, default=i == 0)
+        self.tasks.append(self.opportunity_audit)
     
-    def _init_tasks(self):
-        """初始化所有任务"""
+    def _wallet_pool(self, web3) -> WalletPool:
+        """返回链对应的签名账户池，不存在时创建
+
+        按 chain id 区分：同一条链上使用不同 RPC 地址的市场也共用账户和 nonce 序列，
+        否则会以同一账户各自分配 nonce 而互相冲突。
+        """
+        key = web3.eth.chain_id
+        if key not in self.wallet_pools:
+            self.wallet_pools[key] = WalletPool(
+                web3,
+                load_private_keys(),
+                max_in_flight=WALLET_CONFIG['max_in_flight'],
+                min_balance_eth=WALLET_CONFIG['min_balance'],
+                balance_refresh_interval=WALLET_CONFIG['balance_refresh_interval']
+            )
+        return self.wallet_pools[key]
+    
+    def _init_tasks(self, market: Market, default: bool):
+        """初始化一个市场的所有任务"""
+        aave = market.aave
+        web3 = market.web3
+        rpc_cache = self.rpc_cache if web3 is self.markets[0].web3 else None
+        
+        # 资产 -> 用户反向索引和清算价格索引，用户更新任务首次执行时从数据库头寸加载，
+        # 价格变化时直接定位刚跨过或接近清算线的用户
+        asset_index = AssetUserIndex()
+        liquidation_index = LiquidationPriceIndex()
+        
+        # 发现 -> 执行之间的内存清算机会队列
+        opportunity_queue = OpportunityQueue(
+            ttl=OPPORTUNITY_QUEUE_CONFIG['ttl'],
+            max_age_blocks=OPPORTUNITY_QUEUE_CONFIG['max_age_blocks']
+        )
+        
+        # 储备指数推算用户的利息增长，头寸事件才从链上重新读取
+        aave.reserve_indexes.block_time = INTEREST_CONFIG['block_time']
+        
         # 用户发现任务 - 每60分钟执行一次
         user_discovery = UserDiscoveryTask(
             interval=60*60,
             db_session=self.db,
-            aave_pool=self.aave.pool
+            aave_pool=aave.pool,
+            start_block=market.deploy_block,
+            rpc_cache=rpc_cache,
+            coalescer=aave.coalescer,
+            web3=web3,
+            market=market.name
+        )
+        
+        # 清算机会发现任务 - 每5分钟执行一次，可清算用户出现时立即执行
+        opportunity_finder = OpportunityFinderTask(
+            interval=5*60,
+            db_session=self.db,
+            aave_data=aave,
+            opportunity_queue=opportunity_queue,
+            audit=self.opportunity_audit,
+            market=market.name,
+            weth_address=market.weth_address
         )
         
         # 用户更新任务 - 每30分钟执行一次
         user_update = UserUpdateTask(
             interval=30*60,
             db_session=self.db,
-            aave_data=self.aave
+            aave_data=aave,
+            asset_index=asset_index,
+            liquidation_index=liquidation_index,
+            on_users_liquidatable=opportunity_finder.request_check,
+            reserve_indexes=aave.reserve_indexes if INTEREST_CONFIG['enabled'] else None,
+            confirm_health_factor=INTEREST_CONFIG['confirm_health_factor'],
+            drift_sample_size=INTEREST_CONFIG['drift_sample_size'],
+            max_projection_age=INTEREST_CONFIG['max_projection_age'],
+            market=market.name
         )
         
-        # 清算机会发现任务 - 每5分钟执行一次
-        opportunity_finder = OpportunityFinderTask(
-            interval=5*60,
-            db_session=self.db,
-            aave_data=self.aave
+        # 价格监听任务 - 每个扫描间隔检查一次价格更新，受影响用户立即重新评估
+        price_watcher = PriceWatcherTask(
+            interval=MONITOR_CONFIG['interval'],
+            web3=web3,
+            aave_data=aave,
+            asset_index=asset_index,
+            on_users_affected=user_update.request_rescore,
+            liquidation_index=liquidation_index,
+            on_users_liquidatable=opportunity_finder.request_check,
+            rpc_cache=rpc_cache,
+            on_positions_changed=user_update.request_rescore if INTEREST_CONFIG['enabled'] else None,
+            reserve_indexes=aave.reserve_indexes if INTEREST_CONFIG['enabled'] else None,
+            on_positions_unknown=user_update.invalidate_projections if INTEREST_CONFIG['enabled'] else None
         )
         
-        # 清算执行任务 - 每1分钟执行一次
+        # 最接近清算的用户的预签名交易，触发时只需广播
+        templates = TxTemplateCache(
+            max_age=TX_TEMPLATE_CONFIG['max_age'],
+            gas_price_bump=TX_TEMPLATE_CONFIG['gas_price_bump']
+        ) if TX_TEMPLATE_CONFIG['enabled'] else None
+        
+        # 清算执行任务 - 每1分钟执行一次，新机会入队时立即分发到空闲账户
         liquidation_executor = LiquidationExecutorTask(
             interval=1*60,
+            web3=web3,
+            aave_data=aave,
+            wallet_pool=self._wallet_pool(web3),
+            liquidator_address=market.liquidator_address,
+            min_profit_eth=MONITOR_CONFIG['min_profit'],
+            opportunity_queue=opportunity_queue,
+            audit=self.opportunity_audit,
+            templates=templates
+        )
+        
+        # 清算机会保留任务 - 过期并归档旧记录，保持热表大小稳定
+        opportunity_retention = OpportunityRetentionTask(
+            interval=RETENTION_CONFIG['interval'],
+            db_session=self.db,
+            # 执行结果在回执返回后才写入，被取代的记录至少保留到回执等待超时之后
+            max_age=RETENTION_CONFIG['max_age'],
+            min_age=max(RETENTION_CONFIG['min_age'], 2 * liquidation_executor.receipt_timeout),
+            active_users=liquidation_executor.active_users,
+            min_health_factor=MONITOR_CONFIG['min_health_factor'],
+            batch_size=RETENTION_CONFIG['batch_size'],
+            archive_dir=RETENTION_CONFIG['archive_dir'] or None,
+            market=market.name
+        )
+        
+        # 状态快照任务 - 用于重启后快速恢复
+        state_snapshot = StateSnapshotTask(
+            interval=SNAPSHOT_CONFIG['interval'],
             db_session=self.db,
-            web3=WEB3,
-            private_key=os.getenv('PRIVATE_KEY'),
-            liquidator_address=CONTRACTS['LIQUIDATOR'],
-            min_profit_eth=MONITOR_CONFIG['min_profit']
+            snapshot_path=market.snapshot_path(SNAPSHOT_CONFIG['path'], default),
+            market=market.name
         )
         
-        self.tasks.extend([
+        tasks = [
             user_discovery,
             user_update,
+            price_watcher,
             opportunity_finder,
-            liquidation_executor
-        ])
+            opportunity_retention,
+            state_snapshot
+        ]
+        
+        # RPC 录制或回放时链状态固定在单个区块，nonce 和 gas 价格都是旧值，不启动执行和预签名任务
+        if rpc_cache is not None:
+            print(f"市场 {market.name} 处于 RPC {rpc_cache.mode} 模式，不启动清算执行任务")
+        else:
+            tasks.append(liquidation_executor)
+        
+        # 预签名交易任务 - 随 nonce、gas 价格、池子和数量变化重新签名
+        if templates is not None and rpc_cache is None:
+            tasks.append(TxTemplateTask(
+                interval=TX_TEMPLATE_CONFIG['interval'],
+                db_session=self.db,
+                executor=liquidation_executor,
+                candidates=TX_TEMPLATE_CONFIG['candidates'],
+                max_health_factor=TX_TEMPLATE_CONFIG['max_health_factor'],
+                market=market.name
+            ))
+        # 多个市场时任务名带上市场名，慢周期和采样分析按市场区分
+        if len(self.markets) > 1:
+            for task in tasks:
+                task.name = f"{task.name}[{market.name}]"
+        
+        self.market_tasks[market.name] = tasks
+        self.user_updates[market.name] = user_update
+        self.finders[market.name] = opportunity_finder
+        self.executors[market.name] = liquidation_executor
+        self.tasks.extend(tasks)
     
     async def start(self):
         """启动所有任务"""
@@ -80,6 +242,51 @@ class TaskManager:
             for task in self.tasks:
                 await task.stop()
     
+    def request_profile(self, task_names: Optional[Iterable[str]] = None):
+        """对指定任务（默认全部）的下一轮执行进行采样分析"""
+        names = set(task_names) if task_names else None
+        for task in self.tasks:
+            if names is None or task.name in names or type(task).__name__ in names:
+                task.request_profile()
+    
+    def profile_report(self) -> str:
+        """各任务最慢周期的分阶段耗时"""
+        reports = [task.slow_cycles.report() for task in self.tasks]
+        for market in self.markets:
+            prefix = f"[{market.name}] " if len(self.markets) > 1 else ""
+            reports.append(prefix + market.aave.coalescer.report())
+            user_update = self.user_updates[market.name]
+            if user_update.reserve_indexes is not None:
+                reports.append(prefix + user_update.drift.report())
+            executor = self.executors[market.name]
+            if executor.templates is not None:
+                reports.append(
+                    f"{prefix}预签名交易: 命中 {executor.templates.hits} 次，"
+                    f"未命中 {executor.templates.misses} 次，当前 {len(executor.templates)} 个"
+                )
+            latency = executor.latency.report()
+            if latency:
+                reports.append("\n".join(prefix + line for line in latency.split("\n")))
+        reports.append(self.market_report())
+        return "\n".join(report for report in reports if report)
+    
+    def market_report(self) -> str:
+        """按市场汇总的资源占用和吞吐量"""
+        lines = []
+        for market in self.markets:
+            totals = {'cycles': 0, 'total': 0.0, 'rpc': 0.0, 'db': 0.0, 'rpc_calls': 0, 'db_calls': 0}
+            for task in self.market_tasks[market.name]:
+                for key in totals:
+                    totals[key] += task.totals[key]
+            users = self.db.query(func.count(User.id)).filter(User.market == market.name).scalar()
+            lines.append(
+                f"[{market.name}] 用户 {users}，{totals['cycles']} 个任务周期共 {totals['total']:.1f}s，"
+                f"RPC {totals['rpc']:.1f}s/{totals['rpc_calls']}次，DB {totals['db']:.1f}s/{totals['db_calls']}次，"
+                f"发现清算机会 {self.finders[market.name].found_total} 个，"
+                f"执行清算 {self.executors[market.name].executed_count} 笔"
+            )
+        return "\n".join(lines)
+    
     async def stop(self):
         """停止所有任务"""
         for task in self.tasks:
@@ -0,0 +1,77 @@
+# 标准库
+from typing import Dict, List
+
+# 第三方库
+from sqlalchemy.orm import Session
+
+# 本地导入
+from .base_task import BaseTask
+from .liquidation_executor import LiquidationExecutorTask
+from ..db.models import DEFAULT_MARKET, User, Position
+
+class TxTemplateTask(BaseTask):
+    """为最接近清算的用户维护预签名的清算交易
+
+    每个候选用户取价值最大的债务和抵押品组合，与清算机会发现任务
+    使用相同的数量，执行任务取出机会后可以直接发送。
+    """
+
+    def __init__(
+        self,
+        interval: int,
+        db_session: Session,
+        executor: LiquidationExecutorTask,
+        candidates: int = 20,
+        max_health_factor: float = 1.05,
+        market: str = DEFAULT_MARKET
+    ):
+        super().__init__("预签名交易", interval)
+        self.db = db_session
+        self.executor = executor
+        self.candidates = candidates
+        self.max_health_factor = max_health_factor
+        self.market = market
+
+    async def _candidates(self) -> List[Dict]:
+        """健康因子最低的用户及其最大的债务 / 抵押品组合
+
+        头寸表中的 USD 价值不会被写入，按数量和当前价格计算。
+        """
+        users = self.db.query(User).filter(
+            User.market == self.market,
+            User.total_debt_eth > 0,
+            User.health_factor < self.max_health_factor
+        ).order_by(User.health_factor).limit(self.candidates).all()
+
+        prices: Dict[str, float] = {}
+
+        async def usd(pos: Position, amount: float) -> float:
+            if pos.token_address not in prices:
+                prices[pos.token_address] = await self.executor.aave.get_asset_price(pos.token_address) or 0.0
+            return amount * prices[pos.token_address]
+
+        candidates = []
+        for user in users:
+            positions = self.db.query(Position).filter(Position.user_id == user.id).all()
+            debts = [pos for pos in positions if pos.debt_amount and pos.debt_amount > 0]
+            collaterals = [pos for pos in positions if pos.collateral_amount and pos.collateral_amount > 0]
+            if not debts or not collaterals:
+                continue
+            debt_usd = [await usd(pos, pos.debt_amount) for pos in debts]
+            coll_usd = [await usd(pos, pos.collateral_amount) for pos in collaterals]
+            debt_pos = debts[debt_usd.index(max(debt_usd))]
+            coll_pos = collaterals[coll_usd.index(max(coll_usd))]
+            candidates.append({
+                'user': user.address,
+                'collateral_token': coll_pos.token_address,
+                'debt_token': debt_pos.token_address,
+                'debt_amount': debt_pos.debt_amount
+            })
+        return candidates
+
+    async def execute(self):
+        """刷新候选用户的预签名交易"""
+        candidates = await self._candidates()
+        rebuilt = await self.executor.refresh_templates(candidates)
+        if rebuilt > 0:
+            print(f"重新签名 {rebuilt} 笔交易，共 {len(self.executor.templates)} 个候选")
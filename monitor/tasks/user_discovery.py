@@ -1,11 +1,15 @@
 from datetime import datetime
-from typing import Set
+from typing import Optional, Set
 
 from sqlalchemy.orm import Session
+from web3 import Web3
 from web3.contract import Contract
 
 from .base_task import BaseTask
-from ..db.models import User, ScanStatus
+from ..db.models import DEFAULT_MARKET, User, ScanStatus
+from ..utils.log_decoder import EventDecoder, RawLogClient, find_event_abi
+from ..utils.rpc_cache import RpcCache
+from ..utils.coalescer import RequestCoalescer
 from ..config import WEB3, AAVE_V3_DEPLOY_BLOCK, BLOCK_CHUNK
 
 # Aave V3 在 Arbitrum 上的部署区块
@@ -19,20 +23,34 @@ class UserDiscoveryTask(BaseTask):
         db_session: Session,
         aave_pool: Contract,
         start_block: int = AAVE_V3_DEPLOY_BLOCK,  # 从 Aave V3 部署开始
-        block_chunk: int = BLOCK_CHUNK  # 每次扫描的区块数
+        block_chunk: int = BLOCK_CHUNK,  # 每次扫描的区块数
+        rpc_cache: Optional[RpcCache] = None,
+        coalescer: Optional[RequestCoalescer] = None,
+        web3: Optional[Web3] = None,
+        market: str = DEFAULT_MARKET
     ):
         super().__init__("用户发现", interval)
         self.db = db_session
         self.pool = aave_pool
         self.block_chunk = block_chunk
+        self.coalescer = coalescer
+        self.web3 = web3 or WEB3
+        self.market = market
         
-        # 从数据库中获取最后扫描的区块
-        scan_status = self.db.query(ScanStatus).first()
+        # 原始日志路径：只请求 Supply 事件，只解码 user 字段
+        self.log_client = RawLogClient(self.web3.provider.endpoint_uri, rpc_cache=rpc_cache)
+        self.supply_decoder = EventDecoder(
+            find_event_abi(self.pool.abi, 'Supply'),
+            fields=('user',)
+        )
+        
+        # 从数据库中获取该市场最后扫描的区块
+        scan_status = self.db.query(ScanStatus).filter_by(market=market).first()
         if scan_status:
             self.last_scanned_block = scan_status.last_scanned_block
         else:
             self.last_scanned_block = start_block
-            new_scan_status = ScanStatus(last_scanned_block=start_block)
+            new_scan_status = ScanStatus(market=market, last_scanned_block=start_block)
             self.db.add(new_scan_status)
             self.db.commit()
         
@@ -40,8 +58,11 @@ class UserDiscoveryTask(BaseTask):
         """发现新用户"""
         try:
             while True:
-                # 获取当前区块号
-                current_block = WEB3.eth.block_number
+                # 获取当前区块号，与其他任务共享同一次请求
+                if self.coalescer is not None:
+                    current_block = await self.coalescer.block_number()
+                else:
+                    current_block = self.web3.eth.block_number
                 
                 # 计算本次扫描的区块范围
                 from_block = self.last_scanned_block
@@ -55,22 +76,25 @@ class UserDiscoveryTask(BaseTask):
                 print(f"扫描区块: {from_block} -> {to_block}")
                 
                 # 获取所有用户地址
-                supply_events = self.pool.events.Supply().get_logs(
-                    from_block=from_block,
-                    to_block=to_block
+                supply_logs = await self.log_client.get_logs_async(
+                    self.pool.address,
+                    [self.supply_decoder.topic0],
+                    from_block,
+                    to_block
                 )
                 
                 # 收集用户地址
                 users: Set[str] = set()
-                for event in supply_events:
-                    users.add(event.args.user)
+                decode = self.supply_decoder.decode
+                for log in supply_logs:
+                    users.add(decode(log)['user'])
                 
                 # 添加新用户到数据库
                 added_count = 0
                 for address in users:
-                    user = self.db.query(User).filter_by(address=address).first()
+                    user = self.db.query(User).filter_by(market=self.market, address=address).first()
                     if not user:
-                        user = User(address=address)
+                        user = User(market=self.market, address=address)
                         self.db.add(user)
                         added_count += 1
                         
@@ -80,11 +104,11 @@ class UserDiscoveryTask(BaseTask):
                 
                 # 更新最后扫描的区块
                 self.last_scanned_block = to_block + 1
-                scan_status = self.db.query(ScanStatus).first()
+                scan_status = self.db.query(ScanStatus).filter_by(market=self.market).first()
                 if scan_status:
                     scan_status.last_scanned_block = self.last_scanned_block
                 else:
-                    scan_status = ScanStatus(last_scanned_block=self.last_scanned_block)
+                    scan_status = ScanStatus(market=self.market, last_scanned_block=self.last_scanned_block)
                     self.db.add(scan_status)
                 self.db.commit()
                 
@@ -1,10 +1,17 @@
+import time
+import random
+from collections import defaultdict
 from datetime import datetime, timedelta, timezone
-from typing import List
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+from sqlalchemy import or_
 from sqlalchemy.orm import Session
 
 from .base_task import BaseTask
-from ..db.models import User, Position
+from ..db.models import DEFAULT_MARKET, User, Position
 from ..utils.aave_data import AaveDataProvider
+from ..utils.asset_index import AssetUserIndex
+from ..utils.liquidation_index import LiquidationPriceIndex
+from ..utils.interest import DriftReport, ReserveIndexTracker, health_factor, project_positions
 from ..config import MONITOR_CONFIG
 
 class UserUpdateTask(BaseTask):
@@ -13,77 +20,361 @@ class UserUpdateTask(BaseTask):
         interval: int,
         db_session: Session,
         aave_data: AaveDataProvider,
-        update_interval: int = 3*60*60  # 180分钟更新一次
+        update_interval: int = 3*60*60,  # 180分钟更新一次
+        asset_index: Optional[AssetUserIndex] = None,
+        liquidation_index: Optional[LiquidationPriceIndex] = None,
+        on_users_liquidatable: Optional[Callable[[Set[str]], None]] = None,
+        batch_size: int = 100,
+        reserve_indexes: Optional[ReserveIndexTracker] = None,
+        confirm_health_factor: float = 1.02,
+        drift_sample_size: int = 20,
+        max_projection_age: int = 24*60*60,
+        market: str = DEFAULT_MARKET
     ):
         super().__init__("用户更新", interval)
         self.db = db_session
         self.aave = aave_data
         self.update_interval = update_interval
-        
+        self.asset_index = asset_index
+        self.liquidation_index = liquidation_index
+        self.on_users_liquidatable = on_users_liquidatable
+        self.batch_size = batch_size
+        self.reserve_indexes = reserve_indexes
+        self.confirm_health_factor = confirm_health_factor
+        self.drift_sample_size = drift_sample_size
+        self.max_projection_age = max_projection_age
+        self.market = market
+
+        # 推算值与链上值的偏差统计，抽样用户的推算结果在链上读取后对比
+        self.drift = DriftReport()
+        self._projected: Dict[str, Tuple[float, float]] = {}
+        # 早于该时间从链上读取的头寸不用于推算：启动前和价格监听追赶期间的头寸事件没有被监听到
+        self._projection_valid_after = datetime.now(timezone.utc)
+        self._reread_all = False
+
+        # 价格变化等事件触发的待重新评估用户，优先于定时全量更新处理
+        self.pending_users: Set[str] = set()
+        self._last_full_update: Optional[float] = None
+        self._indexes_loaded = False
+
+    def invalidate_projections(self):
+        """头寸事件有遗漏时调用，立即从链上重新读取所有用户，此前读取的头寸不再用于推算"""
+        self._projection_valid_after = datetime.now(timezone.utc)
+        self._reread_all = True
+        self._last_full_update = None
+        print("头寸事件有遗漏，所有用户从链上重新读取")
+        self.trigger()
+
+    def request_rescore(self, addresses: Iterable[str]):
+        """将用户加入重新评估队列并立即唤醒任务"""
+        self.pending_users.update(addresses)
+        self.trigger()
+
     async def execute(self):
         """更新用户数据"""
+        if not self._indexes_loaded:
+            self._indexes_loaded = True
+            await self._load_indexes()
+
+        # 先处理被事件触发的用户
+        if self.pending_users:
+            addresses = list(self.pending_users)
+            self.pending_users.clear()
+            users: List[User] = self.db.query(User).filter(
+                User.market == self.market,
+                User.address.in_(addresses)
+            ).all()
+            updated_count = await self._update_users(users)
+            print(f"重新评估了 {updated_count} 个受价格或头寸变化影响的用户")
+            
+            # 重新评估后已可清算的用户交给清算机会发现任务立即处理
+            liquidatable = {
+                user.address for user in users
+                if user.health_factor is not None
+                and user.health_factor < MONITOR_CONFIG['min_health_factor']
+            }
+            if liquidatable and self.on_users_liquidatable:
+                self.on_users_liquidatable(liquidatable)
+
+        # 被提前唤醒时不重复执行定时全量更新
+        now = time.monotonic()
+        if self._last_full_update is not None and now - self._last_full_update < self.interval:
+            return
+        self._last_full_update = now
+
         # 获取需要更新的用户
         update_before = datetime.now(timezone.utc) - timedelta(seconds=self.update_interval)
-        users: List[User] = self.db.query(User).filter(
+        if self._reread_all:
+            # 推算过的用户的头寸可能已经变化，在遗漏之前更新过的用户全部重新读取
+            update_before = self._projection_valid_after
+            self._reread_all = False
+        users = self.db.query(User).filter(
+            User.market == self.market,
             User.last_updated < update_before
         ).all()
 
-        print(f"需要更新 {len(users)} 个用户的数据")        
-        updated_count = 0
-        for user in users:
+        print(f"需要更新 {len(users)} 个用户的数据")
+        if self.reserve_indexes is not None and users:
+            # 有缩放余额的用户按储备指数推算，只有接近清算线的用户和抽样用户读取链上数据
+            users = await self._project_users(users)
+        updated_count = await self._update_users(users)
+
+        if updated_count > 0:
+            print(f"更新了 {updated_count} 个用户的数据")
+
+    async def _load_indexes(self):
+        """启动时用数据库中所有有债务用户的头寸构建资产索引和清算价格索引"""
+        if self.asset_index is None and self.liquidation_index is None:
+            return
+        positions_by_user: Dict[str, List[Dict]] = defaultdict(list)
+        rows = self.db.query(
+            User.address, Position.token_address, Position.collateral_amount,
+            Position.debt_amount, Position.usage_as_collateral
+        ).join(Position, Position.user_id == User.id).filter(
+            User.market == self.market,
+            User.total_debt_eth > 0,
+            or_(Position.collateral_amount > 0, Position.debt_amount > 0)
+        ).yield_per(10000)
+        for address, token, collateral, debt, usage_as_collateral in rows:
+            positions_by_user[address].append({
+                'token_address': token,
+                'collateral_amount': collateral,
+                'debt_amount': debt,
+                'usage_as_collateral_enabled': usage_as_collateral is not False
+            })
+
+        prices, thresholds = await self._reserve_params(
+            {pos['token_address'] for positions in positions_by_user.values() for pos in positions}
+        )
+        for address, positions in positions_by_user.items():
+            self._index_positions(address, positions, prices, thresholds)
+        print(f"从数据库加载了 {len(positions_by_user)} 个有债务用户的索引")
+
+    async def _reserve_params(self, tokens: Iterable[str]) -> Tuple[Dict[str, float], Dict[str, float]]:
+        """查询资产的价格和清算阈值，查询失败的资产不包含在内"""
+        prices: Dict[str, float] = {}
+        thresholds: Dict[str, float] = {}
+        for token in tokens:
             try:
-                # 获取用户数据
-                user_data = await self.aave.get_user_data(user.address)
-                if not user_data:
-                    print(f"无法获取用户 {user.address} 的数据")
-                    continue
-                
-                # 更新用户数据
-                try:
-                    user_data['health_factor'] = min(user_data['health_factor'], 1e20)  # 设置上限
-                    user.health_factor = int(user_data['health_factor']) / 1e18
-                    user.total_collateral_eth = int(user_data['total_collateral_eth']) / 1e8
-                    user.total_debt_eth = int(user_data['total_debt_eth']) / 1e8
-                    user.last_updated = datetime.now(timezone.utc)
-                except (TypeError, ValueError) as e:
-                    print(f"转换用户 {user.address} 数据时出错: {str(e)}")
-                    continue
-                
-                # 更新用户头寸 只更新高风险用户的头寸
-                if (user.health_factor < 1.02):
-                    positions = await self.aave.get_user_positions(user.address)
-                    for pos_data in positions:
-                        try:
-                            position = self.db.query(Position).filter_by(
-                                user_id=user.id,
-                                token_address=pos_data['token_address']
-                            ).first()
-                            
-                            if not position:
-                                position = Position(user_id=user.id)
-                                self.db.add(position)
-                            
-                            position.token_address = pos_data['token_address']
-                            position.collateral_amount = int(pos_data['collateral_amount']) / 1e8
-                            position.debt_amount = int(pos_data['debt_amount']) / 1e8
-                            position.last_updated = datetime.now(timezone.utc)
-                        except (TypeError, ValueError) as e:
-                            print(f"转换头寸数据时出错: {str(e)}")
-                            continue
-                
-                updated_count += 1
-                
-                # 每10个用户提交一次
-                if updated_count % 100 == 0:
-                    self.db.commit()
-                    print(f"已更新 {updated_count} 个用户的数据")
-                    
+                config = await self.aave.get_reserve_config(token)
             except Exception as e:
-                print(f"更新用户 {user.address} 数据失败: {str(e)}")
+                print(f"获取储备 {token} 配置失败: {str(e)}")
+                continue
+            price = await self.aave.get_asset_price(token)
+            if price:
+                prices[token] = price
+                thresholds[token] = config['liquidation_threshold'] / 1e4
+        return prices, thresholds
+
+    async def _project_users(self, users: List[User]) -> List[User]:
+        """用保存的缩放余额和储备指数推算用户的健康因子，不发起用户级别的 RPC
+
+        Returns:
+            需要从链上读取的用户：没有缩放余额、头寸读取时间早于 _projection_valid_after 或超过
+            max_projection_age、推算健康因子低于确认阈值，以及用于偏差统计的抽样用户
+        """
+        self._projected.clear()
+        if not await self.aave.refresh_reserve_indexes():
+            return users
+        timestamp = self.reserve_indexes.timestamp_at(await self.aave.get_block_number())
+
+        rows_by_user: Dict[int, List[Position]] = defaultdict(list)
+        ids = [user.id for user in users]
+        for start in range(0, len(ids), 1000):
+            for row in self.db.query(Position).filter(Position.user_id.in_(ids[start:start + 1000])):
+                rows_by_user[row.user_id].append(row)
+
+        # 每个资产的价格和清算阈值只查询一次
+        prices, thresholds = await self._reserve_params(
+            {row.token_address for rows in rows_by_user.values() for row in rows}
+        )
+
+        fetch: List[User] = []
+        projected: List[Tuple[User, float, float]] = []
+        now = datetime.now(timezone.utc)
+        read_after = max(self._projection_valid_after, now - timedelta(seconds=self.max_projection_age))
+        for user in users:
+            rows = rows_by_user.get(user.id)
+            if not rows or any(row.token_address not in prices for row in rows):
+                fetch.append(user)
+                continue
+            # 头寸在一次链上读取中整体写入，取最近的读取时间；sqlite 返回的时间不带时区
+            read_at = max((row.last_updated for row in rows if row.last_updated is not None), default=None)
+            if read_at is not None and read_at.tzinfo is None:
+                read_at = read_at.replace(tzinfo=timezone.utc)
+            if read_at is None or read_at < read_after:
+                fetch.append(user)
+                continue
+            positions = project_positions([
+                {
+                    'token_address': row.token_address,
+                    'scaled_collateral': row.scaled_collateral,
+                    'scaled_variable_debt': row.scaled_variable_debt,
+                    'stable_debt': row.stable_debt,
+                    'usage_as_collateral_enabled': row.usage_as_collateral is not False
+                }
+                for row in rows
+            ], self.reserve_indexes, timestamp)
+            if positions is None:
+                fetch.append(user)
+                continue
+
+            hf, collateral, debt = health_factor(positions, prices, thresholds)
+            if hf < self.confirm_health_factor:
+                fetch.append(user)
                 continue
-        
-        # 最后提交
+            user.health_factor = min(hf, 100.0)  # 与链上读取的上限一致
+            user.total_collateral_eth = collateral
+            user.total_debt_eth = debt
+            user.last_updated = now
+            projected.append((user, hf, debt))
+            # 推算的头寸同样更新索引，清算价格随利息增长保持最新
+            if debt > 0:
+                self._index_positions(user.address, positions, prices, thresholds)
+            else:
+                self._drop_from_indexes(user.address)
         self.db.commit()
-        
-        if updated_count > 0:
-            print(f"更新了 {updated_count} 个用户的数据") 
\ No newline at end of file
+
+        # 抽样用户同时从链上读取，对比推算偏差
+        for user, hf, debt in random.sample(projected, min(self.drift_sample_size, len(projected))):
+            self._projected[user.address] = (hf, debt)
+            fetch.append(user)
+
+        print(f"推算了 {len(projected)} 个用户的健康因子，{len(fetch)} 个用户从链上读取")
+        return fetch
+
+    async def _update_users(self, users: List[User]) -> int:
+        """从链上刷新用户数据和有债务用户的头寸
+
+        头寸按批次合并读取，每批一次请求。
+
+        Returns:
+            成功更新的用户数
+        """
+        updated_count = 0
+        for start in range(0, len(users), self.batch_size):
+            borrowers: List[User] = []
+            others: List[User] = []
+            for user in users[start:start + self.batch_size]:
+                try:
+                    # 获取用户数据
+                    user_data = await self.aave.get_user_data(user.address)
+                    if not user_data:
+                        print(f"无法获取用户 {user.address} 的数据")
+                        continue
+
+                    # 更新用户数据
+                    try:
+                        user_data['health_factor'] = min(user_data['health_factor'], 1e20)  # 设置上限
+                        user.health_factor = int(user_data['health_factor']) / 1e18
+                        user.total_collateral_eth = int(user_data['total_collateral_eth']) / 1e8
+                        user.total_debt_eth = int(user_data['total_debt_eth']) / 1e8
+                        user.last_updated = datetime.now(timezone.utc)
+                    except (TypeError, ValueError) as e:
+                        print(f"转换用户 {user.address} 数据时出错: {str(e)}")
+                        continue
+
+                    projection = self._projected.pop(user.address, None)
+                    if projection is not None:
+                        self.drift.record(user.address, projection[0], user.health_factor, projection[1], user.total_debt_eth)
+
+                    # 所有有债务的用户都进入索引，价格大幅变化时健康因子较高的用户也能被定位
+                    if user.total_debt_eth > 0:
+                        borrowers.append(user)
+                    else:
+                        # 没有债务的用户不可能被清算，不保留索引
+                        self._drop_from_indexes(user.address)
+                        if self.reserve_indexes is not None:
+                            # 推算需要所有用户的缩放余额
+                            others.append(user)
+
+                    updated_count += 1
+
+                except Exception as e:
+                    print(f"更新用户 {user.address} 数据失败: {str(e)}")
+                    continue
+
+            # 更新用户头寸
+            if borrowers or others:
+                positions_by_user = await self.aave.get_users_positions(
+                    [user.address for user in borrowers + others]
+                )
+                for user in borrowers + others:
+                    positions = positions_by_user.get(user.address)
+                    if not positions:
+                        continue
+                    try:
+                        await self._store_positions(user, positions, index=user in borrowers)
+                    except Exception as e:
+                        print(f"更新用户 {user.address} 头寸失败: {str(e)}")
+
+            # 每批提交一次
+            self.db.commit()
+            if updated_count and len(users) > self.batch_size:
+                print(f"已更新 {updated_count} 个用户的数据")
+
+        return updated_count
+
+    async def _store_positions(self, user: User, positions: List[Dict], index: bool = True):
+        """写入用户头寸，index 为 True 时维护资产索引和清算价格索引"""
+        for pos_data in positions:
+            position = self.db.query(Position).filter_by(
+                user_id=user.id,
+                token_address=pos_data['token_address']
+            ).first()
+
+            if not position:
+                if not index and not pos_data['collateral_amount'] and not pos_data['debt_amount']:
+                    # 只为推算保存的头寸不写入空记录
+                    continue
+                position = Position(user_id=user.id)
+                self.db.add(position)
+
+            position.token_address = pos_data['token_address']
+            position.collateral_amount = pos_data['collateral_amount']
+            position.debt_amount = pos_data['debt_amount']
+            position.scaled_collateral = pos_data.get('scaled_collateral')
+            position.scaled_variable_debt = pos_data.get('scaled_variable_debt')
+            position.stable_debt = pos_data.get('stable_debt')
+            position.usage_as_collateral = pos_data.get('usage_as_collateral_enabled', True)
+            position.last_updated = datetime.now(timezone.utc)
+
+        if not index:
+            return
+
+        if self.asset_index is not None or self.liquidation_index is not None:
+            prices, thresholds = await self._reserve_params(
+                {pos['token_address'] for pos in positions if pos['collateral_amount'] or pos['debt_amount']}
+            )
+            self._index_positions(user.address, positions, prices, thresholds)
+
+    def _drop_from_indexes(self, address: str):
+        if self.asset_index is not None:
+            self.asset_index.update_user(address, ())
+        if self.liquidation_index is not None:
+            self.liquidation_index.remove_user(address)
+
+    def _index_positions(
+        self,
+        address: str,
+        positions: List[Dict],
+        prices: Dict[str, float],
+        thresholds: Dict[str, float]
+    ):
+        """用头寸、价格和清算阈值更新资产索引和清算价格索引"""
+        held = [pos for pos in positions if pos['collateral_amount'] or pos['debt_amount']]
+
+        # 维护资产 -> 用户反向索引，供价格监听定位受影响用户
+        if self.asset_index is not None:
+            self.asset_index.update_user(address, {pos['token_address'] for pos in held})
+
+        if self.liquidation_index is not None:
+            # 未启用抵押的存款不计入健康因子
+            self.liquidation_index.update_user(address, [
+                {
+                    'token_address': pos['token_address'],
+                    'collateral_amount': pos['collateral_amount'] if pos.get('usage_as_collateral_enabled', True) else 0,
+                    'debt_amount': pos['debt_amount']
+                }
+                for pos in held
+            ], prices, thresholds)
@@ -3,7 +3,47 @@
 """
 
 from .aave_data import AaveDataProvider
+from .snapshot import Snapshot, write_snapshot, dump_state, restore_state
+from .price_table import PriceTable
+from .asset_index import AssetUserIndex
+from .liquidation_index import LiquidationPriceIndex
+from .position_reader import PositionReader
+from .opportunity_queue import OpportunityQueue
+from .wallet_pool import WalletPool, WalletLane, load_private_keys
+from .tx_templates import TxTemplate, TxTemplateCache, LatencyLog
+from .profiler import SamplingProfiler, SlowCycleLog, rpc_timing_middleware, install_db_timing
+from .rpc_cache import RpcCache, RpcStore, rpc_cache_from_config
+from .coalescer import RequestCoalescer
+from .interest import ReserveIndexTracker, DriftReport
+from .market import Market, load_markets
 
 __all__ = [
-    'AaveDataProvider'
+    'AaveDataProvider',
+    'Snapshot',
+    'write_snapshot',
+    'dump_state',
+    'restore_state',
+    'PriceTable',
+    'AssetUserIndex',
+    'LiquidationPriceIndex',
+    'PositionReader',
+    'OpportunityQueue',
+    'WalletPool',
+    'WalletLane',
+    'load_private_keys',
+    'TxTemplate',
+    'TxTemplateCache',
+    'LatencyLog',
+    'SamplingProfiler',
+    'SlowCycleLog',
+    'rpc_timing_middleware',
+    'install_db_timing',
+    'RpcCache',
+    'RpcStore',
+    'rpc_cache_from_config',
+    'RequestCoalescer',
+    'ReserveIndexTracker',
+    'DriftReport',
+    'Market',
+    'load_markets'
 ] 
\ No newline at end of file
@@ -1,17 +1,100 @@
 # 标准库
 import os
 import json
+import asyncio
 from typing import List, Dict, Tuple, Optional
 
 # 第三方库
 from web3 import Web3
 
+# 本地导入
+from .price_table import PriceTable
+from .position_reader import PositionReader
+from .coalescer import RequestCoalescer
+from .interest import ReserveIndexTracker
+
+def load_abi(abi_file: str) -> List[Dict]:
+    """读取 abi 目录下的 ABI 文件
+    
+    Args:
+        abi_file: ABI文件名
+        
+    Returns:
+        ABI列表
+        
+    Raises:
+        ValueError: 如果ABI格式无效
+        FileNotFoundError: 如果ABI文件不存在
+    """
+    # 构建ABI文件路径
+    abi_path = os.path.join(
+        os.path.dirname(os.path.dirname(__file__)), 
+        'abi', 
+        abi_file
+    )
+    
+    try:
+        # 读取ABI文件
+        with open(abi_path) as f:
+            contract_json = json.load(f)
+    except FileNotFoundError:
+        raise FileNotFoundError(f"ABI file not found: {abi_file}")
+    except json.JSONDecodeError:
+        raise ValueError(f"Invalid JSON in ABI file: {abi_file}")
+    
+    # 处理不同的ABI格式
+    if isinstance(contract_json, dict):
+        abi = contract_json.get('abi')
+    else:
+        abi = contract_json
+        
+    # 确保ABI是列表
+    if not isinstance(abi, list):
+        raise ValueError(f"Invalid ABI format in {abi_file}. Expected list, got {type(abi)}")
+        
+    # 处理嵌套的ABI格式
+    if (len(abi) == 1 and 
+        isinstance(abi[0], dict) and 
+        'abi' in abi[0]):
+        abi = abi[0]['abi']
+    
+    return abi
+
 class AaveDataProvider:
-    def __init__(self, web3: Web3, pool_address: str, data_provider_address: str, factory_address: str):
+    def __init__(
+        self,
+        web3: Web3,
+        pool_address: str,
+        data_provider_address: str,
+        factory_address: str,
+        oracle_address: Optional[str] = None,
+        multicall_address: Optional[str] = None,
+        fallback_price_ttl: float = 60
+    ):
         self.web3 = web3
         self.pool = self._load_contract(pool_address, 'AavePool.json')
         self.data_provider = self._load_contract(data_provider_address, 'AaveDataProvider.json')
         self.factory = self._load_contract(factory_address, 'UniswapV3Factory.json')
+        self.oracle = self._load_contract(oracle_address, 'AaveOracle.json') if oracle_address else None
+        
+        # 共享价格表，由价格监听任务维护
+        self.price_table = PriceTable()
+        # 价格监听未覆盖时从 Oracle 读取的价格只缓存有限时间
+        self.fallback_price_ttl = fallback_price_ttl
+        
+        # 请求合并层，各任务的读取固定在同一区块并去重
+        self.coalescer = RequestCoalescer(web3)
+        
+        # 储备利率指数，用于不经 RPC 推算用户的债务、抵押和健康因子
+        self.reserve_indexes = ReserveIndexTracker()
+        
+        # 头寸读取器，缓存储备列表和储备元数据
+        self.position_reader = PositionReader(
+            web3,
+            self.pool,
+            self.data_provider,
+            self._load_contract(multicall_address, 'Multicall3.json') if multicall_address else None
+        )
         
     def _load_contract(self, address: str, abi_file: str) -> object:
         """加载合约
@@ -28,41 +111,13 @@ class AaveDataProvider:
             FileNotFoundError: 如果ABI文件不存在
         """
         try:
-            # 构建ABI文件路径
-            abi_path = os.path.join(
-                os.path.dirname(os.path.dirname(__file__)), 
-                'abi', 
-                abi_file
-            )
+            abi = load_abi(abi_file)
             
-            # 读取ABI文件
-            with open(abi_path) as f:
-                contract_json = json.load(f)
-                
-                # 处理不同的ABI格式
-                if isinstance(contract_json, dict):
-                    abi = contract_json.get('abi')
-                else:
-                    abi = contract_json
-                    
-                # 确保ABI是列表
-                if not isinstance(abi, list):
-                    raise ValueError(f"Invalid ABI format in {abi_file}. Expected list, got {type(abi)}")
-                    
-                # 处理嵌套的ABI格式
-                if (isinstance(abi, list) and 
-                    len(abi) == 1 and 
-                    isinstance(abi[0], dict) and 
-                    'abi' in abi[0]):
-                    abi = abi[0]['abi']
-                
-                # 创建合约实例
-                return self.web3.eth.contract(address=address, abi=abi)
+            # 创建合约实例
+            return self.web3.eth.contract(address=address, abi=abi)
                 
-        except FileNotFoundError:
-            raise FileNotFoundError(f"ABI file not found: {abi_file}")
-        except json.JSONDecodeError:
-            raise ValueError(f"Invalid JSON in ABI file: {abi_file}")
+        except (FileNotFoundError, ValueError):
+            raise
         except Exception as e:
             raise Exception(f"Failed to load contract: {str(e)}")
         
@@ -70,7 +125,7 @@ class AaveDataProvider:
         """获取用户数据"""
         try:
             # 调用合约方法
-            values = self.pool.functions.getUserAccountData(user_address).call()
+            values = await self.coalescer.call(self.pool.functions.getUserAccountData(user_address))
             
             if not values or len(values) < 6:  # 6 * 32 bytes
                 print(f"获取用户 {user_address} 数据返回值长度不足: {len(values) if values else 0} bytes")
@@ -96,34 +151,87 @@ class AaveDataProvider:
                 print(f"错误详情: {e.args[0]}")
             return None
     
-    async def get_user_positions(self, user_address: str) -> List[Dict]:
-        """获取用户所有头寸"""
-        positions = []
+    async def get_block_number(self) -> int:
+        """当前固定的区块号，各任务共享"""
+        return await self.coalescer.block_number()
+    
+    async def refresh_reserve_indexes(self) -> bool:
+        """从链上读取所有储备的指数和利率
         
+        Returns:
+            是否读取成功
+        """
         try:
-            # 获取所有代币列表
-            raw_data = self.pool.functions.getReservesList().call()
-            reserves_list = raw_data
-            
-            for token in reserves_list:
-                try:
-                    # 获取用户在该代币上的数据
-                    raw_data = self.data_provider.functions.getUserReserveData(token, user_address).call()
-                    
-                    positions.append({
-                        'token_address': token,
-                        'collateral_amount': raw_data[0],
-                        'debt_amount': raw_data[1] + raw_data[2],  # stableDebt + variableDebt
-                    })
-                except Exception as e:
-                    print(f"处理代币 {token} 数据时出错: {str(e)}")
-                    continue
-            
-            return positions
+            # 指数、区块号和区块时间在同一次读取中取得，参考点与指数对应同一区块
+            block, timestamp, reserves_data = await self.coalescer.get(
+                ('reserves_data',),
+                lambda number: (
+                    number,
+                    self.web3.eth.get_block(number)['timestamp'],
+                    self.position_reader.get_reserves_data(number)
+                )
+            )
+            self.reserve_indexes.load(reserves_data)
+            self.reserve_indexes.set_reference(block, timestamp)
+            return True
+        except Exception as e:
+            print(f"读取储备指数时出错: {str(e)}")
+            return False
+    
+    async def get_user_positions(self, user_address: str) -> List[Dict]:
+        """获取用户所有头寸，数量已按代币精度换算"""
+        try:
+            return await self.coalescer.get(
+                ('positions', user_address),
+                lambda block: self.position_reader.get_positions(user_address, block)
+            )
         except Exception as e:
             print(f"获取用户 {user_address} 头寸数据时出错: {str(e)}")
             return []
     
+    async def get_users_positions(self, user_addresses: List[str]) -> Dict[str, List[Dict]]:
+        """批量获取多个用户的所有头寸
+        
+        Args:
+            user_addresses: 用户地址列表
+            
+        Returns:
+            用户地址 -> 头寸列表，读取失败时为空字典
+        """
+        try:
+            return await self.coalescer.get(
+                ('positions', tuple(user_addresses)),
+                lambda block: self.position_reader.get_positions_batch(user_addresses, block)
+            )
+        except Exception as e:
+            print(f"批量获取 {len(user_addresses)} 个用户头寸数据时出错: {str(e)}")
+            return {}
+    
+    async def get_reserves_config(self) -> List[Dict]:
+        """获取所有储备的风险参数
+
+        Returns:
+            储备配置列表，ltv/清算阈值/清算奖励均为基点
+        """
+        reserves = []
+        tokens = await self.coalescer.get(('reserves',), self.position_reader.reserves)
+        for token in tokens:
+            try:
+                reserves.append(await self.get_reserve_config(token))
+            except Exception as e:
+                print(f"获取储备 {token} 配置时出错: {str(e)}")
+        return reserves
+    
+    async def get_reserve_config(self, asset: str) -> Dict:
+        """获取单个储备的风险参数和代币地址，结果会被缓存"""
+        metadata = self.position_reader.cached_metadata(asset)
+        if metadata is not None:
+            return metadata
+        return await self.coalescer.get(
+            ('reserve_metadata', asset),
+            lambda block: self.position_reader.reserve_metadata(asset, block)
+        )
+
     async def get_all_users(self) -> List[str]:
         """获取所有用户地址"""
         # 通过事件过滤获取所有用户
@@ -146,23 +254,36 @@ class AaveDataProvider:
         self,
         collateral_token: str,
         debt_token: str,
-        debt_amount: int
+        debt_amount: float
     ) -> Tuple[float, bool]:
-        """计算清算利润"""
+        """计算清算利润
+        
+        Args:
+            collateral_token: 抵押品代币地址
+            debt_token: 债务代币地址
+            debt_amount: 债务数量（按代币精度换算后）
+            
+        Returns:
+            (利润 USD, 是否有利可图)
+        """
         # 获取清算奖励
-        raw_data = self.data_provider.functions.getReserveConfigurationData(collateral_token).call()
+        raw_data = await self.coalescer.call(
+            self.data_provider.functions.getReserveConfigurationData(collateral_token)
+        )
         config_decoded = raw_data
         liquidation_bonus = config_decoded[4] / 10000  # 转换为百分比
         
-        # 获取价格
-        collateral_price = self.data_provider.functions.getAssetPrice(collateral_token).call()
-        debt_price = self.data_provider.functions.getAssetPrice(debt_token).call()
+        # 获取价格（USD）
+        collateral_price = await self.get_asset_price(collateral_token)
+        debt_price = await self.get_asset_price(debt_token)
+        if not collateral_price or not debt_price:
+            return 0.0, False
         
         # 计算可获得的抵押品数量
         collateral_amount = (debt_amount * debt_price * (1 + liquidation_bonus)) / collateral_price
         
         # 计算利润 (以 USD 为单位)
-        profit = (collateral_amount * collateral_price - debt_amount * debt_price) / 1e8
+        profit = collateral_amount * collateral_price - debt_amount * debt_price
         
         # 判断是否有利可图
         is_profitable = profit > 0
@@ -171,10 +292,16 @@ class AaveDataProvider:
     
     async def get_asset_price(self, asset_address: str) -> float:
         """获取资产价格（以USD计价）"""
+        # 优先使用价格监听任务维护的价格
+        price = self.price_table.get(asset_address)
+        if price is not None:
+            return price
+        
         try:
             # 从 Oracle 获取价格
-            price = await self.data_provider.functions.getAssetPrice(asset_address).call()
-            return float(price) / 1e8  # 价格有8位小数
+            price = float(await self.coalescer.call(self.oracle.functions.getAssetPrice(asset_address))) / 1e8  # 价格有8位小数
+            self.price_table.update(asset_address, price, ttl=self.fallback_price_ttl)
+            return price
         except Exception as e:
             print(f"获取资产 {asset_address} 价格失败: {str(e)}")
             return None 
@@ -196,21 +323,27 @@ class AaveDataProvider:
             best_pool = None
             max_tvl = 0
             
-            for fee in fee_tiers:
-                # 获取池子地址
-                pool_address = self.factory.functions.getPool(token0, token1, fee).call()
+            # 各费率的池子地址并发查询
+            pool_addresses = await asyncio.gather(*(
+                self.coalescer.call(self.factory.functions.getPool(token0, token1, fee))
+                for fee in fee_tiers
+            ))
+            pool_addresses = [
+                address for address in pool_addresses
+                if address != "0x0000000000000000000000000000000000000000"
+            ]
                 
-                if pool_address != "0x0000000000000000000000000000000000000000":
-                    # 加载池子合约
-                    pool = self._load_contract(pool_address, 'UniswapV3Pool.json')
-                    
-                    # 获取池子流动性
-                    liquidity = pool.functions.liquidity().call()
+            # 获取池子流动性
+            liquidities = await asyncio.gather(*(
+                self.coalescer.call(self._load_contract(address, 'UniswapV3Pool.json').functions.liquidity())
+                for address in pool_addresses
+            ))
                     
-                    # 如果流动性更大，更新最佳池子
-                    if liquidity > max_tvl:
-                        max_tvl = liquidity
-                        best_pool = pool_address
+            # 选择流动性最大的池子
+            for pool_address, liquidity in zip(pool_addresses, liquidities):
+                if liquidity > max_tvl:
+                    max_tvl = liquidity
+                    best_pool = pool_address
             
             return best_pool
             
@@ -0,0 +1,38 @@
+# 标准库
+from collections import defaultdict
+from typing import Dict, Iterable, Set
+
+class AssetUserIndex:
+    """资产 -> 持有该资产作为抵押品或债务的用户 的反向索引"""
+
+    def __init__(self):
+        self._holders: Dict[str, Set[str]] = defaultdict(set)
+        self._assets: Dict[str, Set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._assets)
+
+    def update_user(self, user: str, assets: Iterable[str]):
+        """用用户当前持有的资产集合替换索引中的旧记录"""
+        new_assets = set(assets)
+        old_assets = self._assets.get(user, set())
+
+        for asset in old_assets - new_assets:
+            holders = self._holders.get(asset)
+            if holders is not None:
+                holders.discard(user)
+                if not holders:
+                    del self._holders[asset]
+        for asset in new_assets - old_assets:
+            self._holders[asset].add(user)
+
+        if new_assets:
+            self._assets[user] = new_assets
+        else:
+            self._assets.pop(user, None)
+
+    def users_for(self, asset: str) -> Set[str]:
+        return set(self._holders.get(asset, ()))
+
+    def assets_for(self, user: str) -> Set[str]:
+        return set(self._assets.get(user, ()))
@@ -0,0 +1,123 @@
+# 标准库
+import time
+import asyncio
+from typing import Any, Callable, Dict, Hashable, Optional
+
+# 第三方库
+from web3 import Web3
+from web3.contract.contract import ContractFunction
+
+def _freeze(value: Any) -> Hashable:
+    """将参数转换为可哈希的形式"""
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    return value
+
+class RequestCoalescer:
+    """请求合并层
+
+    所有读取固定在同一个区块上：区块号最多每 block_refresh 秒刷新一次，
+    同一区块内相同的请求只发送一次，结果在该区块内复用；
+    多个任务同时发起的相同请求合并为一次 RPC。请求在线程中执行，不阻塞事件循环。
+    """
+
+    def __init__(self, web3: Web3, block_refresh: float = 1.0):
+        """
+        Args:
+            web3: Web3 实例
+            block_refresh: 区块号的刷新间隔(秒)
+        """
+        self.web3 = web3
+        self.block_refresh = block_refresh
+
+        self._block: Optional[int] = None
+        self._block_fetched_at = 0.0
+        # (区块, 键) -> 结果，区块变化时清空
+        self._cache: Dict[Hashable, Any] = {}
+        self._in_flight: Dict[Hashable, asyncio.Future] = {}
+
+        self.requests = 0  # 总请求数
+        self.cached = 0  # 命中当前区块缓存
+        self.coalesced = 0  # 合并到进行中的相同请求
+        self.rpc_calls = 0  # 实际发出的请求（含区块号）
+
+    async def _load(self, key: Hashable, loader: Callable[[], Any], track: bool = True) -> Any:
+        """执行请求，相同键的并发请求共享同一个结果"""
+        future = self._in_flight.get(key)
+        if future is not None:
+            if track:
+                self.coalesced += 1
+            return await asyncio.shield(future)
+
+        self.rpc_calls += 1
+        future = asyncio.ensure_future(asyncio.to_thread(loader))
+        self._in_flight[key] = future
+        try:
+            return await asyncio.shield(future)
+        finally:
+            if self._in_flight.get(key) is future:
+                del self._in_flight[key]
+
+    async def block_number(self) -> int:
+        """返回当前固定的区块号"""
+        now = time.monotonic()
+        if self._block is not None and now - self._block_fetched_at < self.block_refresh:
+            return self._block
+
+        block = await self._load(('eth_blockNumber',), lambda: self.web3.eth.block_number, track=False)
+        if self._block is None or block > self._block:
+            self._block = block
+            self._cache.clear()
+        self._block_fetched_at = time.monotonic()
+        return self._block
+
+    async def get(self, key: Hashable, loader: Callable[[int], Any]) -> Any:
+        """读取当前区块的数据
+
+        Args:
+            key: 请求的唯一标识
+            loader: 以区块号为参数执行请求的函数
+
+        Returns:
+            请求结果，同一区块内相同 key 只请求一次
+        """
+        block = await self.block_number()
+        self.requests += 1
+        cache_key = (block, key)
+        if cache_key in self._cache:
+            self.cached += 1
+            return self._cache[cache_key]
+
+        value = await self._load(cache_key, lambda: loader(block))
+        if block == self._block:
+            self._cache[cache_key] = value
+        return value
+
+    async def call(self, function: ContractFunction) -> Any:
+        """在固定区块上调用合约只读方法"""
+        key = ('eth_call', function.address, function.fn_name, _freeze(function.args), _freeze(function.kwargs))
+        return await self.get(key, lambda block: function.call(block_identifier=block))
+
+    async def gas_price(self) -> int:
+        return await self.get(('eth_gasPrice',), lambda block: self.web3.eth.gas_price)
+
+    def stats(self) -> Dict[str, float]:
+        """去重统计"""
+        saved = self.cached + self.coalesced
+        return {
+            'requests': self.requests,
+            'cached': self.cached,
+            'coalesced': self.coalesced,
+            'rpc_calls': self.rpc_calls,
+            'dedup_rate': saved / self.requests if self.requests else 0.0
+        }
+
+    def report(self) -> str:
+        stats = self.stats()
+        return (
+            f"请求合并: {stats['requests']} 次请求，区块缓存命中 {stats['cached']} 次，"
+            f"合并进行中请求 {stats['coalesced']} 次，实际 RPC {stats['rpc_calls']} 次，"
+            f"去重率 {stats['dedup_rate']:.1%}"
+        )
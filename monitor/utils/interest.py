@@ -0,0 +1,198 @@
+# 标准库
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+RAY = 10 ** 27
+HALF_RAY = RAY // 2
+SECONDS_PER_YEAR = 365 * 24 * 60 * 60
+
+def ray_mul(a: int, b: int) -> int:
+    return (a * b + HALF_RAY) // RAY
+
+def ray_div(a: int, b: int) -> int:
+    return (a * RAY + b // 2) // b
+
+def linear_interest(rate: int, elapsed: int) -> int:
+    """存款利息，与 Aave MathUtils.calculateLinearInterest 一致"""
+    return RAY + rate * elapsed // SECONDS_PER_YEAR
+
+def compounded_interest(rate: int, elapsed: int) -> int:
+    """借款利息的三阶二项式近似，与 Aave MathUtils.calculateCompoundedInterest 一致"""
+    if elapsed <= 0:
+        return RAY
+    elapsed_minus_one = elapsed - 1
+    elapsed_minus_two = max(elapsed - 2, 0)
+    base_power_two = ray_mul(rate, rate) // (SECONDS_PER_YEAR * SECONDS_PER_YEAR)
+    base_power_three = ray_mul(base_power_two, rate) // SECONDS_PER_YEAR
+    second_term = elapsed * elapsed_minus_one * base_power_two // 2
+    third_term = elapsed * elapsed_minus_one * elapsed_minus_two * base_power_three // 6
+    return RAY + rate * elapsed // SECONDS_PER_YEAR + second_term + third_term
+
+class ReserveIndexTracker:
+    """储备利率指数
+
+    保存每个储备最近一次更新时的流动性指数、浮动借款指数、对应利率和时间戳，
+    据此按 Aave 的利息公式推算任意时刻的指数，用户余额只需保存缩放后的数量。
+    """
+
+    def __init__(self, block_time: float = 0.25):
+        """
+        Args:
+            block_time: 平均出块时间(秒)，用于由区块号估算时间戳
+        """
+        self.block_time = block_time
+        # 资产 -> (流动性指数, 流动性利率, 浮动借款指数, 浮动借款利率, 时间戳)
+        self._reserves: Dict[str, Tuple[int, int, int, int, int]] = {}
+        # 用于由区块号估算时间戳的参考点
+        self._reference: Optional[Tuple[int, float]] = None
+
+    def __len__(self) -> int:
+        return len(self._reserves)
+
+    def __contains__(self, asset: str) -> bool:
+        return asset in self._reserves
+
+    def update(
+        self,
+        asset: str,
+        liquidity_index: int,
+        liquidity_rate: int,
+        variable_borrow_index: int,
+        variable_borrow_rate: int,
+        timestamp: int
+    ):
+        """记录储备状态，比已有记录旧的数据会被忽略"""
+        current = self._reserves.get(asset)
+        if current is not None and current[4] > timestamp:
+            return
+        self._reserves[asset] = (
+            liquidity_index, liquidity_rate, variable_borrow_index, variable_borrow_rate, timestamp
+        )
+
+    def load(self, reserves: Iterable[Dict]):
+        """批量加载 PositionReader.get_reserves_data 的结果"""
+        for reserve in reserves:
+            self.update(
+                reserve['address'],
+                reserve['liquidity_index'],
+                reserve['liquidity_rate'],
+                reserve['variable_borrow_index'],
+                reserve['variable_borrow_rate'],
+                reserve['last_update_timestamp']
+            )
+
+    def set_reference(self, block: int, timestamp: float):
+        """设置区块号与时间戳的对应关系"""
+        self._reference = (block, timestamp)
+
+    def timestamp_at(self, block: Optional[int] = None) -> int:
+        """估算区块的时间戳，未给出区块时使用当前时间"""
+        if block is None or self._reference is None:
+            return int(time.time())
+        ref_block, ref_timestamp = self._reference
+        return int(ref_timestamp + (block - ref_block) * self.block_time)
+
+    def normalized_income(self, asset: str, timestamp: int) -> int:
+        """推算 timestamp 时的流动性指数（aToken 余额 = 缩放余额 * 指数）"""
+        liquidity_index, liquidity_rate, _, _, updated = self._reserves[asset]
+        if timestamp <= updated:
+            return liquidity_index
+        return ray_mul(linear_interest(liquidity_rate, timestamp - updated), liquidity_index)
+
+    def normalized_debt(self, asset: str, timestamp: int) -> int:
+        """推算 timestamp 时的浮动借款指数（浮动债务 = 缩放债务 * 指数）"""
+        _, _, borrow_index, borrow_rate, updated = self._reserves[asset]
+        if timestamp <= updated:
+            return borrow_index
+        return ray_mul(compounded_interest(borrow_rate, timestamp - updated), borrow_index)
+
+def project_positions(
+    positions: Iterable[Dict],
+    tracker: ReserveIndexTracker,
+    timestamp: int
+) -> Optional[list]:
+    """将缩放余额推算为 timestamp 时的实际数量
+
+    Args:
+        positions: token_address / scaled_collateral / scaled_variable_debt / stable_debt
+            （按代币精度换算后的数量）
+        tracker: 储备利率指数
+        timestamp: 目标时间戳
+
+    Returns:
+        token_address / collateral_amount / debt_amount / usage_as_collateral_enabled 列表，
+        缺少缩放余额或储备指数、或有固定利率债务时返回 None
+    """
+    projected = []
+    for pos in positions:
+        asset = pos['token_address']
+        if pos.get('scaled_collateral') is None or pos.get('scaled_variable_debt') is None:
+            return None
+        if asset not in tracker:
+            return None
+        # 固定利率债务按用户各自的利率计息，储备指数无法推算
+        if pos.get('stable_debt'):
+            return None
+        income = tracker.normalized_income(asset, timestamp) / RAY
+        debt_index = tracker.normalized_debt(asset, timestamp) / RAY
+        projected.append({
+            'token_address': asset,
+            'collateral_amount': pos['scaled_collateral'] * income,
+            'debt_amount': pos['scaled_variable_debt'] * debt_index,
+            'usage_as_collateral_enabled': pos.get('usage_as_collateral_enabled', True)
+        })
+    return projected
+
+def health_factor(
+    positions: Iterable[Dict],
+    prices: Dict[str, float],
+    thresholds: Dict[str, float]
+) -> Tuple[float, float, float]:
+    """由头寸、价格和清算阈值计算健康因子
+
+    Returns:
+        (健康因子, 抵押品价值 USD, 债务价值 USD)，没有债务时健康因子为 inf
+    """
+    weighted = collateral = debt = 0.0
+    for pos in positions:
+        price = prices.get(pos['token_address'], 0.0)
+        debt += pos['debt_amount'] * price
+        if pos.get('usage_as_collateral_enabled', True):
+            value = pos['collateral_amount'] * price
+            collateral += value
+            weighted += value * thresholds.get(pos['token_address'], 0.0)
+    return (weighted / debt if debt > 0 else float('inf')), collateral, debt
+
+class DriftReport:
+    """推算值与链上值的偏差统计"""
+
+    def __init__(self):
+        self.samples = 0
+        self.max_hf_drift = 0.0
+        self.max_debt_drift = 0.0
+        self._hf_drift_sum = 0.0
+        self._debt_drift_sum = 0.0
+        self.worst_user: Optional[str] = None
+
+    def record(self, user: str, projected_hf: float, actual_hf: float, projected_debt: float, actual_debt: float):
+        """记录一次对比，偏差为相对误差"""
+        if actual_debt <= 0 or actual_hf == float('inf') or projected_hf == float('inf'):
+            return
+        hf_drift = abs(projected_hf - actual_hf) / actual_hf
+        debt_drift = abs(projected_debt - actual_debt) / actual_debt
+        self.samples += 1
+        self._hf_drift_sum += hf_drift
+        self._debt_drift_sum += debt_drift
+        self.max_debt_drift = max(self.max_debt_drift, debt_drift)
+        if self.worst_user is None or hf_drift > self.max_hf_drift:
+            self.max_hf_drift = hf_drift
+            self.worst_user = user
+
+    def report(self) -> str:
+        if not self.samples:
+            return "推算偏差: 暂无样本"
+        return (
+            f"推算偏差: {self.samples} 个样本，健康因子平均 {self._hf_drift_sum / self.samples:.4%} "
+            f"最大 {self.max_hf_drift:.4%}（{self.worst_user}），"
+            f"债务平均 {self._debt_drift_sum / self.samples:.4%} 最大 {self.max_debt_drift:.4%}"
+        )
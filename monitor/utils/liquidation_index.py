@@ -0,0 +1,242 @@
+# 标准库
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# 价格下跌时触发清算（资产主要作为抵押品）
+FALLING = 0
+# 价格上涨时触发清算（资产主要作为债务）
+RISING = 1
+
+class _SortedPrices:
+    """按清算价格排序的 (价格, 用户) 列表，价格和用户分两个数组保存以便二分查找"""
+
+    def __init__(self):
+        self.prices: List[float] = []
+        self.users: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.prices)
+
+    def add(self, price: float, user: str):
+        i = bisect_right(self.prices, price)
+        self.prices.insert(i, price)
+        self.users.insert(i, user)
+
+    def remove(self, price: float, user: str):
+        i = bisect_left(self.prices, price)
+        while i < len(self.prices) and self.prices[i] == price:
+            if self.users[i] == user:
+                del self.prices[i]
+                del self.users[i]
+                return
+            i += 1
+
+    def between(self, lo: int, hi: int) -> List[str]:
+        return self.users[lo:hi]
+
+class LiquidationPriceIndex:
+    """清算价格索引
+
+    对每个用户的每个资产，在其余资产价格和全部余额不变的前提下，
+    计算使健康因子恰好等于 1 的价格，并按资产分别排序保存。
+    资产价格从 P0 变为 P1 时，一次区间查询即可得到刚刚变为可清算的用户。
+
+    同一资产同时作为抵押品和债务时按净敞口计算：
+        HF < 1  <=>  R + c * p < 0
+        c = 抵押数量 * 清算阈值 - 债务数量，R = 其余资产的加权抵押 - 其余资产的债务
+    c > 0 时价格跌破 -R/c 触发清算，c < 0 时价格涨破 -R/c 触发清算。
+    """
+
+    def __init__(self):
+        # (资产, 方向) -> 排序的清算价格
+        self._books: Dict[Tuple[str, int], _SortedPrices] = defaultdict(_SortedPrices)
+        # 用户 -> {资产: (方向, 清算价格)}
+        self._entries: Dict[str, Dict[str, Tuple[int, float]]] = {}
+        # 用户 -> {资产: 净敞口 c}，价格变化时不经 RPC 重新计算清算价格
+        self._exposures: Dict[str, Dict[str, float]] = {}
+        # 资产 -> 有该资产敞口的用户
+        self._holders: Dict[str, Set[str]] = defaultdict(set)
+
+    def __len__(self) -> int:
+        return len(self._exposures)
+
+    def __contains__(self, user: str) -> bool:
+        return user in self._exposures
+
+    @staticmethod
+    def exposures(positions: Iterable[Dict], thresholds: Dict[str, float]) -> Dict[str, float]:
+        """计算用户每个资产的净敞口 c = 抵押数量 * 清算阈值 - 债务数量
+
+        Returns:
+            {资产: c}，没有债务时为空（不可能被清算）
+        """
+        exposures: Dict[str, float] = {}
+        has_debt = False
+        for pos in positions:
+            asset = pos['token_address']
+            collateral = pos.get('collateral_amount') or 0
+            debt = pos.get('debt_amount') or 0
+            if debt > 0:
+                has_debt = True
+            c = collateral * thresholds.get(asset, 0) - debt
+            if c != 0:
+                exposures[asset] = exposures.get(asset, 0.0) + c
+        return exposures if has_debt else {}
+
+    @staticmethod
+    def _solve(exposures: Dict[str, float], prices) -> Tuple[Dict[str, Tuple[int, float]], float]:
+        """由净敞口和价格计算每个资产的清算价格
+
+        Returns:
+            ({资产: (方向, 清算价格)}, 加权净值 R + c * p，小于 0 时已可清算)
+        """
+        priced = {}
+        net = 0.0
+        for asset, c in exposures.items():
+            price = prices.get(asset)
+            if not price:
+                continue
+            priced[asset] = c
+            net += c * price
+
+        result = {}
+        for asset, c in priced.items():
+            rest = net - c * prices.get(asset)
+            liquidation_price = -rest / c
+            if c > 0:
+                # 清算价格不为正时，价格跌到 0 也不会触发清算
+                if liquidation_price > 0:
+                    result[asset] = (FALLING, liquidation_price)
+            else:
+                # 清算价格为负表示当前已可清算，任何价格都成立
+                result[asset] = (RISING, max(liquidation_price, 0.0))
+        return result, net
+
+    @classmethod
+    def compute(
+        cls,
+        positions: Iterable[Dict],
+        prices: Dict[str, float],
+        thresholds: Dict[str, float]
+    ) -> Dict[str, Tuple[int, float]]:
+        """计算用户每个资产的清算价格
+
+        Args:
+            positions: 头寸列表，token_address / collateral_amount / debt_amount（按代币精度换算后的数量）
+            prices: 资产价格（USD）
+            thresholds: 资产清算阈值（小数，如 0.85）
+
+        Returns:
+            {资产: (方向, 清算价格)}，价格无论如何变化都不会触发清算的资产不包含在内
+        """
+        positions = [pos for pos in positions if prices.get(pos['token_address'])]
+        return cls._solve(cls.exposures(positions, thresholds), prices)[0]
+
+    def _replace_entries(self, user: str, entries: Dict[str, Tuple[int, float]]):
+        old_entries = self._entries.get(user, {})
+        for asset, (direction, price) in old_entries.items():
+            if entries.get(asset) != (direction, price):
+                self._books[(asset, direction)].remove(price, user)
+        for asset, (direction, price) in entries.items():
+            if old_entries.get(asset) != (direction, price):
+                self._books[(asset, direction)].add(price, user)
+
+        if entries:
+            self._entries[user] = entries
+        else:
+            self._entries.pop(user, None)
+
+    def update_user(
+        self,
+        user: str,
+        positions: Iterable[Dict],
+        prices: Dict[str, float],
+        thresholds: Dict[str, float]
+    ) -> Dict[str, Tuple[int, float]]:
+        """用用户最新头寸增量更新索引"""
+        positions = [pos for pos in positions if prices.get(pos['token_address'])]
+        exposures = self.exposures(positions, thresholds)
+        self._set_exposures(user, exposures)
+        entries = self._solve(exposures, prices)[0]
+        self._replace_entries(user, entries)
+        return entries
+
+    def _set_exposures(self, user: str, exposures: Dict[str, float]):
+        for asset in self._exposures.get(user, {}):
+            if asset not in exposures:
+                holders = self._holders.get(asset)
+                if holders is not None:
+                    holders.discard(user)
+                    if not holders:
+                        del self._holders[asset]
+        for asset in exposures:
+            self._holders[asset].add(user)
+        if exposures:
+            self._exposures[user] = exposures
+        else:
+            self._exposures.pop(user, None)
+
+    def remove_user(self, user: str):
+        self._set_exposures(user, {})
+        self._replace_entries(user, {})
+
+    def near(self, asset: str, price: float, band: float) -> Set[str]:
+        """返回该资产清算价格与 price 相差不超过 band（比例）的用户"""
+        users: Set[str] = set()
+        for direction in (FALLING, RISING):
+            book = self._books.get((asset, direction))
+            if not book:
+                continue
+            lo = bisect_left(book.prices, price * (1 - band))
+            hi = bisect_right(book.prices, price * (1 + band))
+            users.update(book.between(lo, hi))
+        return users
+
+    def reprice(self, users: Iterable[str], prices) -> Set[str]:
+        """按当前价格重新计算这些用户的全部清算价格
+
+        一个资产的清算价格依赖用户其余资产的价格。调用方只传入接近清算线的用户，
+        其余用户的清算价格在下次读取或推算头寸时更新。
+
+        Args:
+            users: 需要重新计算的用户
+            prices: 当前价格，支持 get(资产) 的映射（如 PriceTable）
+
+        Returns:
+            按当前价格已可清算的用户（包括多个资产同时变化共同导致的）
+        """
+        liquidatable = set()
+        for user in users:
+            exposures = self._exposures.get(user)
+            if exposures is None:
+                continue
+            entries, net = self._solve(exposures, prices)
+            self._replace_entries(user, entries)
+            if net < 0:
+                liquidatable.add(user)
+        return liquidatable
+
+    def liquidation_prices(self, user: str) -> Dict[str, Tuple[int, float]]:
+        return dict(self._entries.get(user, {}))
+
+    def crossed(self, asset: str, old_price: Optional[float], new_price: float) -> Set[str]:
+        """返回资产价格从 old_price 变为 new_price 后刚刚变为可清算的用户"""
+        if old_price is None or old_price == new_price:
+            return set()
+
+        if new_price < old_price:
+            # 下跌：清算价格落在 (new_price, old_price] 的抵押品用户
+            book = self._books.get((asset, FALLING))
+            if not book:
+                return set()
+            lo = bisect_right(book.prices, new_price)
+            hi = bisect_right(book.prices, old_price)
+        else:
+            # 上涨：清算价格落在 [old_price, new_price) 的债务用户
+            book = self._books.get((asset, RISING))
+            if not book:
+                return set()
+            lo = bisect_left(book.prices, old_price)
+            hi = bisect_left(book.prices, new_price)
+        return set(book.between(lo, hi))
@@ -0,0 +1,197 @@
+# 标准库
+import json
+import time
+import asyncio
+from functools import lru_cache
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+# 第三方库
+import requests
+from web3 import Web3
+
+# 本地导入
+from .profiler import record_phase
+
+if TYPE_CHECKING:
+    from .rpc_cache import RpcCache
+
+try:
+    import orjson
+except ImportError:  # orjson 不可用时退回标准库
+    orjson = None
+
+def loads(content: Union[bytes, str]):
+    """解析 JSON，优先使用 orjson"""
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+def dumps(obj) -> bytes:
+    """序列化 JSON，优先使用 orjson"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(',', ':')).encode()
+
+@lru_cache(maxsize=1 << 20)
+def to_checksum(address: str) -> str:
+    """带缓存的校验和地址转换，同一地址在回填中会反复出现"""
+    return Web3.to_checksum_address(address)
+
+def find_event_abi(abi: List[Dict], name: str) -> Dict:
+    """在合约 ABI 中查找事件定义"""
+    for item in abi:
+        if item.get('type') == 'event' and item.get('name') == name:
+            return item
+    raise ValueError(f"ABI 中不存在事件: {name}")
+
+def event_topic(event_abi: Dict) -> str:
+    """计算事件签名的 topic0"""
+    signature = f"{event_abi['name']}({','.join(i['type'] for i in event_abi['inputs'])})"
+    return Web3.keccak(text=signature).hex()
+
+def _word_decoder(abi_type: str) -> Callable[[str], object]:
+    """为单个 32 字节静态字段生成解码函数，输入为不带 0x 的 64 位十六进制字符串"""
+    if abi_type == 'address':
+        return lambda word: to_checksum('0x' + word[24:])
+    if abi_type == 'bool':
+        return lambda word: word[-1] != '0'
+    if abi_type.startswith('uint'):
+        return lambda word: int(word, 16)
+    if abi_type.startswith('int'):
+        # 有符号整数在 ABI 中按 256 位符号扩展
+        def decode_int(word: str) -> int:
+            value = int(word, 16)
+            return value - (1 << 256) if value >> 255 else value
+        return decode_int
+    if abi_type == 'bytes32':
+        return lambda word: '0x' + word
+    raise ValueError(f"不支持快速解码的类型: {abi_type}")
+
+class EventDecoder:
+    """预编译的事件解码器
+
+    根据事件 ABI 预先计算每个字段在 topics 或 data 中的位置，
+    解码时只做字符串切片和整数转换，跳过 web3 的完整 ABI 解码和 AttributeDict 构造。
+    仅支持静态类型字段。
+    """
+
+    def __init__(self, event_abi: Dict, fields: Optional[Sequence[str]] = None):
+        self.name = event_abi['name']
+        self.topic0 = event_topic(event_abi)
+
+        self._extractors: List[Tuple[str, bool, int, Callable[[str], object]]] = []
+        topic_index = 1
+        data_slot = 0
+        for item in event_abi['inputs']:
+            if item.get('indexed'):
+                position = topic_index
+                topic_index += 1
+            else:
+                position = data_slot
+                data_slot += 1
+
+            if fields is None or item['name'] in fields:
+                self._extractors.append((
+                    item['name'],
+                    bool(item.get('indexed')),
+                    position,
+                    _word_decoder(item['type'])
+                ))
+
+        if fields is not None:
+            missing = set(fields) - {name for name, *_ in self._extractors}
+            if missing:
+                raise ValueError(f"事件 {self.name} 中不存在字段: {', '.join(sorted(missing))}")
+
+    def decode(self, log: Dict) -> Dict:
+        """解码一条 eth_getLogs 返回的原始日志"""
+        topics = log['topics']
+        data = log['data']
+        result = {}
+        for name, indexed, position, decode in self._extractors:
+            if indexed:
+                word = topics[position][2:]
+            else:
+                start = 2 + position * 64
+                word = data[start:start + 64]
+            result[name] = decode(word)
+        return result
+
+class RawLogClient:
+    """直接调用 eth_getLogs 的轻量客户端
+
+    请求和响应都绕过 web3 的格式化层，响应用 orjson 解析后返回原始日志字典。
+    """
+
+    def __init__(self, rpc_url: str, timeout: int = 60, rpc_cache: Optional['RpcCache'] = None):
+        self.rpc_url = rpc_url
+        self.timeout = timeout
+        self.rpc_cache = rpc_cache
+        self.session = requests.Session()
+        self.session.headers.update({'Content-Type': 'application/json'})
+        self._request_id = 0
+
+    def _post(self, payload: bytes) -> bytes:
+        start = time.perf_counter()
+        try:
+            response = self.session.post(self.rpc_url, data=payload, timeout=self.timeout)
+            response.raise_for_status()
+            return response.content
+        finally:
+            # 绕过 web3 的请求同样计入任务周期的 RPC 耗时
+            record_phase('rpc', time.perf_counter() - start)
+
+    def _send(self, method: str, params: List) -> Dict:
+        self._request_id += 1
+        payload = dumps({
+            'jsonrpc': '2.0',
+            'id': self._request_id,
+            'method': method,
+            'params': params
+        })
+        return loads(self._post(payload))
+
+    def get_logs(
+        self,
+        address: Union[str, List[str]],
+        topics: List,
+        from_block: int,
+        to_block: int
+    ) -> List[Dict]:
+        """获取原始日志
+
+        Args:
+            address: 合约地址或地址列表
+            topics: topic 过滤条件，第一项通常为 topic0 或 topic0 列表
+            from_block: 起始区块
+            to_block: 结束区块
+
+        Returns:
+            原始日志列表，字段为十六进制字符串
+
+        Raises:
+            ValueError: 如果节点返回错误
+        """
+        params = [{
+            'address': address,
+            'topics': topics,
+            'fromBlock': hex(from_block),
+            'toBlock': hex(to_block)
+        }]
+        if self.rpc_cache is not None:
+            response = self.rpc_cache.request('eth_getLogs', params, self._send)
+        else:
+            response = self._send('eth_getLogs', params)
+        if 'error' in response:
+            raise ValueError(f"eth_getLogs 失败: {response['error']}")
+        return response['result']
+
+    async def get_logs_async(
+        self,
+        address: Union[str, List[str]],
+        topics: List,
+        from_block: int,
+        to_block: int
+    ) -> List[Dict]:
+        """在工作线程中执行 get_logs，等待节点响应时不阻塞事件循环"""
+        return await asyncio.to_thread(self.get_logs, address, topics, from_block, to_block)
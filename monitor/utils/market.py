@@ -0,0 +1,82 @@
+# 标准库
+import os
+from typing import Dict, Iterable, List, Optional
+
+# 第三方库
+from web3 import Web3
+
+# 本地导入
+from .aave_data import AaveDataProvider
+
+class Market:
+    """一个 Aave V3 市场
+
+    持有该市场的合约、数据提供者（储备缓存、价格表、请求合并层）和扫描起点，
+    任务按市场名读写数据库中属于该市场的用户、扫描进度和清算机会。
+    """
+
+    def __init__(self, name: str, web3: Web3, contracts: Dict[str, str], deploy_block: int):
+        """
+        Args:
+            name: 市场名，写入数据库的 market 字段
+            web3: 所在链的 Web3 实例，同一条链上的市场共享
+            contracts: 合约地址，键与 CONTRACTS 相同
+            deploy_block: Pool 部署区块，用户发现从这里开始扫描
+        """
+        self.name = name
+        self.web3 = web3
+        self.contracts = contracts
+        self.deploy_block = deploy_block
+        self.aave = AaveDataProvider(
+            web3,
+            contracts['AAVE_POOL'],
+            contracts['AAVE_POOL_DATA_PROVIDER'],
+            contracts['UNISWAP_V3_FACTORY'],
+            contracts.get('AAVE_ORACLE'),
+            contracts.get('MULTICALL3')
+        )
+
+    @property
+    def liquidator_address(self) -> str:
+        return self.contracts['LIQUIDATOR']
+
+    @property
+    def weth_address(self) -> str:
+        return self.contracts['WETH']
+
+    def snapshot_path(self, base_path: str, default: bool) -> str:
+        """市场的快照文件路径，默认市场沿用原路径"""
+        if default:
+            return base_path
+        root, ext = os.path.splitext(base_path)
+        return f"{root}-{self.name}{ext}"
+
+def load_markets(
+    markets: Dict[str, Dict],
+    enabled: Iterable[str],
+    web3_instances: Optional[Dict[str, Web3]] = None
+) -> List[Market]:
+    """按配置创建启用的市场
+
+    Args:
+        markets: 市场名 -> {rpc_url, deploy_block, contracts}
+        enabled: 启用的市场名
+        web3_instances: 已有的 RPC 地址 -> Web3 实例，同一 RPC 地址的市场共享连接
+
+    Returns:
+        市场列表，顺序与 enabled 一致
+
+    Raises:
+        ValueError: 如果启用了未配置的市场
+    """
+    web3_instances = web3_instances if web3_instances is not None else {}
+    result = []
+    for name in enabled:
+        if name not in markets:
+            raise ValueError(f"未配置的市场: {name}，可选: {', '.join(markets)}")
+        config = markets[name]
+        rpc_url = config['rpc_url']
+        if rpc_url not in web3_instances:
+            web3_instances[rpc_url] = Web3(Web3.HTTPProvider(rpc_url))
+        result.append(Market(name, web3_instances[rpc_url], config['contracts'], config['deploy_block']))
+    return result
@@ -0,0 +1,112 @@
+# 标准库
+import heapq
+import itertools
+import time
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+def opportunity_key(opportunity: Dict) -> Tuple[str, str, str]:
+    """清算机会的去重键 (用户, 抵押品, 债务)"""
+    return (opportunity['user'], opportunity['collateral_token'], opportunity['debt_token'])
+
+class OpportunityQueue:
+    """按预期净利润排序的内存清算机会队列
+
+    同一 (用户, 抵押品, 债务) 只保留最新的一条；每条机会在入队 ttl 秒后
+    或发现区块之后 max_age_blocks 个区块后过期。替换和过期采用惰性删除，
+    堆中残留的旧条目在出队时跳过。
+    """
+
+    def __init__(self, ttl: float = 60, max_age_blocks: int = 10):
+        self.ttl = ttl
+        self.max_age_blocks = max_age_blocks
+        # (-利润, 序号, 键)
+        self._heap: List[Tuple[float, int, Tuple[str, str, str]]] = []
+        # 键 -> (序号, 机会)
+        self._items: Dict[Tuple[str, str, str], Tuple[int, Dict]] = {}
+        self._seq = itertools.count()
+        self._listeners: List[Callable[[], None]] = []
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def add_listener(self, callback: Callable[[], None]):
+        """注册新机会入队时的回调，用于立即唤醒执行任务"""
+        self._listeners.append(callback)
+
+    def put(self, opportunity: Dict, notify: bool = True) -> bool:
+        """加入或替换清算机会
+
+        Args:
+            opportunity: 至少包含 user / collateral_token / debt_token /
+                estimated_profit_eth / block_number
+            notify: 是否通知监听者
+
+        Returns:
+            队列中此前没有同一 (用户, 抵押品, 债务) 的机会时为 True
+        """
+        now = time.monotonic()
+        opportunity.setdefault('expires_at', now + self.ttl)
+        # 首次入队时间，用于统计触发到广播的延迟
+        opportunity.setdefault('queued_at', now)
+        key = opportunity_key(opportunity)
+        seq = next(self._seq)
+        added = key not in self._items
+        self._items[key] = (seq, opportunity)
+        heapq.heappush(self._heap, (-opportunity['estimated_profit_eth'], seq, key))
+
+        if notify:
+            for callback in self._listeners:
+                callback()
+        return added
+
+    def _expired(self, opportunity: Dict, current_block: Optional[int], now: float) -> bool:
+        if now >= opportunity['expires_at']:
+            return True
+        if current_block is not None and opportunity.get('block_number') is not None:
+            return current_block - opportunity['block_number'] > self.max_age_blocks
+        return False
+
+    def pop(self, current_block: Optional[int] = None) -> Optional[Dict]:
+        """取出利润最高且未过期的机会，队列为空时返回 None"""
+        now = time.monotonic()
+        while self._heap:
+            _, seq, key = heapq.heappop(self._heap)
+            entry = self._items.get(key)
+            if entry is None or entry[0] != seq:
+                # 已被替换或移除
+                continue
+            del self._items[key]
+            if self._expired(entry[1], current_block, now):
+                continue
+            return entry[1]
+        return None
+
+    def users(self) -> Set[str]:
+        """队列中有机会的用户"""
+        return {key[0] for key in self._items}
+
+    def discard(self, opportunity: Dict):
+        self._items.pop(opportunity_key(opportunity), None)
+
+    def expire(self, current_block: Optional[int] = None) -> int:
+        """移除所有过期机会
+
+        Returns:
+            移除的数量
+        """
+        now = time.monotonic()
+        expired = [
+            key for key, (_, opportunity) in self._items.items()
+            if self._expired(opportunity, current_block, now)
+        ]
+        for key in expired:
+            del self._items[key]
+
+        # 残留条目过多时重建堆
+        if len(self._heap) > 2 * len(self._items) + 64:
+            self._heap = [
+                (-opportunity['estimated_profit_eth'], seq, key)
+                for key, (seq, opportunity) in self._items.items()
+            ]
+            heapq.heapify(self._heap)
+        return len(expired)
@@ -0,0 +1,265 @@
+# 标准库
+import time
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+# 第三方库
+from web3 import Web3
+from web3.contract import Contract
+
+# 本地导入
+from .interest import ray_div
+
+def _abi_type(output: Dict) -> str:
+    """ABI 参数类型，结构体展开为元组类型"""
+    if output['type'].startswith('tuple'):
+        components = ','.join(_abi_type(c) for c in output['components'])
+        return f"({components}){output['type'][len('tuple'):]}"
+    return output['type']
+
+def _output_types(contract: Contract, fn_name: str) -> List[str]:
+    for item in contract.abi:
+        if item.get('type') == 'function' and item.get('name') == fn_name:
+            return [_abi_type(output) for output in item['outputs']]
+    raise ValueError(f"ABI 中不存在函数: {fn_name}")
+
+class PositionReader:
+    """批量读取用户头寸
+
+    储备列表和储备元数据（精度、风险参数、aToken/债务代币地址）按 TTL 缓存，
+    用户在所有储备上的数据通过 Multicall3.aggregate3 一次请求读取，
+    多个用户也可以合并到同一个请求中。未配置 Multicall3 时退回逐个储备调用。
+    读取方法均为同步调用，block_identifier 指定读取的区块，由调用方固定区块并放入工作线程执行。
+    """
+
+    def __init__(
+        self,
+        web3: Web3,
+        pool: Contract,
+        data_provider: Contract,
+        multicall: Optional[Contract] = None,
+        reserves_ttl: int = 60*60,
+        max_calls_per_request: int = 1000
+    ):
+        self.web3 = web3
+        self.pool = pool
+        self.data_provider = data_provider
+        self.multicall = multicall
+        self.reserves_ttl = reserves_ttl
+        self.max_calls_per_request = max_calls_per_request
+
+        self._reserves: List[str] = []
+        self._reserves_loaded_at: Optional[float] = None
+        self._metadata: Dict[str, Dict] = {}
+
+        self._user_reserve_types = _output_types(data_provider, 'getUserReserveData')
+        self._config_types = _output_types(data_provider, 'getReserveConfigurationData')
+        self._tokens_types = _output_types(data_provider, 'getReserveTokensAddresses')
+        self._reserve_data_types = _output_types(pool, 'getReserveData')
+        self._income_types = _output_types(pool, 'getReserveNormalizedIncome')
+
+    def _aggregate(
+        self,
+        calls: Sequence[Tuple[str, str]],
+        block_identifier: Union[int, str] = 'latest'
+    ) -> List[Optional[bytes]]:
+        """执行 Multicall3.aggregate3，失败的子调用返回 None"""
+        results: List[Optional[bytes]] = []
+        step = self.max_calls_per_request
+        for start in range(0, len(calls), step):
+            chunk = [(target, True, data) for target, data in calls[start:start + step]]
+            for success, data in self.multicall.functions.aggregate3(chunk).call(block_identifier=block_identifier):
+                results.append(data if success and data else None)
+        return results
+
+    def reserves(self, block_identifier: Union[int, str] = 'latest') -> List[str]:
+        """返回储备列表，过期后重新获取"""
+        now = time.monotonic()
+        if self._reserves_loaded_at is None or now - self._reserves_loaded_at > self.reserves_ttl:
+            reserves = self.pool.functions.getReservesList().call(block_identifier=block_identifier)
+            if reserves != self._reserves:
+                self._load_metadata([r for r in reserves if r not in self._metadata], block_identifier)
+                self._reserves = reserves
+            self._reserves_loaded_at = now
+        return self._reserves
+
+    def _load_metadata(self, assets: List[str], block_identifier: Union[int, str] = 'latest'):
+        if not assets:
+            return
+
+        if self.multicall is not None:
+            calls = []
+            for asset in assets:
+                calls.append((
+                    self.data_provider.address,
+                    self.data_provider.encodeABI(fn_name='getReserveConfigurationData', args=[asset])
+                ))
+                calls.append((
+                    self.data_provider.address,
+                    self.data_provider.encodeABI(fn_name='getReserveTokensAddresses', args=[asset])
+                ))
+            results = self._aggregate(calls, block_identifier)
+            raw = []
+            for i, asset in enumerate(assets):
+                config_data, tokens_data = results[2 * i], results[2 * i + 1]
+                if config_data is None or tokens_data is None:
+                    print(f"读取储备 {asset} 元数据失败")
+                    continue
+                raw.append((
+                    asset,
+                    self.web3.codec.decode(self._config_types, config_data),
+                    self.web3.codec.decode(self._tokens_types, tokens_data)
+                ))
+        else:
+            raw = [
+                (
+                    asset,
+                    self.data_provider.functions.getReserveConfigurationData(asset).call(block_identifier=block_identifier),
+                    self.data_provider.functions.getReserveTokensAddresses(asset).call(block_identifier=block_identifier)
+                )
+                for asset in assets
+            ]
+
+        for asset, config, tokens in raw:
+            self._metadata[asset] = {
+                'address': asset,
+                'decimals': config[0],
+                'ltv': config[1],
+                'liquidation_threshold': config[2],
+                'liquidation_bonus': config[3],
+                'a_token': Web3.to_checksum_address(tokens[0]),
+                'stable_debt_token': Web3.to_checksum_address(tokens[1]),
+                'variable_debt_token': Web3.to_checksum_address(tokens[2])
+            }
+
+    def cached_metadata(self, asset: str) -> Optional[Dict]:
+        """返回已缓存的储备元数据，不发起请求"""
+        return self._metadata.get(asset)
+
+    def reserve_metadata(self, asset: str, block_identifier: Union[int, str] = 'latest') -> Dict:
+        """返回储备元数据，未缓存时单独加载"""
+        if asset not in self._metadata:
+            self._load_metadata([asset], block_identifier)
+        if asset not in self._metadata:
+            raise ValueError(f"无法读取储备 {asset} 的元数据")
+        return self._metadata[asset]
+
+    def get_reserves_data(self, block_identifier: Union[int, str] = 'latest') -> List[Dict]:
+        """读取所有储备的流动性指数、浮动借款指数、利率和更新时间
+
+        Returns:
+            address / liquidity_index / liquidity_rate / variable_borrow_index /
+            variable_borrow_rate / last_update_timestamp 列表（指数和利率为 ray）
+        """
+        reserves = self.reserves(block_identifier)
+        if self.multicall is not None:
+            results = self._aggregate([
+                (self.pool.address, self.pool.encodeABI(fn_name='getReserveData', args=[asset]))
+                for asset in reserves
+            ], block_identifier)
+            raw = []
+            for asset, data in zip(reserves, results):
+                if data is None:
+                    print(f"读取储备 {asset} 指数失败")
+                    continue
+                raw.append((asset, self.web3.codec.decode(self._reserve_data_types, data)[0]))
+        else:
+            raw = [
+                (asset, self.pool.functions.getReserveData(asset).call(block_identifier=block_identifier))
+                for asset in reserves
+            ]
+
+        return [
+            {
+                'address': asset,
+                'liquidity_index': data[1],
+                'liquidity_rate': data[2],
+                'variable_borrow_index': data[3],
+                'variable_borrow_rate': data[4],
+                'last_update_timestamp': data[6]
+            }
+            for asset, data in raw
+        ]
+
+    def _position(self, asset: str, raw_data: Sequence, income: Optional[int] = None) -> Dict:
+        """将 getUserReserveData 返回值转换为头寸，数量按代币精度换算
+
+        income 为同一区块的流动性指数(ray)，给出时同时计算缩放后的抵押数量
+        """
+        scale = 10 ** self.reserve_metadata(asset)['decimals']
+        collateral = raw_data[0]
+        debt = raw_data[1] + raw_data[2]  # stableDebt + variableDebt
+        return {
+            'token_address': asset,
+            'collateral_amount': collateral / scale,
+            'debt_amount': debt / scale,
+            'raw_collateral_amount': collateral,
+            'raw_debt_amount': debt,
+            'scaled_collateral': ray_div(collateral, income) / scale if income else None,
+            'scaled_variable_debt': raw_data[4] / scale,
+            'stable_debt': raw_data[1] / scale,
+            'usage_as_collateral_enabled': raw_data[8]
+        }
+
+    def get_positions_batch(
+        self,
+        users: Sequence[str],
+        block_identifier: Union[int, str] = 'latest'
+    ) -> Dict[str, List[Dict]]:
+        """一次请求读取多个用户在所有储备上的头寸
+
+        Returns:
+            用户地址 -> 头寸列表
+        """
+        reserves = self.reserves(block_identifier)
+        positions: Dict[str, List[Dict]] = {user: [] for user in users}
+
+        if self.multicall is None:
+            incomes = {
+                asset: self.pool.functions.getReserveNormalizedIncome(asset).call(block_identifier=block_identifier)
+                for asset in reserves
+            }
+            for user in users:
+                for asset in reserves:
+                    try:
+                        raw_data = self.data_provider.functions.getUserReserveData(asset, user).call(
+                            block_identifier=block_identifier
+                        )
+                        positions[user].append(self._position(asset, raw_data, incomes[asset]))
+                    except Exception as e:
+                        print(f"处理代币 {asset} 数据时出错: {str(e)}")
+            return positions
+
+        # 同一请求中附带各储备的流动性指数，用于换算缩放后的抵押数量
+        calls = [
+            (self.pool.address, self.pool.encodeABI(fn_name='getReserveNormalizedIncome', args=[asset]))
+            for asset in reserves
+        ]
+        calls += [
+            (
+                self.data_provider.address,
+                self.data_provider.encodeABI(fn_name='getUserReserveData', args=[asset, user])
+            )
+            for user in users
+            for asset in reserves
+        ]
+        results = self._aggregate(calls, block_identifier)
+
+        incomes = {
+            asset: self.web3.codec.decode(self._income_types, data)[0] if data is not None else None
+            for asset, data in zip(reserves, results)
+        }
+        i = len(reserves)
+        for user in users:
+            for asset in reserves:
+                data = results[i]
+                i += 1
+                if data is None:
+                    print(f"读取用户 {user} 在代币 {asset} 上的数据失败")
+                    continue
+                raw_data = self.web3.codec.decode(self._user_reserve_types, data)
+                positions[user].append(self._position(asset, raw_data, incomes[asset]))
+        return positions
+
+    def get_positions(self, user: str, block_identifier: Union[int, str] = 'latest') -> List[Dict]:
+        """读取单个用户在所有储备上的头寸"""
+        return self.get_positions_batch([user], block_identifier)[user]
@@ -0,0 +1,65 @@
+# 标准库
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+class PriceTable:
+    """共享的资产价格表（USD，8 位精度已换算为浮点）
+
+    由价格监听任务写入，AaveDataProvider 和各任务读取，
+    避免每次计算都向 Oracle 发起调用。
+    """
+
+    def __init__(self):
+        # asset -> (price, block, updated_at, expires_at)
+        self._prices: Dict[str, Tuple[float, int, float, Optional[float]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._prices)
+
+    def __contains__(self, asset: str) -> bool:
+        return self._live(asset) is not None
+
+    def _live(self, asset: str) -> Optional[Tuple[float, int, float, Optional[float]]]:
+        entry = self._prices.get(asset)
+        if entry is not None and entry[3] is not None and time.time() >= entry[3]:
+            return None
+        return entry
+
+    def get(self, asset: str) -> Optional[float]:
+        entry = self._live(asset)
+        return entry[0] if entry else None
+
+    def get_entry(self, asset: str) -> Optional[Tuple[float, int, float]]:
+        """返回 (价格, 区块, 更新时间)"""
+        entry = self._live(asset)
+        return entry[:3] if entry else None
+
+    def update(
+        self,
+        asset: str,
+        price: float,
+        block: int = 0,
+        ttl: Optional[float] = None
+    ) -> Tuple[Optional[float], bool]:
+        """写入价格
+
+        Args:
+            asset: 资产地址
+            price: 价格
+            block: 价格所在区块
+            ttl: 有效期(秒)，过期后视为没有价格；为 None 时一直有效，直到被更新的价格覆盖
+
+        Returns:
+            (写入前的价格，首次写入时为 None; 是否写入)
+        """
+        previous = self._live(asset)
+        if previous and previous[1] > block:
+            # 不用旧区块的价格覆盖新价格
+            return previous[0], False
+        expires_at = time.time() + ttl if ttl is not None else None
+        self._prices[asset] = (price, block, time.time(), expires_at)
+        return (previous[0] if previous else None), True
+
+    def items(self) -> Iterable[Tuple[str, float]]:
+        entries = ((asset, self._live(asset)) for asset in list(self._prices))
+        return ((asset, entry[0]) for asset, entry in entries if entry)
@@ -0,0 +1,200 @@
+# 标准库
+import os
+import sys
+import time
+import heapq
+import threading
+from collections import Counter
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from types import CodeType, FrameType
+from typing import Callable, Dict, List, Optional, Tuple
+
+# 第三方库
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# 当前协程所属的任务周期，RPC 和数据库耗时记入其中
+_current_cycle: ContextVar[Optional['CycleTimer']] = ContextVar('current_cycle', default=None)
+
+PHASES = ('rpc', 'db')
+
+class CycleTimer:
+    """一个任务周期的分阶段计时
+
+    RPC 和数据库耗时由 web3 中间件和 SQLAlchemy 事件累加，
+    计算耗时为总耗时减去二者之和。
+    """
+
+    def __init__(self, task_name: str):
+        self.task_name = task_name
+        self.started_at = datetime.now(timezone.utc)
+        self.phases: Dict[str, float] = {phase: 0.0 for phase in PHASES}
+        self.calls: Dict[str, int] = {phase: 0 for phase in PHASES}
+        self._start = time.perf_counter()
+        self.total: Optional[float] = None
+
+    def add(self, phase: str, seconds: float):
+        self.phases[phase] += seconds
+        self.calls[phase] += 1
+
+    def finish(self) -> float:
+        self.total = time.perf_counter() - self._start
+        return self.total
+
+    def breakdown(self) -> Dict:
+        """返回各阶段耗时(秒)和调用次数"""
+        total = self.total if self.total is not None else time.perf_counter() - self._start
+        return {
+            'task': self.task_name,
+            'started_at': self.started_at.isoformat(),
+            'total': total,
+            'rpc': self.phases['rpc'],
+            'db': self.phases['db'],
+            'compute': max(total - self.phases['rpc'] - self.phases['db'], 0.0),
+            'rpc_calls': self.calls['rpc'],
+            'db_calls': self.calls['db']
+        }
+
+def begin_cycle(task_name: str) -> Tuple[CycleTimer, object]:
+    """开始记录当前协程的任务周期，返回计时器和用于恢复的 token"""
+    timer = CycleTimer(task_name)
+    return timer, _current_cycle.set(timer)
+
+def end_cycle(timer: CycleTimer, token: object) -> float:
+    _current_cycle.reset(token)
+    return timer.finish()
+
+def record_phase(phase: str, seconds: float):
+    """将耗时记入当前任务周期，不在任务周期内时忽略"""
+    timer = _current_cycle.get()
+    if timer is not None:
+        timer.add(phase, seconds)
+
+class SlowCycleLog:
+    """每个任务保留耗时最长的 N 个周期，开销只有一次堆操作"""
+
+    def __init__(self, capacity: int = 10):
+        self.capacity = capacity
+        self._cycles: Dict[str, List[Tuple[float, int, Dict]]] = {}
+        self._seq = 0
+
+    def record(self, timer: CycleTimer):
+        heap = self._cycles.setdefault(timer.task_name, [])
+        self._seq += 1
+        item = (timer.total, self._seq, timer)
+        if len(heap) < self.capacity:
+            heapq.heappush(heap, item)
+        elif timer.total > heap[0][0]:
+            heapq.heapreplace(heap, item)
+
+    def slowest(self, task_name: str) -> List[Dict]:
+        """返回任务最慢的周期，按耗时降序"""
+        return [
+            timer.breakdown()
+            for _, _, timer in sorted(self._cycles.get(task_name, []), reverse=True)
+        ]
+
+    def report(self) -> str:
+        lines = []
+        for task_name in sorted(self._cycles):
+            lines.append(f"[{task_name}] 最慢的 {len(self._cycles[task_name])} 个周期:")
+            for cycle in self.slowest(task_name):
+                lines.append(
+                    f"  {cycle['started_at']}  总计 {cycle['total']:.3f}s  "
+                    f"RPC {cycle['rpc']:.3f}s/{cycle['rpc_calls']}次  "
+                    f"DB {cycle['db']:.3f}s/{cycle['db_calls']}次  "
+                    f"计算 {cycle['compute']:.3f}s"
+                )
+        return "\n".join(lines)
+
+def rpc_timing_middleware(make_request: Callable, web3) -> Callable:
+    """web3 中间件，将每次 RPC 请求的耗时记入当前任务周期"""
+    def middleware(method, params):
+        start = time.perf_counter()
+        try:
+            return make_request(method, params)
+        finally:
+            record_phase('rpc', time.perf_counter() - start)
+    return middleware
+
+def install_db_timing(engine: Engine):
+    """通过 SQLAlchemy 游标事件将数据库耗时记入当前任务周期"""
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        record_phase('db', time.perf_counter() - conn.info['query_start'].pop())
+
+def _frame_label(code: CodeType) -> str:
+    module = os.path.splitext(os.path.basename(code.co_filename))[0]
+    return f"{module}:{code.co_name}"
+
+class SamplingProfiler:
+    """采样分析器
+
+    后台线程定期读取事件循环线程的调用栈，只保留经过目标任务实例 execute
+    的样本，输出与 flamegraph.pl / speedscope 兼容的折叠栈格式。
+    """
+
+    def __init__(
+        self,
+        target: CodeType,
+        thread_id: Optional[int] = None,
+        interval: float = 0.005,
+        owner: Optional[object] = None
+    ):
+        """
+        Args:
+            target: 目标任务 execute 方法的代码对象
+            thread_id: 被采样的线程，默认为当前线程
+            interval: 采样间隔(秒)
+            owner: 目标任务实例，同一任务类有多个实例（如每个市场一个）时只保留该实例的样本
+        """
+        self.target = target
+        self.owner = owner
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _stack(self, frame: Optional[FrameType]) -> Optional[Tuple[str, ...]]:
+        stack = []
+        while frame is not None:
+            stack.append(_frame_label(frame.f_code))
+            if frame.f_code is self.target:
+                if self.owner is not None and frame.f_locals.get('self') is not self.owner:
+                    return None
+                return tuple(reversed(stack))
+            frame = frame.f_back
+        return None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            stack = self._stack(sys._current_frames().get(self.thread_id))
+            if stack:
+                self.samples[stack] += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def write_collapsed(self, path: str) -> int:
+        """写入折叠栈文件
+
+        Returns:
+            样本数
+        """
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w') as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{';'.join(stack)} {count}\n")
+        return sum(self.samples.values())
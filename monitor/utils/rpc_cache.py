@@ -0,0 +1,236 @@
+# 标准库
+import os
+import json
+import zlib
+import sqlite3
+import hashlib
+import threading
+from typing import Any, Callable, Dict, Optional
+
+# 本地导入
+from .log_decoder import dumps, loads
+
+RECORD = 'record'
+REPLAY = 'replay'
+
+# 区块参数所在位置，'latest' 等标签会被替换为固定区块
+_BLOCK_PARAM_INDEX = {
+    'eth_call': 1,
+    'eth_estimateGas': 1,
+    'eth_getBalance': 1,
+    'eth_getCode': 1,
+    'eth_getTransactionCount': 1,
+    'eth_getStorageAt': 2,
+    'eth_getBlockByNumber': 0,
+    'eth_feeHistory': 1
+}
+_BLOCK_TAGS = {'latest', 'pending', 'safe', 'finalized'}
+
+# 与区块无关、结果不会变化的请求，按 (方法, 参数) 记录
+_STATIC = {'eth_chainId', 'net_version', 'eth_getBlockByHash'}
+
+# 没有区块参数但结果随区块变化的请求，键中加入固定区块，视为固定区块上的结果
+_PINNED = {'eth_gasPrice', 'eth_maxPriorityFeePerGas'}
+
+# 其余请求（交易回执等结果随时间变化且无法固定区块的请求）不会被记录，
+# 录制时直接转发，回放时返回错误
+_CACHEABLE = set(_BLOCK_PARAM_INDEX) | _STATIC | _PINNED | {'eth_getLogs', 'eth_blockNumber'}
+
+# 录制和回放时都不发送交易：区块高度和 nonce 固定在录制区块，签名的交易会用过时的 nonce 广播到真实网络
+_SEND = {'eth_sendRawTransaction', 'eth_sendTransaction'}
+
+class RpcStore:
+    """RPC 响应存储
+
+    使用 sqlite 单文件保存，键为请求的哈希，值为 zlib 压缩后的 JSON 响应。
+    """
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS responses (key BLOB PRIMARY KEY, method TEXT, body BLOB)'
+            )
+            self._conn.execute('CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)')
+            self._conn.commit()
+
+    def get(self, key: bytes) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute('SELECT body FROM responses WHERE key = ?', (key,)).fetchone()
+        return loads(zlib.decompress(row[0])) if row else None
+
+    def put(self, key: bytes, method: str, response: Dict):
+        body = zlib.compress(dumps(response), 6)
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO responses (key, method, body) VALUES (?, ?, ?)',
+                (key, method, body)
+            )
+            self._conn.commit()
+
+    def get_meta(self, name: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute('SELECT value FROM meta WHERE name = ?', (name,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, name: str, value: str):
+        with self._lock:
+            self._conn.execute('INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)', (name, value))
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, int]:
+        """按方法统计已记录的请求数"""
+        with self._lock:
+            rows = self._conn.execute('SELECT method, COUNT(*) FROM responses GROUP BY method').fetchall()
+        return dict(rows)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+class RpcCache:
+    """JSON-RPC 录制 / 回放
+
+    录制模式下将链状态固定在 pin_block：所有 'latest' 区块参数替换为该区块，
+    eth_blockNumber 也始终返回该区块，因此每个请求的响应只取决于方法和参数，
+    可以按 (方法, 参数) 记录。这意味着录制和回放的运行只覆盖单个区块：
+    链不会前进，按新区块触发的逻辑（价格日志、新用户、回执）都不会出现。
+
+    只有区块参数可固定的请求、与区块无关的请求和 _PINNED 中的请求会被记录，
+    其他请求录制时直接转发，回放时返回错误。回放模式只读存储，不访问网络，
+    存储中没有的请求返回 JSON-RPC 错误。
+
+    同一个实例既作为 web3 中间件使用，也供 RawLogClient 等绕过 web3 的客户端调用。
+    """
+
+    def __init__(self, store: RpcStore, mode: str, pin_block: Optional[int] = None):
+        """
+        Args:
+            store: 响应存储
+            mode: 'record' 或 'replay'
+            pin_block: 固定的区块号；录制时为空则使用首次请求时的最新区块，
+                回放时为空则使用录制时保存的区块
+        """
+        if mode not in (RECORD, REPLAY):
+            raise ValueError(f"未知的 RPC 缓存模式: {mode}")
+        self.store = store
+        self.mode = mode
+        self.pin_block = pin_block
+        self.hits = 0
+        self.misses = 0
+        # 中间件在 asyncio.to_thread 的工作线程中调用，首次固定区块需要加锁
+        self._pin_lock = threading.Lock()
+
+        if self.pin_block is None:
+            saved = store.get_meta('pin_block')
+            if saved is not None:
+                self.pin_block = int(saved)
+            elif mode == REPLAY:
+                raise ValueError(f"回放存储 {store.path} 中没有固定区块")
+
+    @staticmethod
+    def make_key(method: str, params: Any) -> bytes:
+        """请求的规范化哈希，字典按键排序，字节串转为十六进制"""
+        canonical = json.dumps(
+            [method, params],
+            sort_keys=True,
+            separators=(',', ':'),
+            default=lambda value: '0x' + bytes(value).hex()
+        )
+        return hashlib.sha256(canonical.encode()).digest()
+
+    def _pin(self, method: str, params: Any) -> Any:
+        """将区块标签替换为固定区块"""
+        pinned = hex(self.pin_block)
+        if method == 'eth_getLogs' and params:
+            flt = dict(params[0])
+            for field in ('fromBlock', 'toBlock'):
+                if flt.get(field, 'latest') in _BLOCK_TAGS:
+                    flt[field] = pinned
+            return [flt] + list(params[1:])
+
+        index = _BLOCK_PARAM_INDEX.get(method)
+        if index is None:
+            return params
+        params = list(params)
+        if len(params) <= index:
+            params.append(pinned)
+        elif params[index] in _BLOCK_TAGS:
+            params[index] = pinned
+        return params
+
+    def _ensure_pinned(self, send: Callable[[str, Any], Dict]):
+        """录制时首次请求固定在当时的最新区块"""
+        if self.pin_block is not None:
+            return
+        with self._pin_lock:
+            if self.pin_block is not None:
+                return
+            response = send('eth_blockNumber', [])
+            pin_block = int(response['result'], 16)
+            self.store.set_meta('pin_block', str(pin_block))
+            self.pin_block = pin_block
+            print(f"RPC 录制固定在区块 {pin_block}")
+
+    def request(self, method: str, params: Any, send: Callable[[str, Any], Dict]) -> Dict:
+        """处理一次 JSON-RPC 请求
+
+        Args:
+            method: RPC 方法
+            params: 参数
+            send: 访问网络的函数，只在录制模式下调用
+
+        Returns:
+            JSON-RPC 响应字典
+        """
+        if method in _SEND:
+            return self._error(method, "RPC 缓存模式下不发送交易")
+        if method not in _CACHEABLE:
+            if self.mode == REPLAY:
+                return self._error(method, "回放模式下不支持该请求")
+            return send(method, params)
+
+        self._ensure_pinned(send)
+
+        # 录制的运行固定在单个区块，链高度不前进
+        if method == 'eth_blockNumber':
+            return {'jsonrpc': '2.0', 'id': 0, 'result': hex(self.pin_block)}
+
+        params = self._pin(method, params)
+        if method in _PINNED:
+            key = self.make_key(method, [params, hex(self.pin_block)])
+        else:
+            key = self.make_key(method, params)
+        cached = self.store.get(key)
+        if cached is not None:
+            self.hits += 1
+            return {'jsonrpc': '2.0', 'id': 0, **cached}
+
+        self.misses += 1
+        if self.mode == REPLAY:
+            return self._error(method, "回放存储中没有该请求")
+
+        response = send(method, params)
+        # 只记录成功的响应，临时错误不应在回放时重现
+        if 'result' in response:
+            self.store.put(key, method, {'result': response['result']})
+        return response
+
+    @staticmethod
+    def _error(method: str, message: str) -> Dict:
+        return {'jsonrpc': '2.0', 'id': 0, 'error': {'code': -32000, 'message': f"{message}: {method}"}}
+
+    def middleware(self, make_request: Callable, web3) -> Callable:
+        """web3 中间件，需注入到最内层以读写未经格式化的原始响应"""
+        def middleware(method, params):
+            return self.request(method, params, make_request)
+        return middleware
+
+def rpc_cache_from_config(config: Dict) -> Optional[RpcCache]:
+    """根据配置创建 RPC 缓存，未启用时返回 None"""
+    if not config['mode']:
+        return None
+    return RpcCache(RpcStore(config['path']), config['mode'], config['pin_block'])
@@ -0,0 +1,375 @@
+# 标准库
+import os
+import mmap
+import math
+import struct
+import zlib
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional
+
+# 第三方库
+from sqlalchemy.orm import Session
+from web3 import Web3
+
+# 本地导入
+from ..db.models import DEFAULT_MARKET, User, Position, ScanStatus
+
+# 快照文件格式（小端序，定长记录，可直接 mmap 随机访问）:
+#
+#   header   | magic(4s) version(H) reserved(H) block(Q) created_at(d)
+#            | user_count(I) position_count(I)
+#   users    | address(20s) health_factor(d) total_collateral_eth(d) total_debt_eth(d) last_updated(d)
+#   positions| user_index(I) token(20s) symbol(10s) collateral_amount(d) debt_amount(d)
+#            | collateral_usd(d) debt_usd(d) last_updated(d)
+#            | scaled_collateral(d) scaled_variable_debt(d) stable_debt(d) usage_as_collateral(B)
+#   footer   | crc32(I)  —— 覆盖 footer 之前的全部字节
+#
+# 浮点字段为 None 时写入 NaN；时间戳为 UTC 秒；usage_as_collateral 为 None 时按启用写入。
+# 储备元数据不写入快照：启动时一次 multicall 即可重新加载，且包含快照不保存的代币地址。
+SNAPSHOT_MAGIC = b'AVSN'
+SNAPSHOT_VERSION = 3
+
+HEADER = struct.Struct('<4sHHQdII')
+ADDRESS = struct.Struct('<20s')
+USER_RECORD = struct.Struct('<20sdddd')
+POSITION_RECORD = struct.Struct('<I20s10sddddddddB')
+FOOTER = struct.Struct('<I')
+
+# 恢复的用户的更新时间，保证下一次定时更新时从链上重新读取
+STALE = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def _pack_address(address: Optional[str]) -> bytes:
+    if not address:
+        return b'\x00' * 20
+    return bytes.fromhex(address[2:] if address.startswith('0x') else address)
+
+
+def _unpack_address(raw: bytes) -> str:
+    # 地址以 20 字节原始形式存储，读取时统一恢复为校验和格式，与事件中的地址一致
+    return Web3.to_checksum_address('0x' + raw.hex())
+
+
+def _float(value: Optional[float]) -> float:
+    return float('nan') if value is None else float(value)
+
+
+def _optional(value: float) -> Optional[float]:
+    return None if math.isnan(value) else value
+
+
+def _timestamp(value: Optional[datetime]) -> float:
+    if value is None:
+        return float('nan')
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def _datetime(value: float) -> Optional[datetime]:
+    if math.isnan(value):
+        return None
+    return datetime.fromtimestamp(value, tz=timezone.utc)
+
+
+def write_snapshot(
+    path: str,
+    block: int,
+    users: List[Dict],
+    positions: List[Dict]
+) -> int:
+    """写入状态快照
+
+    先写入临时文件再原子替换，进程在写入中途退出也不会留下损坏的快照。
+
+    Args:
+        path: 快照文件路径
+        block: 快照对应的最后处理区块
+        users: 用户字典列表，字段同 User 表
+        positions: 头寸字典列表，字段同 Position 表，另需 user_address
+
+    Returns:
+        写入的字节数
+    """
+    user_index = {user['address']: i for i, user in enumerate(users)}
+    positions = [p for p in positions if p['user_address'] in user_index]
+
+    buf = bytearray(
+        HEADER.size
+        + USER_RECORD.size * len(users)
+        + POSITION_RECORD.size * len(positions)
+    )
+    HEADER.pack_into(
+        buf, 0,
+        SNAPSHOT_MAGIC, SNAPSHOT_VERSION, 0, block,
+        datetime.now(timezone.utc).timestamp(),
+        len(users), len(positions)
+    )
+    offset = HEADER.size
+
+    for user in users:
+        USER_RECORD.pack_into(
+            buf, offset,
+            _pack_address(user['address']),
+            _float(user.get('health_factor')),
+            _float(user.get('total_collateral_eth')),
+            _float(user.get('total_debt_eth')),
+            _timestamp(user.get('last_updated'))
+        )
+        offset += USER_RECORD.size
+
+    for pos in positions:
+        POSITION_RECORD.pack_into(
+            buf, offset,
+            user_index[pos['user_address']],
+            _pack_address(pos.get('token_address')),
+            (pos.get('token_symbol') or '').encode()[:10],
+            _float(pos.get('collateral_amount')),
+            _float(pos.get('debt_amount')),
+            _float(pos.get('collateral_usd')),
+            _float(pos.get('debt_usd')),
+            _timestamp(pos.get('last_updated')),
+            _float(pos.get('scaled_collateral')),
+            _float(pos.get('scaled_variable_debt')),
+            _float(pos.get('stable_debt')),
+            pos.get('usage_as_collateral') is not False
+        )
+        offset += POSITION_RECORD.size
+
+    tmp_path = f"{path}.tmp"
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(tmp_path, 'wb') as f:
+        f.write(buf)
+        f.write(FOOTER.pack(zlib.crc32(buf)))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+    return len(buf) + FOOTER.size
+
+
+class Snapshot:
+    """只读快照，通过 mmap 按需解码记录"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError(f"快照文件为空: {path}")
+
+        if len(self._mm) < HEADER.size + FOOTER.size:
+            self.close()
+            raise ValueError(f"快照文件长度不足: {path}")
+
+        (
+            magic, version, _, self.block, created_at,
+            self.user_count, self.position_count
+        ) = HEADER.unpack_from(self._mm, 0)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            self.close()
+            raise ValueError(f"不支持的快照格式: {path}")
+        self.created_at = datetime.fromtimestamp(created_at, tz=timezone.utc)
+
+        self._users_offset = HEADER.size
+        self._positions_offset = self._users_offset + USER_RECORD.size * self.user_count
+        body_size = self._positions_offset + POSITION_RECORD.size * self.position_count
+
+        if len(self._mm) != body_size + FOOTER.size:
+            self.close()
+            raise ValueError(f"快照文件长度与记录数不符: {path}")
+        (crc,) = FOOTER.unpack_from(self._mm, body_size)
+        with memoryview(self._mm) as view:
+            valid = zlib.crc32(view[:body_size]) == crc
+        if not valid:
+            self.close()
+            raise ValueError(f"快照校验失败: {path}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """释放 mmap 和文件句柄"""
+        mm = getattr(self, '_mm', None)
+        if mm is not None:
+            mm.close()
+            self._mm = None
+        self._file.close()
+
+    def user_address(self, index: int) -> str:
+        """按序号读取用户地址，无需解码整个用户表"""
+        offset = self._users_offset + USER_RECORD.size * index
+        return _unpack_address(ADDRESS.unpack_from(self._mm, offset)[0])
+
+    def iter_users(self) -> Iterator[Dict]:
+        # 按偏移直接从 mmap 解码，不复制整段记录
+        unpack = USER_RECORD.unpack_from
+        for i in range(self.user_count):
+            address, hf, collateral, debt, updated = unpack(
+                self._mm, self._users_offset + USER_RECORD.size * i
+            )
+            yield {
+                'address': _unpack_address(address),
+                'health_factor': _optional(hf),
+                'total_collateral_eth': _optional(collateral),
+                'total_debt_eth': _optional(debt),
+                'last_updated': _datetime(updated)
+            }
+
+    def iter_positions(self) -> Iterator[Dict]:
+        unpack = POSITION_RECORD.unpack_from
+        for i in range(self.position_count):
+            (
+                user_index, token, symbol, collateral, debt,
+                collateral_usd, debt_usd, updated,
+                scaled_collateral, scaled_variable_debt, stable_debt, usage_as_collateral
+            ) = unpack(self._mm, self._positions_offset + POSITION_RECORD.size * i)
+            yield {
+                'user_index': user_index,
+                'token_address': _unpack_address(token),
+                'token_symbol': symbol.rstrip(b'\x00').decode() or None,
+                'collateral_amount': _optional(collateral),
+                'debt_amount': _optional(debt),
+                'collateral_usd': _optional(collateral_usd),
+                'debt_usd': _optional(debt_usd),
+                'last_updated': _datetime(updated),
+                'scaled_collateral': _optional(scaled_collateral),
+                'scaled_variable_debt': _optional(scaled_variable_debt),
+                'stable_debt': _optional(stable_debt),
+                'usage_as_collateral': bool(usage_as_collateral)
+            }
+
+
+def dump_state(
+    db: Session,
+    path: str,
+    market: str = DEFAULT_MARKET
+) -> int:
+    """将数据库中一个市场的用户、头寸和扫描进度写入快照
+
+    Returns:
+        快照对应的区块号
+    """
+    scan_status = db.query(ScanStatus).filter_by(market=market).first()
+    block = scan_status.last_scanned_block if scan_status else 0
+
+    users = [
+        {
+            'address': address,
+            'health_factor': hf,
+            'total_collateral_eth': collateral,
+            'total_debt_eth': debt,
+            'last_updated': updated
+        }
+        for address, hf, collateral, debt, updated in db.query(
+            User.address, User.health_factor, User.total_collateral_eth,
+            User.total_debt_eth, User.last_updated
+        ).filter(User.market == market).yield_per(10000)
+    ]
+
+    positions = [
+        {
+            'user_address': address,
+            'token_address': token,
+            'token_symbol': symbol,
+            'collateral_amount': collateral,
+            'debt_amount': debt,
+            'collateral_usd': collateral_usd,
+            'debt_usd': debt_usd,
+            'last_updated': updated,
+            'scaled_collateral': scaled_collateral,
+            'scaled_variable_debt': scaled_variable_debt,
+            'stable_debt': stable_debt,
+            'usage_as_collateral': usage_as_collateral
+        }
+        for (
+            address, token, symbol, collateral, debt, collateral_usd, debt_usd, updated,
+            scaled_collateral, scaled_variable_debt, stable_debt, usage_as_collateral
+        ) in db.query(
+            User.address, Position.token_address, Position.token_symbol,
+            Position.collateral_amount, Position.debt_amount,
+            Position.collateral_usd, Position.debt_usd, Position.last_updated,
+            Position.scaled_collateral, Position.scaled_variable_debt,
+            Position.stable_debt, Position.usage_as_collateral
+        ).join(Position, Position.user_id == User.id).filter(User.market == market).yield_per(10000)
+    ]
+
+    write_snapshot(path, block, users, positions)
+    return block
+
+
+def restore_state(
+    db: Session,
+    path: str,
+    batch_size: int = 5000,
+    market: str = DEFAULT_MARKET
+) -> Optional[int]:
+    """从快照恢复一个市场的数据库状态
+
+    仅在快照比数据库中的扫描进度更新时恢复：已存在的用户保留，
+    缺失的用户和头寸批量插入，随后将扫描进度推进到快照区块，
+    用户发现任务只需补扫快照之后的日志。
+
+    快照区块之后的头寸事件不会回放，该市场所有用户的更新时间置为最早，
+    启动后的第一次定时更新即从链上重新读取。
+
+    Returns:
+        恢复到的区块号，未恢复时返回 None
+    """
+    if not os.path.exists(path):
+        return None
+
+    with Snapshot(path) as snapshot:
+        scan_status = db.query(ScanStatus).filter_by(market=market).first()
+        if scan_status and scan_status.last_scanned_block >= snapshot.block:
+            print(f"数据库扫描进度 {scan_status.last_scanned_block} 不落后于快照区块 {snapshot.block}，跳过恢复")
+            return None
+
+        existing = {address for (address,) in db.query(User.address).filter(User.market == market)}
+        snapshot_users = list(snapshot.iter_users())
+        new_users = [{**u, 'market': market} for u in snapshot_users if u['address'] not in existing]
+
+        for i in range(0, len(new_users), batch_size):
+            db.bulk_insert_mappings(User, new_users[i:i + batch_size])
+        db.flush()
+
+        # 只为本次新插入的用户恢复头寸，已有用户以数据库为准
+        new_addresses = {u['address'] for u in new_users}
+        user_ids = {
+            address: user_id
+            for user_id, address in db.query(User.id, User.address).filter(User.market == market)
+            if address in new_addresses
+        }
+
+        positions = []
+        for pos in snapshot.iter_positions():
+            address = snapshot_users[pos.pop('user_index')]['address']
+            if address in user_ids:
+                pos['user_id'] = user_ids[address]
+                positions.append(pos)
+            if len(positions) >= batch_size:
+                db.bulk_insert_mappings(Position, positions)
+                positions = []
+        if positions:
+            db.bulk_insert_mappings(Position, positions)
+
+        # 快照和数据库中的头寸都可能已经过时，全部等待从链上重新读取
+        db.query(User).filter(User.market == market).update(
+            {User.last_updated: STALE}, synchronize_session=False
+        )
+
+        if scan_status:
+            scan_status.last_scanned_block = snapshot.block
+        else:
+            db.add(ScanStatus(market=market, last_scanned_block=snapshot.block))
+        db.commit()
+
+        print(f"从快照恢复了 {len(new_users)} 个用户，扫描进度推进到区块 {snapshot.block}")
+        return snapshot.block
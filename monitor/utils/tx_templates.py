@@ -0,0 +1,164 @@
+# 标准库
+import time
+from typing import Dict, List, Optional, Tuple
+
+# 本地导入
+from .opportunity_queue import opportunity_key
+
+class TxTemplate:
+    """为某个 (用户, 抵押品, 债务) 预先构建并签名的清算交易"""
+
+    __slots__ = (
+        'key', 'lane_address', 'nonce', 'gas_price', 'uniswap_pool',
+        'debt_amount', 'raw_transaction', 'built_at'
+    )
+
+    def __init__(
+        self,
+        key: Tuple[str, str, str],
+        lane_address: str,
+        nonce: int,
+        gas_price: int,
+        uniswap_pool: str,
+        debt_amount: int,
+        raw_transaction: bytes
+    ):
+        self.key = key
+        self.lane_address = lane_address
+        self.nonce = nonce
+        self.gas_price = gas_price
+        self.uniswap_pool = uniswap_pool
+        self.debt_amount = debt_amount
+        self.raw_transaction = raw_transaction
+        self.built_at = time.monotonic()
+
+    def matches(self, lane_address: str, nonce: int, uniswap_pool: str, debt_amount: int) -> bool:
+        """账户、nonce、池子和数量是否与当前状态一致"""
+        return (
+            self.lane_address == lane_address
+            and self.nonce == nonce
+            and self.uniswap_pool == uniswap_pool
+            and self.debt_amount == debt_amount
+        )
+
+class TxTemplateCache:
+    """最接近清算的候选用户的预签名交易
+
+    模板由刷新任务在 nonce、gas 价格、Uniswap 池子或清算数量变化时重建；
+    执行任务取出机会时只在本地校验模板（账户 nonce、gas 价格、数量、有效期），
+    校验通过即可直接 send_raw_transaction，不再经过查池、构建、签名。
+    """
+
+    def __init__(self, max_age: float = 30, gas_price_bump: float = 1.1):
+        """
+        Args:
+            max_age: 模板的最长使用期限(秒)，超过后即使参数未变也不再使用
+            gas_price_bump: 签名时 gas 价格相对当前价格的上浮比例，容忍刷新间隔内的小幅上涨
+        """
+        self.max_age = max_age
+        self.gas_price_bump = gas_price_bump
+        self._templates: Dict[Tuple[str, str, str], TxTemplate] = {}
+        # 最近一次观察到的 gas 价格，模板价格低于它时视为失效
+        self.gas_price = 0
+
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._templates)
+
+    def get(self, key: Tuple[str, str, str]) -> Optional[TxTemplate]:
+        return self._templates.get(key)
+
+    def put(self, template: TxTemplate):
+        self._templates[template.key] = template
+
+    def retain(self, keys) -> int:
+        """只保留仍是候选的模板
+
+        Returns:
+            移除的模板数
+        """
+        keys = set(keys)
+        stale = [key for key in self._templates if key not in keys]
+        for key in stale:
+            del self._templates[key]
+        return len(stale)
+
+    def reusable(self, template: TxTemplate, lane_address: str, nonce: int, uniswap_pool: str, debt_amount: int) -> bool:
+        """刷新时判断模板能否保留：参数未变、gas 价格仍在上浮区间内、距离过期还有一半以上时间"""
+        return (
+            template.matches(lane_address, nonce, uniswap_pool, debt_amount)
+            and self.gas_price <= template.gas_price <= self.gas_price * self.gas_price_bump ** 2
+            and time.monotonic() - template.built_at < self.max_age / 2
+        )
+
+    def signing_gas_price(self, gas_price: int) -> int:
+        """记录当前 gas 价格并返回签名使用的价格"""
+        self.gas_price = gas_price
+        return int(gas_price * self.gas_price_bump)
+
+    def take(self, opportunity: Dict, debt_amount: int, lane_nonces: Dict[str, Optional[int]], gas_price: int) -> Optional[TxTemplate]:
+        """取出可直接发送的模板
+
+        Args:
+            opportunity: 清算机会
+            debt_amount: 机会的链上清算数量
+            lane_nonces: 当前可用账户的地址 -> 本地维护的下一个 nonce；
+                模板的账户不在其中（正忙或卡住）时视为未命中，模板保留在缓存中
+            gas_price: 当前 gas 价格
+
+        Returns:
+            校验通过的模板（同时从缓存移除），否则返回 None
+        """
+        template = self._templates.get(opportunity_key(opportunity))
+        if (
+            template is None
+            or time.monotonic() - template.built_at > self.max_age
+            or lane_nonces.get(template.lane_address) != template.nonce
+            or template.gas_price < gas_price
+            or template.debt_amount != debt_amount
+        ):
+            self.misses += 1
+            return None
+        del self._templates[template.key]
+        self.hits += 1
+        return template
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * pct / 100), len(ordered) - 1)]
+
+class LatencyLog:
+    """触发到广播的延迟，按发送路径分别统计最近的样本"""
+
+    def __init__(self, capacity: int = 1000):
+        self.capacity = capacity
+        self._samples: Dict[str, List[float]] = {}
+
+    def record(self, path: str, seconds: float):
+        samples = self._samples.setdefault(path, [])
+        samples.append(seconds)
+        if len(samples) > self.capacity:
+            del samples[:len(samples) - self.capacity]
+
+    def summary(self, path: str) -> Optional[Dict[str, float]]:
+        samples = self._samples.get(path)
+        if not samples:
+            return None
+        return {
+            'count': len(samples),
+            'p50': _percentile(samples, 50),
+            'p90': _percentile(samples, 90),
+            'max': max(samples)
+        }
+
+    def report(self) -> str:
+        lines = []
+        for path in sorted(self._samples):
+            stats = self.summary(path)
+            lines.append(
+                f"触发到广播({path}): {stats['count']} 笔，p50 {stats['p50'] * 1000:.1f}ms "
+                f"p90 {stats['p90'] * 1000:.1f}ms 最大 {stats['max'] * 1000:.1f}ms"
+            )
+        return "\n".join(lines)
@@ -0,0 +1,197 @@
+# 标准库
+import os
+import time
+import asyncio
+from typing import List, Optional
+
+# 第三方库
+from web3 import Web3
+from eth_account import Account
+from eth_account.signers.local import LocalAccount
+
+def load_private_keys() -> List[str]:
+    """读取签名私钥
+
+    优先使用 PRIVATE_KEYS（逗号分隔），未设置时退回单个 PRIVATE_KEY。
+    """
+    keys = os.getenv('PRIVATE_KEYS', '')
+    parsed = [key.strip() for key in keys.split(',') if key.strip()]
+    if not parsed and os.getenv('PRIVATE_KEY'):
+        parsed = [os.getenv('PRIVATE_KEY')]
+    return parsed
+
+class WalletLane:
+    """单个签名账户及其独立的 nonce 序列"""
+
+    def __init__(self, account: LocalAccount):
+        self.account = account
+        self.address = account.address
+        self.nonce: Optional[int] = None  # 本地维护的下一个 nonce，None 表示需要从链上同步
+        self.in_flight = 0
+        self.balance = 0
+        self.stuck_nonce: Optional[int] = None  # 等待确认超时的交易 nonce，被打包前不再分配该账户
+
+    def __repr__(self) -> str:
+        return f"WalletLane({self.address}, nonce={self.nonce}, in_flight={self.in_flight}, stuck={self.stuck_nonce})"
+
+class WalletPool:
+    """签名账户池
+
+    每个账户维护独立的 nonce 序列，一笔交易卡住只影响所在账户。
+    执行任务从池中取出空闲账户并行发送互不相关的清算交易，
+    吞吐量随账户数量增长，而不是每次确认只能发送一笔交易。
+    """
+
+    def __init__(
+        self,
+        web3: Web3,
+        private_keys: List[str],
+        max_in_flight: int = 1,
+        min_balance_eth: float = 0.001,
+        balance_refresh_interval: int = 60
+    ):
+        """
+        Args:
+            web3: Web3 实例
+            private_keys: 签名私钥列表
+            max_in_flight: 每个账户同时等待确认的交易数上限
+            min_balance_eth: 余额低于该值的账户不再分配交易
+            balance_refresh_interval: 余额不足的账户重新读取余额的间隔(秒)，充值后恢复分配
+        """
+        if not private_keys:
+            raise ValueError("至少需要一个签名私钥")
+
+        self.web3 = web3
+        self.lanes = [WalletLane(Account.from_key(key)) for key in private_keys]
+        self.max_in_flight = max_in_flight
+        self.min_balance = Web3.to_wei(min_balance_eth, 'ether')
+        self.balance_refresh_interval = balance_refresh_interval
+        self._low_balance_checked_at = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self.lanes)
+
+    def refresh_balances(self):
+        """从链上刷新各账户余额"""
+        for lane in self.lanes:
+            try:
+                lane.balance = self.web3.eth.get_balance(lane.address)
+            except Exception as e:
+                print(f"获取账户 {lane.address} 余额失败: {str(e)}")
+
+    def available(self) -> int:
+        """可以立即分配交易的账户数"""
+        return sum(1 for lane in self.lanes if self._usable(lane))
+
+    def _usable(self, lane: WalletLane) -> bool:
+        return (
+            lane.stuck_nonce is None
+            and lane.in_flight < self.max_in_flight
+            and lane.balance >= self.min_balance
+        )
+
+    def usable_lanes(self) -> List[WalletLane]:
+        """当前可以分配交易的账户"""
+        return [lane for lane in self.lanes if self._usable(lane)]
+
+    def acquire(self, address: Optional[str] = None) -> Optional[WalletLane]:
+        """取出在途交易最少的可用账户，没有可用账户时返回 None
+
+        Args:
+            address: 指定账户，该账户不可用时返回 None
+        """
+        candidates = self.usable_lanes()
+        if address is not None:
+            candidates = [lane for lane in candidates if lane.address == address]
+        if not candidates:
+            return None
+        lane = min(candidates, key=lambda lane: (lane.in_flight, -lane.balance))
+        lane.in_flight += 1
+        return lane
+
+    def peek_nonce(self, lane: WalletLane) -> int:
+        """账户的下一个 nonce，不消耗；首次使用时从 pending 状态同步"""
+        if lane.nonce is None:
+            lane.nonce = self.web3.eth.get_transaction_count(lane.address, 'pending')
+        return lane.nonce
+
+    async def sync_nonce(self, lane: WalletLane):
+        """需要时在线程中从 pending 状态同步 nonce，不阻塞事件循环"""
+        if lane.nonce is None:
+            count = await asyncio.to_thread(self.web3.eth.get_transaction_count, lane.address, 'pending')
+            # 等待期间其他协程可能已经同步并分配了 nonce
+            if lane.nonce is None:
+                lane.nonce = count
+
+    def next_nonce(self, lane: WalletLane) -> int:
+        """分配账户的下一个 nonce，首次使用时从 pending 状态同步"""
+        nonce = self.peek_nonce(lane)
+        lane.nonce += 1
+        return nonce
+
+    def release(self, lane: WalletLane, resync: bool = False):
+        """交易结束后归还账户
+
+        Args:
+            lane: 账户
+            resync: 交易未能广播时为 True，下次使用前重新同步 nonce
+        """
+        lane.in_flight = max(lane.in_flight - 1, 0)
+        if resync:
+            lane.nonce = None
+
+    def mark_stuck(self, lane: WalletLane, nonce: int):
+        """交易等待确认超时：之后的 nonce 都会排在它后面，打包前不再分配该账户"""
+        lane.stuck_nonce = nonce
+
+    async def check_stuck(self) -> int:
+        """检查卡住的账户，交易被打包后从 pending 状态重新同步 nonce 并恢复分配
+
+        Returns:
+            恢复的账户数
+        """
+        recovered = 0
+        for lane in self.lanes:
+            if lane.stuck_nonce is None:
+                continue
+            try:
+                mined = await asyncio.to_thread(self.web3.eth.get_transaction_count, lane.address, 'latest')
+            except Exception as e:
+                print(f"获取账户 {lane.address} nonce 失败: {str(e)}")
+                continue
+            if mined > lane.stuck_nonce:
+                lane.stuck_nonce = None
+                lane.nonce = None
+                recovered += 1
+                print(f"账户 {lane.address} 卡住的交易已打包，恢复分配")
+        return recovered
+
+    async def check_low_balances(self) -> int:
+        """定期重新读取余额不足的账户，充值后恢复分配
+
+        余额不足的账户不会再广播交易，不经过 refresh_lane，需要单独刷新。
+
+        Returns:
+            恢复的账户数
+        """
+        now = time.monotonic()
+        if now - self._low_balance_checked_at < self.balance_refresh_interval:
+            return 0
+        self._low_balance_checked_at = now
+
+        recovered = 0
+        for lane in self.lanes:
+            if lane.balance >= self.min_balance:
+                continue
+            await self.refresh_lane(lane)
+            if lane.balance >= self.min_balance:
+                recovered += 1
+                print(f"账户 {lane.address} 余额已恢复，恢复分配")
+        return recovered
+
+    async def refresh_lane(self, lane: WalletLane):
+        """交易确认后在后台刷新账户余额"""
+        try:
+            lane.balance = await asyncio.to_thread(self.web3.eth.get_balance, lane.address)
+        except Exception as e:
+            print(f"获取账户 {lane.address} 余额失败: {str(e)}")